@@ -0,0 +1,167 @@
+"""
+Per-request SQL and timing instrumentation.
+
+RequestTimingMiddleware counts and times every SQL query of a request, as
+well as serialization and response rendering, and reports them in a
+Server-Timing header, e.g.
+
+    Server-Timing: db;dur=12.4;desc="9 queries", serialize;dur=6.1, render;dur=0.9, total;dur=24.0
+
+Serialization is the to_representation() behind the `.data` of the
+serializers that generic views make with get_serializer(), timed by
+SerializerTimingMixin. Queries run while serializing (lazy relations) count
+towards both `db` and `serialize`.
+
+Requests slower than SLOW_REQUEST_THRESHOLD_MS are logged together with
+their queries, grouped by fingerprint (the SQL with literals and IN lists
+collapsed). Only a SLOW_REQUEST_SAMPLE_RATE share of requests collects SQL
+text at all; the rest pay for two counters per query.
+
+The same numbers feed the per-route Prometheus histograms of backend.metrics.
+"""
+import contextvars
+import logging
+import random
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import observe_request
+
+logger = logging.getLogger(__name__)
+
+# Fingerprints listed in a slow-request log line
+LOGGED_FINGERPRINTS = 10
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_ROWS_RE = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+
+_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+def fingerprint(sql):
+    """
+    Normalizes SQL so that the same statement with other values, or a
+    different number of IN items or VALUES rows, reads the same.
+    """
+    sql = _WHITESPACE_RE.sub(' ', sql).strip()
+    sql = _LITERAL_RE.sub('%s', sql)
+    sql = _LIST_RE.sub('(...)', sql)
+    return _ROWS_RE.sub('(...)', sql)
+
+
+class RequestMetrics:
+    def __init__(self, capture_sql=False):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.render_time = 0.0
+        # fingerprint -> [count, seconds], when SQL is captured
+        self.statements = {} if capture_sql else None
+        self.view_done = None
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += elapsed
+            if self.statements is not None:
+                entry = self.statements.setdefault(fingerprint(sql), [0, 0.0])
+                entry[0] += 1
+                entry[1] += elapsed
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serializer_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def _timed(metrics, to_representation):
+    def timed(instance):
+        start = time.perf_counter()
+        try:
+            return to_representation(instance)
+        finally:
+            metrics.serializer_time += time.perf_counter() - start
+    return timed
+
+
+# For generic views: the serializer from get_serializer() (a ListSerializer
+# with many=True) counts its `.data` towards the request's `serialize` timing.
+# Only that instance's to_representation is wrapped; its class, DRF's and the
+# nested serializers are left as they are. No docstring, as drf-spectacular
+# would describe the views' operations with it.
+class SerializerTimingMixin:
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        metrics = _metrics.get()
+        if metrics is not None:
+            serializer.to_representation = _timed(metrics, serializer.to_representation)
+        return serializer
+
+
+class RequestTimingMiddleware:
+    """
+    Goes first in MIDDLEWARE, so `total` covers the other middleware too.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = settings.INSTRUMENTATION_ENABLED
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        metrics = RequestMetrics(capture_sql=random.random() < settings.SLOW_REQUEST_SAMPLE_RATE)
+        token = _metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.execute))
+                response = self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        end = time.perf_counter()
+        total = end - start
+
+        if metrics.view_done is not None:
+            metrics.render_time = end - metrics.view_done
+        response['Server-Timing'] = metrics.server_timing(total)
+        observe_request(request, response, total, metrics.queries, metrics.db_time)
+
+        if metrics.statements is not None and total * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            self.log_slow_request(request, metrics, total)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called once the view has returned and before the response renders.
+        metrics = _metrics.get()
+        if metrics is not None:
+            metrics.view_done = time.perf_counter()
+        return response
+
+    def log_slow_request(self, request, metrics, total):
+        match = request.resolver_match
+        statements = sorted(metrics.statements.items(), key=lambda item: item[1][1], reverse=True)
+        logger.warning(
+            'Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms\n%s',
+            request.method, request.path, match.view_name if match else '-',
+            total * 1000, metrics.queries, metrics.db_time * 1000,
+            '\n'.join(
+                f'  {count}x {seconds * 1000:.1f} ms  {sql}'
+                for sql, (count, seconds) in statements[:LOGGED_FINGERPRINTS]
+            ),
+        )
@@ -0,0 +1,183 @@
+"""
+Storage and delivery of uploaded media.
+
+Saved files get a hash of their content in the name, so a media URL always
+refers to the same bytes and is served as immutable. How /media/ is
+delivered is chosen by MEDIA_SERVE_MODE:
+
+- 'django': a FileResponse with Range and conditional request support
+- 'x-accel-redirect': nginx sends the file from an internal location
+  mapped to MEDIA_ROOT at MEDIA_ACCEL_PREFIX
+- 'x-sendfile': Apache (mod_xsendfile) or lighttpd send the file
+- 'off': no Django route; the front server maps MEDIA_URL itself
+"""
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+HASH_LENGTH = 12
+# Room left for the "_abc1234" suffix Storage adds when a name is taken
+AVAILABLE_NAME_SUFFIX = 8
+
+# photo.3f2a9c0d1b7e.jpg, or photo.3f2a9c0d1b7e_Ab12Cd3.jpg after a name clash
+HASHED_NAME_RE = re.compile(rf'\.[0-9a-f]{{{HASH_LENGTH}}}(?:_[A-Za-z0-9]{{7}})?\.[^./]+$')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+    """
+    FileSystemStorage that puts a hash of the content in every saved name,
+    e.g. recipe_images/pasta.3f2a9c0d1b7e.jpg.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return super().save(self.hashed_name(name, content, max_length), content, max_length)
+
+    def hashed_name(self, name, content, max_length=None):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        root, ext = posixpath.splitext(name)
+        if max_length is not None:
+            # Shorten the original name, not the hash, when the field is too short.
+            budget = max_length - len(ext) - HASH_LENGTH - 1 - AVAILABLE_NAME_SUFFIX
+            root = root[:max(budget, len(posixpath.dirname(root)) + 1)]
+        return f'{root}.{digest.hexdigest()[:HASH_LENGTH]}{ext}'
+
+
+def is_hashed_name(path):
+    return bool(HASHED_NAME_RE.search(posixpath.basename(path)))
+
+
+class _FileRange:
+    # Read-only window over an open file, for FileResponse.
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _parse_range(header, size):
+    """
+    Returns (start, end) of a single "bytes=" range, None to send the whole
+    file, or False if the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        # Absent, malformed or multi-range: a full response is allowed.
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    validator = request.headers.get('If-Range')
+    if validator is None:
+        return True
+    if validator.startswith(('"', 'W/')):
+        return validator == etag
+    return parse_http_date_safe(validator) == int(mtime)
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(fullpath)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+
+    etag = quote_etag(f'{stat.st_size:x}-{int(stat.st_mtime):x}')
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if is_hashed_name(path) else DEFAULT_CACHE_CONTROL,
+    }
+    mode = settings.MEDIA_SERVE_MODE
+
+    if mode in ('x-accel-redirect', 'x-sendfile'):
+        # The front server handles Range and conditional requests itself.
+        response = HttpResponse(content_type=mimetypes.guess_type(fullpath)[0] or 'application/octet-stream')
+        if mode == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + quote(path)
+        else:
+            response['X-Sendfile'] = fullpath
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        for name, value in headers.items():
+            not_modified[name] = value
+        return not_modified
+
+    byte_range = None
+    if _if_range_matches(request, etag, stat.st_mtime):
+        byte_range = _parse_range(request.headers.get('Range'), stat.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+
+    file = open(fullpath, 'rb')
+    if byte_range is None:
+        response = FileResponse(file)
+    else:
+        start, end = byte_range
+        response = FileResponse(_FileRange(file, start, end - start + 1), status=206,
+                                content_type=mimetypes.guess_type(fullpath)[0] or 'application/octet-stream')
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+    response['Accept-Ranges'] = 'bytes'
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -0,0 +1,66 @@
+"""
+Prometheus metrics, served at /metrics.
+
+Latency, SQL query counts and SQL time of every request are recorded per
+route, labelled by URL name, by backend.instrumentation. Recipe activity
+and cache lookups are counted in recipes.metrics, and the job queue depth
+is read from the database on every scrape (jobs.metrics).
+
+Each Gunicorn worker keeps its own values. With PROMETHEUS_MULTIPROC_DIR set
+before the workers start (gunicorn.conf.py does it), they write them to
+files in that directory and /metrics adds up every worker's.
+"""
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest, multiprocess
+
+from jobs.metrics import QUEUE_COLLECTOR
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by route.',
+    ['route', 'method', 'status'], buckets=LATENCY_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL queries per request by route.',
+    ['route'], buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_TIME = Histogram(
+    'http_request_db_duration_seconds', 'Time spent in SQL per request by route.',
+    ['route'], buckets=LATENCY_BUCKETS,
+)
+
+REGISTRY.register(QUEUE_COLLECTOR)
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.url_name or 'unnamed'
+
+
+def observe_request(request, response, duration, queries, db_time):
+    route = route_name(request)
+    REQUEST_LATENCY.labels(route, request.method, f'{response.status_code // 100}xx').observe(duration)
+    REQUEST_QUERIES.labels(route).observe(queries)
+    REQUEST_DB_TIME.labels(route).observe(db_time)
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(QUEUE_COLLECTOR)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
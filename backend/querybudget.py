@@ -0,0 +1,149 @@
+"""
+Query-count and query-plan checks for endpoint tests.
+
+EndpointQueryTestCase.assertQueryBudget() sends a request at two or more
+dataset sizes and asserts that each costs exactly the same, fixed number of
+queries, so an N+1 added to a serializer or view fails its endpoint's test.
+
+Every query it captures against a watched table is also run through
+EXPLAIN, with sequential scans disabled. PostgreSQL then only plans a Seq
+Scan where no index can serve the query at all, which is what a query on a
+large table must not do; the small test dataset can't hide it.
+
+Subclasses name their URLconf in `urlconf`: every URL name in it needs a
+test_<url_name> method (dashes as underscores), so a new endpoint can't
+go without a budget.
+"""
+import json
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver
+from django.utils.module_loading import import_module
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user import revocation
+from user.authentication import add_claims
+
+# Tables that grow with the catalog and must always be read through an index
+WATCHED_TABLES = ('recipes_recipe', 'recipes_recipeingredient', 'recipes_comment')
+
+EXPLAINED_STATEMENTS = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+# Not counted: inside the test's transaction every atomic block becomes a
+# savepoint, while in production the outermost one costs no statement.
+TRANSACTION_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def url_names(urlconf):
+    """
+    Returns the names of every URL pattern in a URLconf, includes resolved.
+    """
+    patterns = getattr(import_module(urlconf), 'urlpatterns', urlconf) if isinstance(urlconf, str) else urlconf
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= url_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+def explain(sql):
+    """
+    Returns the JSON plan of a captured (parameter-interpolated) query,
+    planned as if the tables were too big to scan.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+        finally:
+            cursor.execute('RESET enable_seqscan')
+    return json.loads(plan) if isinstance(plan, str) else plan
+
+
+def seq_scans(plan):
+    """
+    Yields the relations a plan (or any of its subplans) reads with a Seq Scan.
+    """
+    for node in plan if isinstance(plan, list) else [plan]:
+        node = node.get('Plan', node)
+        if node.get('Node Type') == 'Seq Scan':
+            yield node['Relation Name']
+        for child in node.get('Plans', []):
+            yield from seq_scans(child)
+
+
+class EndpointQueryTestCase(APITestCase):
+    urlconf = None
+    watched_tables = WATCHED_TABLES
+
+    def setUp(self):
+        cache.clear()
+
+    def test_every_url_name_has_a_budget(self):
+        if self.urlconf is None:
+            return
+        missing = sorted(
+            name for name in url_names(self.urlconf)
+            if not hasattr(self, f"test_{name.replace('-', '_')}")
+        )
+        self.assertEqual(missing, [], 'URL names without a query budget test')
+
+    def authenticate(self, user):
+        """
+        Sends an access token with the claims SigninView puts in, so the
+        budgets include authentication.
+        """
+        token = add_claims(AccessToken.for_user(user), user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def assertQueryBudget(self, budget, *requests, between=None, status=None):
+        """
+        Calls each request (a callable returning a response) with an empty
+        cache and asserts that it runs exactly `budget` queries and that none
+        of them scans a watched table. `between` is called before every
+        request but the first, e.g. to add rows. Returns the last response.
+        """
+        response = None
+        for index, request in enumerate(requests):
+            if index and between is not None:
+                between()
+            cache.clear()
+            # Not left to expire in the middle of a measured request
+            revocation.load()
+            with CaptureQueriesContext(connection) as context:
+                response = request()
+                # Streaming responses run their queries as they are consumed.
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+            if status is not None:
+                self.assertEqual(response.status_code, status)
+            else:
+                self.assertLess(response.status_code, 400, getattr(response, 'data', None))
+            queries = [
+                query['sql'] for query in context.captured_queries
+                if not query['sql'].startswith(TRANSACTION_STATEMENTS)
+            ]
+            self.assertEqual(
+                len(queries), budget,
+                f'Request #{index + 1} ran {len(queries)} queries:\n' + '\n'.join(queries),
+            )
+            self.assertNoSeqScans(queries)
+        return response
+
+    def assertNoSeqScans(self, queries):
+        for sql in queries:
+            if sql.lstrip().split(None, 1)[0].upper() not in EXPLAINED_STATEMENTS:
+                continue
+            if not any(f'"{table}"' in sql for table in self.watched_tables):
+                continue
+            plan = explain(sql)
+            scanned = sorted(set(seq_scans(plan)) & set(self.watched_tables))
+            self.assertFalse(
+                scanned, f'Sequential scan of {", ".join(scanned)}:\n{sql}\n{json.dumps(plan, indent=2)}',
+            )
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 
     # Third-party apps
     "rest_framework",
@@ -51,11 +52,12 @@ INSTALLED_APPS = [
     # My apps
     "recipes",
     "user",
+    "jobs",
 ]
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.ClaimsJWTAuthentication",
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     "DEFAULT_FILTER_BACKENDS": [
@@ -63,6 +65,7 @@ REST_FRAMEWORK = {
         "rest_framework.filters.OrderingFilter",
         "rest_framework.filters.SearchFilter",
     ],
+    "DEFAULT_PAGINATION_CLASS": "recipes.pagination.KeysetPagination",
 }
 
 SIMPLE_JWT = {
@@ -70,6 +73,7 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
     "ROTATE_REFRESH_TOKENS": True,
     "BLACKLIST_AFTER_ROTATION": True,
+    "TOKEN_REFRESH_SERIALIZER": "user.serializers.MyTokenRefreshSerializer",
     "ALGORITHM": "HS256",
     "SIGNING_KEY": SECRET_KEY,
 }
@@ -77,6 +81,7 @@ SIMPLE_JWT = {
 CORS_ALLOW_ALL_ORIGINS = True
 
 MIDDLEWARE = [
+    "backend.instrumentation.RequestTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -123,6 +128,16 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+# Seconds between write-backs of buffered recipe views (see recipes.view_counter)
+RECIPE_VIEW_FLUSH_INTERVAL = config('RECIPE_VIEW_FLUSH_INTERVAL', default=60, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -152,10 +167,6 @@ SPECTACULAR_SETTINGS = {
     'SERVE_INCLUDE_SCHEMA': False,
 }
 
-SIMPLE_JWT = {
-    "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
-    "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
-}
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -181,6 +192,48 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploads are stored under content-hashed names (backend.media).
+STORAGES = {
+    'default': {'BACKEND': 'backend.media.HashedFileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+# How MEDIA_URL is served: 'django' (streamed with Range support),
+# 'x-accel-redirect' (nginx, from an internal location at MEDIA_ACCEL_PREFIX),
+# 'x-sendfile' (Apache/lighttpd) or 'off' (the front server maps it itself).
+MEDIA_SERVE_MODE = config('MEDIA_SERVE_MODE', default='django')
+MEDIA_ACCEL_PREFIX = config('MEDIA_ACCEL_PREFIX', default='/protected-media/')
+
+# Resized copies of uploaded images (recipes.images): output format (WEBP or
+# JPEG) and rendering processes per server process (0 renders inline).
+IMAGE_VARIANT_FORMAT = config('IMAGE_VARIANT_FORMAT', default='WEBP')
+IMAGE_PIPELINE_WORKERS = config('IMAGE_PIPELINE_WORKERS', default=2, cast=int)
+
+# Per-request query counts and timings in a Server-Timing header
+# (backend.instrumentation). Requests slower than the threshold are logged with
+# their SQL, for the given share of requests (0 disables the capture).
+INSTRUMENTATION_ENABLED = config('INSTRUMENTATION_ENABLED', default=True, cast=bool)
+SLOW_REQUEST_THRESHOLD_MS = config('SLOW_REQUEST_THRESHOLD_MS', default=500, cast=int)
+SLOW_REQUEST_SAMPLE_RATE = config('SLOW_REQUEST_SAMPLE_RATE', default=0.1, cast=float)
+
+# Bearer token required to scrape /metrics (backend.metrics); empty leaves it open
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Seconds a process trusts its cached token revocations before reloading them
+# (user.revocation); another process may accept a revoked token that long.
+TOKEN_REVOCATION_TTL = config('TOKEN_REVOCATION_TTL', default=30, cast=int)
+
+# Background jobs (jobs.queue, run by `manage.py run_workers`): workers per
+# command and whether they are threads or processes, seconds an idle worker
+# sleeps, attempts per job, first retry delay in seconds (doubled after each
+# failure), and seconds after which a running job's worker is presumed dead.
+JOBS_WORKERS = config('JOBS_WORKERS', default=4, cast=int)
+JOBS_WORKER_MODE = config('JOBS_WORKER_MODE', default='thread')
+JOBS_POLL_INTERVAL = config('JOBS_POLL_INTERVAL', default=1.0, cast=float)
+JOBS_MAX_ATTEMPTS = config('JOBS_MAX_ATTEMPTS', default=5, cast=int)
+JOBS_RETRY_BACKOFF = config('JOBS_RETRY_BACKOFF', default=10, cast=int)
+JOBS_LOCK_TIMEOUT = config('JOBS_LOCK_TIMEOUT', default=600, cast=int)
+
 # For development, we'll print emails to the console.
 # In production, you would replace this with a real email service like SendGrid or Mailgun.
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
\ No newline at end of file
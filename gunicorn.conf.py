@@ -0,0 +1,24 @@
+"""
+Gunicorn settings, read from the project root by `gunicorn backend.wsgi`.
+"""
+import os
+import shutil
+import tempfile
+
+# Workers write their Prometheus metrics here and /metrics sums them up
+# (backend.metrics). Set before prometheus_client is imported anywhere.
+prometheus_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'share-recipe-prometheus')
+)
+
+from prometheus_client import multiprocess  # noqa: E402
+
+
+def on_starting(server):
+    # Values left from a previous run would be added to the new ones.
+    shutil.rmtree(prometheus_dir, ignore_errors=True)
+    os.makedirs(prometheus_dir)
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'queue', 'status', 'attempts', 'run_at', 'created_at')
+    list_filter = ('status', 'queue', 'name')
+    readonly_fields = ('attempts', 'locked_at', 'last_error', 'created_at')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from jobs import queue
+
+
+class Command(BaseCommand):
+    help = "Show the depth of every job queue, and optionally retry the failed jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true',
+                            help="Queue the failed jobs again with fresh attempts.")
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            self.stdout.write(f"Queued {queue.retry_failed()} failed jobs again.")
+        rows = queue.stats()
+        if not rows:
+            self.stdout.write("No jobs.")
+        for row in rows:
+            self.stdout.write(
+                f"{row['queue']}: {row['ready']} ready (oldest {row['oldest_ready']:.0f}s), "
+                f"{row['scheduled']} scheduled, {row['running']} running, {row['failed']} failed"
+            )
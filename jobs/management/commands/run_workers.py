@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs import worker
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the database queue until stopped (SIGINT/SIGTERM)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.JOBS_WORKERS,
+                            help="Jobs run at the same time.")
+        parser.add_argument('--mode', choices=['thread', 'process'], default=settings.JOBS_WORKER_MODE,
+                            help="Run workers as threads (I/O-bound jobs) or processes (CPU-bound jobs).")
+        parser.add_argument('--queue', action='append', dest='queues',
+                            help="Queue to take jobs from; repeat for several (default: default).")
+        parser.add_argument('--poll-interval', type=float, default=settings.JOBS_POLL_INTERVAL,
+                            help="Seconds an idle worker waits before looking for jobs again.")
+        parser.add_argument('--once', action='store_true',
+                            help="Run the jobs that are due now in this process, then exit.")
+
+    def handle(self, *args, **options):
+        queues = options['queues'] or ['default']
+        if options['once']:
+            ran = worker.run_pending(queues)
+            self.stdout.write(self.style.SUCCESS(f"Ran {ran} jobs."))
+            return
+        self.stdout.write(
+            f"Running {options['workers']} {options['mode']} workers on {', '.join(queues)}."
+        )
+        worker.run_pool(options['workers'], options['mode'], queues, options['poll_interval'])
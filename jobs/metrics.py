@@ -0,0 +1,35 @@
+"""
+Queue depth gauges for /metrics (backend.metrics), read from the jobs
+table at scrape time.
+"""
+from prometheus_client.core import GaugeMetricFamily
+
+from . import queue
+
+STATES = ('ready', 'scheduled', 'running', 'failed')
+
+
+class QueueCollector:
+    def families(self):
+        return (
+            GaugeMetricFamily('jobs', 'Background jobs by queue and state.', labels=['queue', 'state']),
+            GaugeMetricFamily(
+                'jobs_oldest_ready_age_seconds', 'How long the oldest due job has been waiting.',
+                labels=['queue'],
+            ),
+        )
+
+    def describe(self):
+        # Lets the registry learn the names without a query.
+        return self.families()
+
+    def collect(self):
+        depth, age = self.families()
+        for row in queue.stats():
+            for state in STATES:
+                depth.add_metric([row['queue'], state], row[state])
+            age.add_metric([row['queue']], row['oldest_ready'])
+        return depth, age
+
+
+QUEUE_COLLECTOR = QueueCollector()
@@ -0,0 +1,141 @@
+"""
+A job queue in PostgreSQL.
+
+Functions decorated with @task can be enqueued, optionally for later, from
+anywhere; the job row is written in the caller's transaction, so it only
+becomes visible if that commits. Workers (jobs.worker) claim due jobs with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of them can poll the same
+table without handing out a job twice or waiting on each other's locks.
+
+A failed job is retried with exponential backoff (JOBS_RETRY_BACKOFF
+seconds, doubled per attempt) until it has used max_attempts, then kept as
+failed. A job whose worker died is handed out again after
+JOBS_LOCK_TIMEOUT seconds, so tasks must be safe to run twice.
+"""
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import Job
+
+# Longest wait between two attempts
+MAX_BACKOFF = 60 * 60
+
+# Task name -> function
+TASKS = {}
+
+
+def task(func=None, *, queue='default', max_attempts=None):
+    """
+    Registers a function as a task, under its module and name. The
+    function itself is returned unchanged and can still be called inline.
+    """
+    def register(func):
+        func.task_name = f'{func.__module__}.{func.__qualname__}'
+        func.task_queue = queue
+        func.task_max_attempts = max_attempts or settings.JOBS_MAX_ATTEMPTS
+        TASKS[func.task_name] = func
+        return func
+
+    return register(func) if func is not None else register
+
+
+def enqueue(func, *args, run_at=None, delay=None, **kwargs):
+    """
+    Queues a call of a task with JSON-serializable arguments, to run as
+    soon as a worker is free, at `run_at`, or `delay` (a timedelta) from now.
+    """
+    if run_at is None:
+        run_at = timezone.now() + (delay or timedelta())
+    return Job.objects.create(
+        name=func.task_name, args=list(args), kwargs=kwargs, queue=func.task_queue,
+        max_attempts=func.task_max_attempts, run_at=run_at,
+    )
+
+
+def claim(queues):
+    """
+    Marks the next due job of the given queues as running and returns it,
+    or None when none is due. Jobs locked by another worker are skipped.
+    """
+    now = timezone.now()
+    table = Job._meta.db_table
+    jobs = list(Job.objects.raw(
+        f'UPDATE {table} SET status = %s, locked_at = %s, attempts = attempts + 1 '
+        f'WHERE id = ('
+        f'  SELECT id FROM {table} WHERE status = %s AND queue = ANY(%s) AND run_at <= %s'
+        f'  ORDER BY run_at, id LIMIT 1 FOR UPDATE SKIP LOCKED'
+        f') RETURNING *',
+        [Job.Status.RUNNING, now, Job.Status.QUEUED, list(queues), now],
+    ))
+    return jobs[0] if jobs else None
+
+
+def complete(job):
+    Job.objects.filter(pk=job.pk).delete()
+
+
+def backoff(attempts):
+    # 0.5x-1.5x jitter spreads out the retries of jobs that failed together.
+    delay = min(settings.JOBS_RETRY_BACKOFF * 2 ** (attempts - 1), MAX_BACKOFF)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.5))
+
+
+def fail(job, error):
+    """
+    Schedules the job's next attempt, or marks it failed after its last one.
+    """
+    if job.attempts < job.max_attempts:
+        changes = {'status': Job.Status.QUEUED, 'run_at': timezone.now() + backoff(job.attempts)}
+    else:
+        changes = {'status': Job.Status.FAILED}
+    Job.objects.filter(pk=job.pk).update(locked_at=None, last_error=error, **changes)
+
+
+def requeue_stale():
+    """
+    Hands out again the jobs locked for longer than JOBS_LOCK_TIMEOUT, whose
+    worker presumably died, unless they have used all their attempts.
+    """
+    stale = Job.objects.filter(
+        status=Job.Status.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT),
+    )
+    error = 'Worker lost while running the job.'
+    exhausted = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.Status.FAILED, locked_at=None, last_error=error,
+    )
+    return exhausted + stale.update(status=Job.Status.QUEUED, locked_at=None, last_error=error)
+
+
+def retry_failed(queues=None):
+    """
+    Queues the failed jobs again with a fresh set of attempts.
+    """
+    jobs = Job.objects.filter(status=Job.Status.FAILED)
+    if queues:
+        jobs = jobs.filter(queue__in=queues)
+    return jobs.update(status=Job.Status.QUEUED, attempts=0, run_at=timezone.now())
+
+
+def stats():
+    """
+    Returns one dict per queue: jobs ready to run, scheduled for later,
+    running and failed, and the age in seconds of the oldest ready job.
+    """
+    now = timezone.now()
+    queued = Q(status=Job.Status.QUEUED)
+    rows = Job.objects.values('queue').annotate(
+        ready=Count('id', filter=queued & Q(run_at__lte=now)),
+        scheduled=Count('id', filter=queued & Q(run_at__gt=now)),
+        running=Count('id', filter=Q(status=Job.Status.RUNNING)),
+        failed=Count('id', filter=Q(status=Job.Status.FAILED)),
+        oldest_ready=Min('run_at', filter=queued & Q(run_at__lte=now)),
+    ).order_by('queue')
+    return [
+        {**row, 'oldest_ready': (now - row['oldest_ready']).total_seconds() if row['oldest_ready'] else 0.0}
+        for row in rows
+    ]
@@ -0,0 +1,115 @@
+import io
+from datetime import timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from . import queue
+from .metrics import QUEUE_COLLECTOR
+from .models import Job
+from .queue import enqueue, task
+from .worker import run_one, run_pending
+
+CALLS = []
+
+
+@task
+def record(value, suffix=''):
+    CALLS.append(f'{value}{suffix}')
+
+
+@task(queue='slow', max_attempts=2)
+def explode():
+    raise ValueError('boom')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_runs_due_jobs_in_order(self):
+        enqueue(record, 'b', suffix='!', run_at=timezone.now() - timedelta(minutes=1))
+        enqueue(record, 'c')
+        enqueue(record, 'later', delay=timedelta(hours=1))
+        self.assertEqual(run_pending(), 2)
+        self.assertEqual(CALLS, ['b!', 'c'])
+        # Finished jobs are deleted; the scheduled one waits.
+        self.assertEqual(list(Job.objects.values_list('kwargs', 'args')), [({}, ['later'])])
+
+    def test_only_takes_jobs_of_its_queues(self):
+        enqueue(explode)
+        self.assertFalse(run_one(['default']))
+        self.assertEqual(Job.objects.get().status, Job.Status.QUEUED)
+
+    def test_claimed_job_is_not_handed_out_twice(self):
+        enqueue(record, 'a')
+        job = queue.claim(['default'])
+        self.assertEqual((job.status, job.attempts), (Job.Status.RUNNING, 1))
+        self.assertIsNone(queue.claim(['default']))
+
+    def test_failed_job_is_retried_with_backoff_then_kept(self):
+        job = enqueue(explode)
+        with mock.patch('random.uniform', return_value=1.0), self.assertLogs('jobs.worker', 'ERROR'):
+            self.assertTrue(run_one(['slow']))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.QUEUED, 1))
+        self.assertIn('ValueError: boom', job.last_error)
+        self.assertAlmostEqual((job.run_at - timezone.now()).total_seconds(), 10, delta=2)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            run_one(['slow'])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.FAILED, 2))
+        self.assertFalse(run_one(['slow']))
+
+        self.assertEqual(queue.retry_failed(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.Status.QUEUED, 0))
+
+    def test_unknown_task_fails(self):
+        Job.objects.create(name='gone.task', max_attempts=1)
+        with self.assertLogs('jobs.worker', 'ERROR'):
+            run_one(['default'])
+        self.assertEqual(Job.objects.get().status, Job.Status.FAILED)
+
+    def test_requeues_jobs_of_lost_workers(self):
+        stale = timezone.now() - timedelta(hours=1)
+        lost = Job.objects.create(name=record.task_name, args=['a'], max_attempts=3,
+                                  status=Job.Status.RUNNING, attempts=1, locked_at=stale)
+        spent = Job.objects.create(name=record.task_name, args=['b'], max_attempts=1,
+                                   status=Job.Status.RUNNING, attempts=1, locked_at=stale)
+        busy = Job.objects.create(name=record.task_name, args=['c'], max_attempts=1,
+                                  status=Job.Status.RUNNING, attempts=1, locked_at=timezone.now())
+        self.assertEqual(queue.requeue_stale(), 2)
+        statuses = dict(Job.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            [statuses[job.pk] for job in (lost, spent, busy)],
+            [Job.Status.QUEUED, Job.Status.FAILED, Job.Status.RUNNING],
+        )
+
+    def test_stats_and_metrics(self):
+        enqueue(record, 'a', run_at=timezone.now() - timedelta(seconds=30))
+        enqueue(record, 'b', delay=timedelta(hours=1))
+        Job.objects.create(name=explode.task_name, queue='slow', max_attempts=1, status=Job.Status.FAILED)
+        rows = {row['queue']: row for row in queue.stats()}
+        self.assertEqual(
+            {name: (row['ready'], row['scheduled'], row['running'], row['failed']) for name, row in rows.items()},
+            {'default': (1, 1, 0, 0), 'slow': (0, 0, 0, 1)},
+        )
+        self.assertGreaterEqual(rows['default']['oldest_ready'], 30)
+
+        depth = {tuple(sample.labels.values()): sample.value for sample in QUEUE_COLLECTOR.collect()[0].samples}
+        self.assertEqual(depth[('slow', 'failed')], 1)
+        self.assertEqual(depth[('default', 'ready')], 1)
+
+    def test_commands(self):
+        enqueue(record, 'a')
+        out = io.StringIO()
+        call_command('job_status', stdout=out)
+        self.assertIn('default: 1 ready', out.getvalue())
+        call_command('run_workers', '--once', stdout=out)
+        self.assertIn('Ran 1 jobs.', out.getvalue())
+        self.assertEqual(CALLS, ['a'])
@@ -0,0 +1,96 @@
+"""
+Workers running the jobs of jobs.queue.
+
+Each worker claims one due job at a time, runs it and deletes it, or
+schedules its retry; when nothing is due it hands out stale jobs again and
+sleeps for JOBS_POLL_INTERVAL seconds. run_pool() starts `workers` of them
+as threads of this process (enough for jobs waiting on SMTP or the
+database) or as forked processes (for CPU-bound jobs), and lets them finish
+their current job on SIGINT/SIGTERM.
+"""
+import logging
+import multiprocessing
+import signal
+import threading
+import traceback
+
+from django.db import DatabaseError, close_old_connections, connections
+
+from . import queue
+
+logger = logging.getLogger(__name__)
+
+
+def run_one(queues):
+    """
+    Runs the next due job of the queues, if any; returns whether one ran.
+    """
+    job = queue.claim(queues)
+    if job is None:
+        return False
+    try:
+        func = queue.TASKS[job.name]
+        func(*job.args, **job.kwargs)
+    except Exception:
+        logger.exception('Job %s #%s failed (attempt %s of %s)', job.name, job.pk, job.attempts, job.max_attempts)
+        queue.fail(job, traceback.format_exc())
+    else:
+        queue.complete(job)
+    return True
+
+
+def run_pending(queues=('default',), limit=None):
+    """
+    Runs due jobs until none is left (or `limit` ran), and returns how many ran.
+    """
+    ran = 0
+    while (limit is None or ran < limit) and run_one(queues):
+        ran += 1
+    return ran
+
+
+def work(queues, poll_interval, stop):
+    while not stop.is_set():
+        # Drops connections the database closed or that outlived CONN_MAX_AGE.
+        close_old_connections()
+        try:
+            if run_one(queues):
+                continue
+            queue.requeue_stale()
+        except DatabaseError:
+            logger.exception('Job worker lost its database connection')
+        stop.wait(poll_interval)
+    connections.close_all()
+
+
+def _work_in_child(queues, poll_interval, stop):
+    # The parent relays SIGINT/SIGTERM through `stop`.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    work(queues, poll_interval, stop)
+
+
+def run_pool(workers, mode, queues, poll_interval):
+    if mode == 'process':
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        # Children must not share the parent's database connections.
+        connections.close_all()
+        pool = [
+            context.Process(target=_work_in_child, args=(queues, poll_interval, stop), daemon=True)
+            for _ in range(workers)
+        ]
+    else:
+        stop = threading.Event()
+        pool = [threading.Thread(target=work, args=(queues, poll_interval, stop)) for _ in range(workers)]
+
+    def shut_down(signum, frame):
+        logger.info('Stopping job workers after their current jobs')
+        stop.set()
+
+    signal.signal(signal.SIGINT, shut_down)
+    signal.signal(signal.SIGTERM, shut_down)
+    for worker in pool:
+        worker.start()
+    for worker in pool:
+        worker.join()
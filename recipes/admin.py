@@ -1,6 +1,8 @@
 from django.contrib import admin
 from .models import Recipe, Region, Session, Category, RecipeStep, Type, Feedback, \
-    RecipeIngredient  # Import RecipeIngredient
+    RecipeIngredient, Ingredient  # Import RecipeIngredient
+from .catalog import link_ingredients
+from .search import update_search_vectors
 
 
 # New Inline for RecipeIngredient
@@ -19,8 +21,15 @@ class RecipeAdmin(admin.ModelAdmin):
     list_display = ('id', 'title', 'author', 'created_at', 'is_published')
     list_filter = ('author', 'region', 'session', 'category', 'type')
     search_fields = ('title', 'description', 'author__username')
+    readonly_fields = ('like_count', 'save_count')
     inlines = [RecipeIngredientInline, RecipeStepInline]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Ingredients and taxonomy are saved after the recipe itself
+        link_ingredients([form.instance.pk])
+        update_search_vectors([form.instance.pk])
+
 
 @admin.register(Feedback)
 class FeedbackAdmin(admin.ModelAdmin):
@@ -33,4 +42,9 @@ admin.site.register(Region)
 admin.site.register(Session)
 admin.site.register(Category)
 admin.site.register(RecipeStep)
-admin.site.register(Type)
\ No newline at end of file
+admin.site.register(Type)
+
+
+@admin.register(Ingredient)
+class IngredientAdmin(admin.ModelAdmin):
+    search_fields = ('name',)
\ No newline at end of file
@@ -0,0 +1,268 @@
+"""
+Load generator for the public recipe API.
+
+Each scenario (a list, filtered list, search, detail, like toggle,
+leaderboard or filter-options request drawn at random from the corpus) is
+run on its own by `concurrency` threads for `duration` seconds, either in
+process through Django's test client or against a running server over
+keep-alive HTTP connections. The in-process mode measures the Django stack
+under one interpreter lock; use a server (Gunicorn with several workers)
+for throughput numbers.
+
+Results are p50/p95/p99 latency in milliseconds, requests per second and
+error count per scenario. They are kept in a JSON baseline file, and
+compare() reports the metrics that got worse than it by more than a
+tolerance.
+"""
+import http.client
+import math
+import random
+import threading
+import time
+import urllib.parse
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Max, Min
+from django.test import Client
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user.authentication import add_claims
+
+from .models import Category, Ingredient, Recipe, Region, Type
+
+User = get_user_model()
+
+PERCENTILES = {'p50': 0.50, 'p95': 0.95, 'p99': 0.99}
+# Metrics compared to the baseline; True where higher is better
+COMPARED_METRICS = {'p50': False, 'p95': False, 'p99': False, 'rps': True}
+
+
+class Corpus:
+    """
+    Ids, names and access tokens the scenarios draw their requests from,
+    sampled once from the database.
+    """
+
+    def __init__(self, recipe_ids, regions, categories, types, ingredients, tokens):
+        self.recipe_ids = recipe_ids
+        self.regions = regions
+        self.categories = categories
+        self.types = types
+        self.ingredients = ingredients
+        self.terms = sorted({word for name in ingredients for word in name.split()})
+        self.tokens = tokens
+
+    @classmethod
+    def load(cls, rng, sample_size=10000, users=50):
+        # Probe random ids in the pk range: ORDER BY random() would scan the table.
+        bounds = Recipe.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        recipe_ids = []
+        if bounds['low'] is not None:
+            candidates = {rng.randint(bounds['low'], bounds['high']) for _ in range(sample_size)}
+            recipe_ids = sorted(
+                Recipe.objects.filter(pk__in=candidates, is_published=True).values_list('pk', flat=True)
+            )
+        user_rows = User.objects.filter(is_active=True).order_by('pk')[:users]
+        return cls(
+            recipe_ids=recipe_ids,
+            regions=list(Region.objects.values_list('name', flat=True)),
+            categories=list(Category.objects.values_list('name', flat=True)),
+            types=list(Type.objects.values_list('name', flat=True)),
+            ingredients=list(Ingredient.objects.order_by('pk').values_list('name', flat=True)[:1000]),
+            tokens=[str(add_claims(AccessToken.for_user(user), user)) for user in user_rows],
+        )
+
+
+def _query(path, params):
+    return f'{path}?{urllib.parse.urlencode(params)}' if params else path
+
+
+def list_request(rng, corpus):
+    return 'GET', reverse('recipe-list'), None
+
+
+def filtered_list_request(rng, corpus):
+    params = {}
+    if corpus.regions and rng.random() < 0.5:
+        params['region'] = rng.choice(corpus.regions)
+    if corpus.categories and rng.random() < 0.5:
+        params['category'] = rng.choice(corpus.categories)
+    if corpus.types and rng.random() < 0.3:
+        params['type'] = rng.choice(corpus.types)
+    if corpus.ingredients and (not params or rng.random() < 0.3):
+        params['ingredients'] = rng.choice(corpus.ingredients)
+    return 'GET', _query(reverse('recipe-list'), params), None
+
+
+def search_request(rng, corpus):
+    kind = rng.random()
+    if kind < 0.2 and corpus.ingredients:
+        text = f'"{rng.choice(corpus.ingredients)}"'
+    elif kind < 0.4:
+        text = f'{rng.choice(corpus.terms)[:3]}*'
+    else:
+        text = ' '.join(rng.sample(corpus.terms, min(2, len(corpus.terms))))
+    return 'GET', _query(reverse('recipe-list'), {'q': text}), None
+
+
+def detail_request(rng, corpus):
+    return 'GET', reverse('recipe-detail', args=[rng.choice(corpus.recipe_ids)]), None
+
+
+def like_toggle_request(rng, corpus):
+    return 'POST', reverse('recipe-like-toggle', args=[rng.choice(corpus.recipe_ids)]), rng.choice(corpus.tokens)
+
+
+def top_recipes_request(rng, corpus):
+    return 'GET', _query(reverse('top-recipes'), {'window': rng.choice(['day', 'week', 'all'])}), None
+
+
+def filters_request(rng, corpus):
+    return 'GET', reverse('filter-options'), None
+
+
+# name -> builder of (method, path, access token or None)
+SCENARIOS = {
+    'list': list_request,
+    'list-filtered': filtered_list_request,
+    'list-search': search_request,
+    'detail': detail_request,
+    'like-toggle': like_toggle_request,
+    'top-recipes': top_recipes_request,
+    'filters': filters_request,
+}
+
+
+class InProcessClient:
+    def __init__(self, host):
+        self.client = Client(HTTP_HOST=host, raise_request_exception=False)
+
+    def request(self, method, path, headers):
+        return self.client.generic(method, path, headers=headers).status_code
+
+    def close(self):
+        # Worker threads open their own database connections.
+        connections.close_all()
+
+
+class HTTPClient:
+    def __init__(self, base_url):
+        parts = urllib.parse.urlsplit(base_url)
+        self.connection_class = (
+            http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        )
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.connection = None
+
+    def request(self, method, path, headers):
+        # Reconnect once if the server closed the kept-alive connection.
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = self.connection_class(self.netloc, timeout=30)
+            try:
+                self.connection.request(method, self.prefix + path, headers=headers or {})
+                response = self.connection.getresponse()
+                response.read()
+                return response.status
+            except (http.client.HTTPException, OSError):
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def percentile(ordered, fraction):
+    # Nearest rank
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    result = {'requests': len(ordered), 'errors': errors, 'rps': len(ordered) / elapsed if elapsed else 0.0}
+    for name, fraction in PERCENTILES.items():
+        result[name] = percentile(ordered, fraction) * 1000 if ordered else None
+    return result
+
+
+def run_scenario(build, corpus, make_client, concurrency=1, duration=10.0, requests=None, seed=0):
+    """
+    Sends build()'s requests from `concurrency` threads, for `duration`
+    seconds or until `requests` have been sent in total, and returns
+    summarize()'s dict. With one thread, requests go out from the calling
+    thread.
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    sent = iter(range(requests)) if requests is not None else None
+
+    def work(index):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + index)
+        client = make_client()
+        own_latencies, own_errors = [], 0
+        deadline = time.perf_counter() + duration
+        try:
+            while True:
+                if sent is not None:
+                    with lock:
+                        if next(sent, None) is None:
+                            break
+                elif time.perf_counter() >= deadline:
+                    break
+                method, path, token = build(rng, corpus)
+                headers = {'Authorization': f'Bearer {token}'} if token else None
+                start = time.perf_counter()
+                try:
+                    status = client.request(method, path, headers)
+                except Exception:
+                    status = None
+                own_latencies.append(time.perf_counter() - start)
+                if status is None or status >= 400:
+                    own_errors += 1
+        finally:
+            if concurrency > 1:
+                client.close()
+            with lock:
+                latencies.extend(own_latencies)
+                errors += own_errors
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        work(0)
+    else:
+        threads = [threading.Thread(target=work, args=(index,)) for index in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns (scenario, metric, baseline value, current value, relative
+    change, regressed) for every metric both runs measured.
+    """
+    rows = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = before.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            rows.append((name, metric, old, new, change, worse > tolerance))
+        if current['errors'] > before.get('errors', 0):
+            rows.append((name, 'errors', before.get('errors', 0), current['errors'], None, True))
+    return rows
@@ -0,0 +1,67 @@
+"""
+Versioned cache entries.
+
+Cached payloads are stored under a namespace version, and writers bump the
+version instead of deleting keys. The version also serves as the ETag, so a
+client holding the current one is answered without touching the database.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import parse_etags, quote_etag
+
+from .metrics import count_cache_lookup
+
+PAYLOAD_TIMEOUT = 60 * 60 * 24
+
+# Namespace of the /filters/ and /options/ payloads
+OPTIONS = 'recipe-options'
+
+
+def _version_key(namespace):
+    return f'{namespace}:version'
+
+
+def get_version(namespace):
+    # Seed from the clock so a wiped cache never reissues an old version.
+    return cache.get_or_set(_version_key(namespace), int(time.time() * 1000), None)
+
+
+def _bump(namespace):
+    key = _version_key(namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def bump_version(namespace):
+    """
+    Invalidates everything cached under the namespace once the current
+    transaction commits (immediately outside of one).
+    """
+    transaction.on_commit(lambda: _bump(namespace))
+
+
+def get_or_build(namespace, version, name, build):
+    key = f'{namespace}:{version}:{name}'
+    payload = cache.get(key)
+    # Labelled by the namespace's kind, e.g. "recipe-detail" for "recipe-detail:42"
+    count_cache_lookup(namespace.split(':', 1)[0], payload is not None)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, PAYLOAD_TIMEOUT)
+    return payload
+
+
+def make_etag(*parts):
+    return quote_etag('-'.join(str(part) for part in parts))
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or etag in etags
@@ -0,0 +1,170 @@
+"""
+Name -> id resolution for the lookup tables recipes point at.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.db import transaction
+
+from . import caching
+from .models import Ingredient, Recipe, RecipeIngredient
+
+LINK_BATCH_SIZE = 1000
+
+
+class NameCache:
+    """
+    Small per-process LRU of name -> pk for one lookup table.
+
+    Entries expire after `ttl` seconds so renames and deletes made by other
+    processes are picked up; local ones clear the cache through signals.
+    """
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, names):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for name in names:
+                entry = self._entries.get(name)
+                if entry is None:
+                    continue
+                pk, expires = entry
+                if expires < now:
+                    del self._entries[name]
+                    continue
+                self._entries.move_to_end(name)
+                found[name] = pk
+        return found
+
+    def set_many(self, mapping):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for name, pk in mapping.items():
+                self._entries[name] = (pk, expires)
+                self._entries.move_to_end(name)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_name_caches = {}
+
+
+def get_name_cache(model):
+    return _name_caches.setdefault(model, NameCache())
+
+
+def forget_names(model):
+    """
+    Drops the cached ids of a lookup table after a rename or delete.
+    """
+    cache = _name_caches.get(model)
+    if cache is not None:
+        cache.clear()
+
+
+def resolve_names(model, names):
+    """
+    Returns {name: pk} for the given names, creating the missing rows.
+
+    Names cached in process cost nothing. The rest cost one IN lookup, plus
+    one bulk insert and one re-read when some names are new. Concurrent
+    writers creating the same name are tolerated. bulk_create() sends no
+    post_save, so new names invalidate the cached option lists here.
+    """
+    names = set(names)
+    if not names:
+        return {}
+    name_cache = get_name_cache(model)
+    found = name_cache.get_many(names)
+    missing = names - found.keys()
+    if missing:
+        fetched = dict(model.objects.filter(name__in=missing).values_list('name', 'pk'))
+        new = missing - fetched.keys()
+        if new:
+            model.objects.bulk_create([model(name=name) for name in new], ignore_conflicts=True)
+            caching.bump_version(caching.OPTIONS)
+            fetched.update(model.objects.filter(name__in=new).values_list('name', 'pk'))
+        # Rows created in a transaction that rolls back must not be cached.
+        transaction.on_commit(lambda: name_cache.set_many(fetched))
+        found.update(fetched)
+    return found
+
+
+def link_taxonomy(recipe, relation, names, replace=False):
+    """
+    Points a recipe's session/category/type M2M at the given names.
+
+    Writes every link in one bulk insert. With `replace`, links to other
+    names are removed in one DELETE first.
+    """
+    field = Recipe._meta.get_field(relation)
+    through = field.remote_field.through
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+    ids = set(resolve_names(field.related_model, names).values())
+
+    if replace:
+        through.objects.filter(**{source: recipe}).exclude(**{f'{target}__in': ids}).delete()
+    through.objects.bulk_create(
+        [through(**{f'{source}_id': recipe.pk, f'{target}_id': pk}) for pk in ids],
+        ignore_conflicts=True,
+    )
+
+
+def resolve_ingredients(names):
+    """
+    Returns {normalized name: Ingredient pk} for free-text ingredient names.
+    """
+    return resolve_names(Ingredient, (Ingredient.normalize(name) for name in names))
+
+
+def canonical_id(resolved, name):
+    return resolved[Ingredient.normalize(name)]
+
+
+def link_ingredients(recipe_ids=None):
+    """
+    Points RecipeIngredient.canonical at the catalog entry for its text.
+
+    Used after writes that bypass the serializers (admin inlines) and to
+    backfill existing rows. Pass None to relink every row. Returns the number
+    of rows changed.
+    """
+    rows = RecipeIngredient.objects.only('pk', 'ingredient', 'canonical_id').order_by('pk')
+    if recipe_ids is not None:
+        rows = rows.filter(recipe_id__in=list(recipe_ids))
+
+    changed = 0
+    last_pk = 0
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk)[:LINK_BATCH_SIZE])
+        if not batch:
+            return changed
+        resolved = resolve_ingredients(row.ingredient for row in batch)
+        stale = []
+        for row in batch:
+            pk = canonical_id(resolved, row.ingredient)
+            if row.canonical_id != pk:
+                row.canonical_id = pk
+                stale.append(row)
+        RecipeIngredient.objects.bulk_update(stale, ['canonical'])
+        changed += len(stale)
+        last_pk = batch[-1].pk
+
+
+def prune_ingredients():
+    """
+    Deletes catalog entries no recipe uses any more.
+    """
+    deleted, _ = Ingredient.objects.filter(recipe_ingredients__isnull=True).delete()
+    return deleted
@@ -0,0 +1,95 @@
+"""
+Validators for conditional GETs of recipes.
+
+What a recipe renders to changes when the row is saved, when its comments,
+image copies or taxonomy names change (all move `updated_at`, see
+touch_recipes), or when its likes or saves do (`counters_updated_at`). Both
+columns are on the recipe row, so a conditional request is answered with 304
+Not Modified after one indexed lookup, before any related data is loaded.
+
+view_count grows with every read and is left out: the ETags are weak, and a
+revalidated copy may show a few views less than the database.
+"""
+import hashlib
+
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .models import Recipe
+
+# Recipe columns that, with the pk, identify what a recipe renders to
+VALIDATOR_FIELDS = ('updated_at', 'counters_updated_at')
+
+
+def touch_recipes(recipe_ids):
+    """
+    Marks recipes as changed after a write that doesn't save the recipe row,
+    e.g. a new comment. `recipe_ids` can be a list or a values queryset.
+    """
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+
+
+def validators(recipe):
+    return (recipe.pk, *(getattr(recipe, name) for name in VALIDATOR_FIELDS))
+
+
+def validator_queryset(queryset):
+    """
+    The same rows as `queryset`, loading only the validator columns and
+    whatever its ordering needs.
+    """
+    concrete = {field.name for field in queryset.model._meta.concrete_fields}
+    ordering = {name.lstrip('-') for name in queryset.query.order_by if isinstance(name, str)}
+    return (
+        queryset.select_related(None).prefetch_related(None)
+        .only(*VALIDATOR_FIELDS, *(ordering & concrete))
+    )
+
+
+def is_conditional(request):
+    return 'If-None-Match' in request.headers or 'If-Modified-Since' in request.headers
+
+
+def get_etag(request, rows):
+    """
+    Weak ETag of a response made of `rows` (validators() tuples), for this
+    URL, host and format.
+    """
+    digest = hashlib.md5(usedforsecurity=False)
+    # Image URLs are absolute, so the host is part of the representation.
+    for part in (request.get_host(), request.get_full_path(), request.accepted_renderer.format):
+        digest.update(f'{part}\n'.encode())
+    for pk, *changed in rows:
+        digest.update(f'{pk}:{":".join(str(value.timestamp()) for value in changed)}\n'.encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+def get_last_modified(rows):
+    changed = [value for _, *values in rows for value in values]
+    return int(max(changed).timestamp()) if changed else None
+
+
+def not_modified(request, rows):
+    """
+    Returns a 304 response if the client holds the current version of `rows`,
+    otherwise None.
+    """
+    etag, last_modified = get_etag(request, rows), get_last_modified(rows)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+def add_validators(request, response, rows):
+    set_validators(response, get_etag(request, rows), get_last_modified(rows))
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # Clients may keep the payload but revalidate it on every use.
+    response['Cache-Control'] = 'no-cache'
@@ -0,0 +1,164 @@
+"""
+Cache of serialized recipe details.
+
+A recipe's detail payload is cached under a per-recipe version that
+recipes.signals bumps whenever something it shows changes: the recipe row,
+its steps, ingredients, taxonomy links, comments or image copies. Taxonomy
+renames are covered by the /options/ version (caching.OPTIONS), which is
+part of both keys; a rename also moves the tagged recipes' updated_at.
+
+Likes, saves and views would otherwise invalidate a hot recipe many times a
+second, so their counts live in a small entry of their own (one query to
+rebuild) with a version bumped by recipes.counters and recipes.view_counter.
+At read time it is laid over the cached payload, and it also holds the
+validators for conditional requests, so a hot recipe is served without any
+query. The ids of the users who liked or saved the recipe grow with its
+popularity, so they are cached per relation and patched by each toggle
+instead of being reloaded; a list whose length disagrees with its counter
+missed a patch and is reloaded.
+
+Like recipes.view_counter, this needs a cache shared by all workers in
+production.
+"""
+from django.contrib.postgres.expressions import ArraySubquery
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import OuterRef
+
+from . import caching
+from .conditional import VALIDATOR_FIELDS
+from .metrics import count_cache_lookup
+from .models import Recipe
+
+DETAIL = 'recipe-detail'
+COUNTERS = 'recipe-counters'
+USER_IDS = 'recipe-user-ids'
+
+# Detail fields that come from the counters entry instead of the payload
+VOLATILE_FIELDS = ('view_count', 'like_count', 'save_count')
+
+# Detail fields listing user ids, with the counter of each (as in
+# recipes.counters.COUNTER_FIELDS)
+USER_ID_FIELDS = {'likes': 'like_count', 'saved_by': 'save_count'}
+
+
+def _namespace(kind, recipe_id):
+    return f'{kind}:{recipe_id}'
+
+
+def invalidate(recipe_ids):
+    """
+    Drops the cached detail and counters of recipes once the current
+    transaction commits.
+    """
+    for pk in recipe_ids:
+        caching.bump_version(_namespace(DETAIL, pk))
+
+
+def invalidate_counters(recipe_ids):
+    for pk in recipe_ids:
+        caching.bump_version(_namespace(COUNTERS, pk))
+
+
+def invalidate_user_ids(recipe_ids):
+    # For writes that bypass patch_user_ids, e.g. admin edits and cascades.
+    for pk in recipe_ids:
+        caching.bump_version(_namespace(USER_IDS, pk))
+
+
+def _load_counters(recipe_id):
+    return (
+        Recipe.objects.filter(pk=recipe_id, is_published=True)
+        .values(*VALIDATOR_FIELDS, *VOLATILE_FIELDS)
+        .first()
+    )
+
+
+def _user_ids_key(recipe_id, relation):
+    namespace = _namespace(USER_IDS, recipe_id)
+    return f'{namespace}:{caching.get_version(namespace)}:{relation}'
+
+
+def _load_user_ids(recipe_id, relations):
+    # One query however many of the lists are missing; aliased because
+    # annotations can't reuse the M2M field names.
+    subqueries = {
+        f'{relation}_ids': ArraySubquery(
+            getattr(Recipe, relation).through.objects
+            .filter(recipe_id=OuterRef('pk')).order_by('pk').values('user_id')
+        )
+        for relation in relations
+    }
+    row = Recipe.objects.filter(pk=recipe_id).values(**subqueries).first() or {}
+    return {relation: row.get(f'{relation}_ids', []) for relation in relations}
+
+
+def get_user_ids(recipe_id, counters):
+    """
+    Returns the ids of the users who liked and saved the recipe, as a dict
+    of detail field to list, checked against the counts in `counters`.
+    """
+    keys = {relation: _user_ids_key(recipe_id, relation) for relation in USER_ID_FIELDS}
+    cached = cache.get_many(keys.values())
+    user_ids, missing = {}, []
+    for relation, key in keys.items():
+        ids = cached.get(key)
+        hit = ids is not None and len(ids) == counters[USER_ID_FIELDS[relation]]
+        count_cache_lookup(USER_IDS, hit)
+        if hit:
+            user_ids[relation] = ids
+        else:
+            missing.append(relation)
+    if missing:
+        loaded = _load_user_ids(recipe_id, missing)
+        cache.set_many({keys[relation]: ids for relation, ids in loaded.items()}, caching.PAYLOAD_TIMEOUT)
+        user_ids.update(loaded)
+    return user_ids
+
+
+def patch_user_ids(relation, recipe_id, user_id, active):
+    """
+    Adds or removes `user_id` in the cached ids of a toggled relation once
+    the current transaction commits. A list that isn't cached is left to
+    the next read.
+    """
+    def patch():
+        key = _user_ids_key(recipe_id, relation)
+        ids = cache.get(key)
+        if ids is not None:
+            ids = [pk for pk in ids if pk != user_id] + ([user_id] if active else [])
+            cache.set(key, ids, caching.PAYLOAD_TIMEOUT)
+
+    transaction.on_commit(patch)
+
+
+def get_counters(recipe_id):
+    """
+    Returns the recipe's validators and volatile fields as a dict, or None
+    if there is no published recipe with that id.
+    """
+    detail = caching.get_version(_namespace(DETAIL, recipe_id))
+    counters = caching.get_version(_namespace(COUNTERS, recipe_id))
+    options = caching.get_version(caching.OPTIONS)
+    # Keyed by all three: content changes and taxonomy renames move
+    # updated_at, and content changes is_published.
+    return caching.get_or_build(
+        _namespace(COUNTERS, recipe_id), f'{detail}-{counters}-{options}', 'row',
+        lambda: _load_counters(recipe_id),
+    )
+
+
+def get_detail(recipe_id, host, build):
+    """
+    Returns the cached payload of a recipe, calling build() on a miss.
+    Image URLs are absolute, so payloads are kept per host.
+    """
+    version = caching.get_version(_namespace(DETAIL, recipe_id))
+    options = caching.get_version(caching.OPTIONS)
+    return caching.get_or_build(_namespace(DETAIL, recipe_id), version, f'{options}:{host}', build)
+
+
+def overlay(payload, counters, user_ids, pending_views=0):
+    data = {**payload, **{name: counters[name] for name in VOLATILE_FIELDS}, **user_ids}
+    data['view_count'] += pending_views
+    return data
@@ -0,0 +1,134 @@
+"""
+Streaming export of the recipe corpus as NDJSON or CSV.
+
+Recipes are read through a server-side cursor with .iterator(); related
+rows are prefetched once per chunk, so the export costs a fixed number of
+queries per chunk and constant memory for any number of recipes.
+
+Rows come out in (updated_at, id) order. The last row's pair is the
+watermark to pass as `since` / `after_id` for the next incremental export.
+"""
+import csv
+import json
+
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Recipe, RecipeIngredient, RecipeStep
+
+CHUNK_SIZE = 2000
+
+CSV_COLUMNS = [
+    'id', 'title', 'description', 'author', 'region', 'session', 'category', 'type',
+    'servings', 'prep_time', 'cook_time', 'is_published', 'image',
+    'view_count', 'like_count', 'save_count', 'comment_count',
+    'created_at', 'updated_at', 'ingredients', 'steps',
+]
+# Separator of multi-valued taxonomy names in CSV cells
+CSV_LIST_SEPARATOR = '|'
+
+
+def parse_since(value):
+    """
+    Parses an ISO 8601 watermark; naive values are in the current time zone.
+    Raises ValueError for anything else.
+    """
+    since = parse_datetime(value)
+    if since is None:
+        raise ValueError(f'Invalid datetime: {value!r}')
+    return timezone.make_aware(since) if timezone.is_naive(since) else since
+
+
+def export_queryset(since=None, after_id=None):
+    """
+    Recipes to export, optionally only those changed after a watermark.
+    """
+    queryset = Recipe.objects.all()
+    if since is not None:
+        later = Q(updated_at__gt=since)
+        if after_id is not None:
+            later |= Q(updated_at=since, pk__gt=after_id)
+        queryset = queryset.filter(later)
+    return (
+        queryset.select_related('author', 'region')
+        .defer('search_vector')
+        .prefetch_related(
+            'session', 'category', 'type',
+            Prefetch('recipe_ingredients', queryset=RecipeIngredient.objects.order_by('pk')),
+            Prefetch('steps', queryset=RecipeStep.objects.order_by('step_no', 'pk')),
+        )
+        .order_by('updated_at', 'pk')
+    )
+
+
+def _file_url(file):
+    return file.url if file else None
+
+
+def to_record(recipe):
+    return {
+        'id': recipe.pk,
+        'title': recipe.title,
+        'description': recipe.description,
+        'author': recipe.author.username,
+        'region': recipe.region.name if recipe.region else None,
+        'session': [item.name for item in recipe.session.all()],
+        'category': [item.name for item in recipe.category.all()],
+        'type': [item.name for item in recipe.type.all()],
+        'servings': recipe.servings,
+        'prep_time': recipe.prep_time,
+        'cook_time': recipe.cook_time,
+        'is_published': recipe.is_published,
+        'image': _file_url(recipe.image),
+        'view_count': recipe.view_count,
+        'like_count': recipe.like_count,
+        'save_count': recipe.save_count,
+        'comment_count': recipe.comment_count,
+        # Full precision, so the last row can serve as an exact watermark
+        'created_at': recipe.created_at.isoformat(),
+        'updated_at': recipe.updated_at.isoformat(),
+        'ingredients': [
+            {'ingredient': item.ingredient, 'quantity': item.quantity}
+            for item in recipe.recipe_ingredients.all()
+        ],
+        'steps': [
+            {'step_no': step.step_no, 'instruction': step.instruction,
+             'timer': step.timer, 'image': _file_url(step.image)}
+            for step in recipe.steps.all()
+        ],
+    }
+
+
+def iter_records(queryset, chunk_size=CHUNK_SIZE):
+    # With prefetch_related(), iterator() prefetches once per chunk.
+    for recipe in queryset.iterator(chunk_size=chunk_size):
+        yield to_record(recipe)
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record) + '\n'
+
+
+class _Line:
+    # Pseudo-buffer: csv.writer returns each row instead of buffering it.
+    def write(self, value):
+        return value
+
+
+def csv_lines(records):
+    writer = csv.writer(_Line())
+    yield writer.writerow(CSV_COLUMNS)
+    for record in records:
+        for name in ('session', 'category', 'type'):
+            record[name] = CSV_LIST_SEPARATOR.join(record[name])
+        for name in ('ingredients', 'steps'):
+            record[name] = json.dumps(record[name])
+        yield writer.writerow([record[name] for name in CSV_COLUMNS])
+
+
+FORMATS = {
+    'ndjson': ndjson_lines,
+    'csv': csv_lines,
+}
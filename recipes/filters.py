@@ -1,5 +1,9 @@
 import django_filters
-from .models import Recipe, Region, Session, Category, Type
+from django.db.models import Exists, OuterRef
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Recipe, Region, Session, Category, Type, Ingredient, RecipeIngredient
+from .search import search
 
 class RecipeFilter(django_filters.FilterSet):
     """
@@ -38,10 +42,7 @@ class RecipeFilter(django_filters.FilterSet):
     # --- Filtering by Ingredient Name ---
     # This filter searches for recipes that contain a specific ingredient.
     # e.g., /api/list/?ingredients=Chicken
-    ingredients = django_filters.CharFilter(
-        field_name='recipe_ingredients__ingredient',
-        lookup_expr='icontains' # Case-insensitive contains search
-    )
+    ingredients = django_filters.CharFilter(method='filter_ingredients')
 
     class Meta:
         model = Recipe
@@ -52,3 +53,45 @@ class RecipeFilter(django_filters.FilterSet):
             'type',
             'ingredients',
         ]
+
+    def filter_ingredients(self, queryset, name, value):
+        # Match the normalized catalog (trigram-indexed) instead of scanning
+        # every RecipeIngredient row; EXISTS keeps recipes from repeating.
+        term = Ingredient.normalize(value)
+        if not term:
+            return queryset
+        matches = Ingredient.objects.filter(name__contains=term)
+        return queryset.filter(Exists(
+            RecipeIngredient.objects.filter(recipe=OuterRef('pk'), canonical__in=matches)
+        ))
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """
+    Ranked full-text search over title, description, ingredients and taxonomy.
+    e.g., /api/list/?q="green curry" pan*
+    The legacy `search` parameter is accepted as well.
+    """
+    search_param = 'q'
+    legacy_search_param = 'search'
+
+    def get_search_text(self, request):
+        params = request.query_params
+        return params.get(self.search_param) or params.get(self.legacy_search_param, '')
+
+    def filter_queryset(self, request, queryset, view):
+        text = self.get_search_text(request).strip()
+        if not text:
+            return queryset
+        return search(queryset, text)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.search_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Full-text search. Use "quotes" for phrases and a trailing * for prefixes.',
+                'schema': {'type': 'string'},
+            },
+        ]
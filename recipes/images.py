@@ -0,0 +1,212 @@
+"""
+Resized, re-encoded copies of uploaded images.
+
+After an upload commits, the original is read from storage and rendered
+into a square thumbnail plus a few responsive widths. EXIF is dropped (after
+applying its orientation) and the copies are re-encoded as WebP or
+progressive JPEG. Rendering runs in a process pool, fed by a few threads
+that do the storage and database I/O.
+
+The stored names go into the `<field>_variants` JSON column next to the
+image, e.g. {"source": <original name>, "thumbnail": ..., "320w": ...}.
+`source` tells which upload they were made from, so a stale or missing set
+is easy to spot and re-rendering the same upload is a no-op.
+
+Nothing here imports models at module level, so worker processes can load
+it without setting Django up.
+"""
+import io
+import logging
+import multiprocessing
+import posixpath
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.dispatch import Signal
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (200, 200)
+# Responsive widths, for srcset; never wider than the original
+WIDTHS = (320, 640, 1024)
+
+ENCODERS = {
+    'WEBP': ('webp', {'quality': 80, 'method': 4}),
+    'JPEG': ('jpg', {'quality': 82, 'progressive': True, 'optimize': True}),
+}
+
+# Sent with the model as sender and `pk` once a row's copies are replaced
+variants_changed = Signal()
+
+_pools_lock = threading.Lock()
+_threads = None
+_processes = None
+
+
+def image_fields():
+    """
+    The (model, image field name) pairs that get resized copies.
+    """
+    return [
+        (apps.get_model('recipes', 'Recipe'), 'image'),
+        (apps.get_model('recipes', 'RecipeStep'), 'image'),
+        (apps.get_model(settings.AUTH_USER_MODEL), 'profile_picture'),
+    ]
+
+
+def variants_field(field_name):
+    return f'{field_name}_variants'
+
+
+def variant_names(variants):
+    """
+    Stored names of the copies in a `<field>_variants` value.
+    """
+    return [name for key, name in (variants or {}).items() if key != 'source']
+
+
+def render_variants(data, image_format='WEBP'):
+    """
+    Returns ({variant: encoded bytes}, file extension) for the image in `data`.
+
+    Pure Pillow work; runs in the process pool.
+    """
+    from PIL import Image, ImageOps
+
+    extension, options = ENCODERS[image_format]
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        keep_alpha = image_format == 'WEBP' and image.mode in ('RGBA', 'LA', 'P')
+        image = image.convert('RGBA' if keep_alpha else 'RGB')
+
+    def encode(copy):
+        buffer = io.BytesIO()
+        # Saving without `exif=` leaves the metadata behind.
+        copy.save(buffer, image_format, **options)
+        return buffer.getvalue()
+
+    rendered = {'thumbnail': encode(ImageOps.fit(image, THUMBNAIL_SIZE, Image.LANCZOS))}
+    widths = [width for width in WIDTHS if width < image.width] or [image.width]
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        rendered[f'{width}w'] = encode(image.resize((width, height), Image.LANCZOS))
+    return rendered, extension
+
+
+def _pools():
+    global _threads, _processes
+    with _pools_lock:
+        if _processes is None:
+            workers = settings.IMAGE_PIPELINE_WORKERS
+            # spawn: forking a process that runs threads is not safe.
+            _processes = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+            _threads = ThreadPoolExecutor(workers, thread_name_prefix='image-variants')
+        return _threads, _processes
+
+
+def _render(data):
+    image_format = settings.IMAGE_VARIANT_FORMAT
+    if settings.IMAGE_PIPELINE_WORKERS <= 0:
+        return render_variants(data, image_format)
+    _, processes = _pools()
+    return processes.submit(render_variants, data, image_format).result()
+
+
+def _delete_files(storage, names):
+    for name in names:
+        storage.delete(name)
+
+
+def process(model, pk, field_name, force=False):
+    """
+    Renders and stores the copies of one row's image, replacing older ones.
+
+    Returns False if there was nothing to do.
+    """
+    column = variants_field(field_name)
+    manager = model._default_manager
+    row = manager.filter(pk=pk).values(field_name, column).first()
+    if row is None:
+        return False
+    name, old = row[field_name] or '', row[column] or {}
+    if old.get('source', '') == name and not force:
+        return False
+
+    storage = model._meta.get_field(field_name).storage
+    variants = {'source': name}
+    if name:
+        try:
+            with storage.open(name, 'rb') as file:
+                rendered, extension = _render(file.read())
+        except Exception:
+            # Unreadable or not an image: remember the source so it isn't retried.
+            logger.warning('Could not render variants of %s', name, exc_info=True)
+        else:
+            root = posixpath.join('variants', posixpath.splitext(name)[0])
+            for key, content in rendered.items():
+                variants[key] = storage.save(f'{root}/{key}.{extension}', ContentFile(content))
+
+    # Only attach the copies if the row still points at the same upload.
+    updated = manager.filter(pk=pk, **{field_name: row[field_name]}).update(**{column: variants})
+    _delete_files(storage, variant_names(old if updated else variants))
+    if updated:
+        variants_changed.send(sender=model, pk=pk)
+    return bool(updated)
+
+
+def process_many(model, pks, field_name, force=False):
+    """
+    Renders the copies of many rows, IMAGE_PIPELINE_WORKERS at a time.
+    Returns the number of rows updated.
+    """
+    workers = settings.IMAGE_PIPELINE_WORKERS
+    if workers <= 0:
+        return sum(process(model, pk, field_name, force) for pk in pks)
+
+    def run(pk):
+        try:
+            return process(model, pk, field_name, force)
+        finally:
+            connections.close_all()
+
+    with ThreadPoolExecutor(workers, thread_name_prefix='image-variants') as threads:
+        return sum(threads.map(run, pks))
+
+
+def _process_in_thread(label, pk, field_name):
+    try:
+        process(apps.get_model(label), pk, field_name)
+    except Exception:
+        logger.exception('Image variants failed for %s %s.%s', label, pk, field_name)
+    finally:
+        # Pool threads outlive requests; don't leak their connections.
+        connections.close_all()
+
+
+def process_later(model, pk, field_name):
+    """
+    Queues rendering of a row's image once the current transaction commits.
+    """
+    def submit():
+        if settings.IMAGE_PIPELINE_WORKERS <= 0:
+            process(model, pk, field_name)
+            return
+        threads, _ = _pools()
+        threads.submit(_process_in_thread, model._meta.label, pk, field_name)
+
+    transaction.on_commit(submit)
+
+
+def refresh_if_stale(instance, field_name):
+    """
+    Queues rendering if the instance's copies weren't made from its current
+    image (new upload, replaced, or cleared).
+    """
+    name = getattr(instance, field_name).name or ''
+    variants = getattr(instance, variants_field(field_name)) or {}
+    if variants.get('source', '') != name:
+        process_later(type(instance), instance.pk, field_name)
@@ -0,0 +1,278 @@
+"""
+Bulk import of recipes from NDJSON (one JSON recipe per line).
+
+Records are validated with RecipeSerializer, then written a batch at a
+time: region, taxonomy and ingredient names are resolved once per batch,
+and recipes, ingredients, steps and M2M links each go in with one COPY.
+Each batch commits on its own. A record that fails validation or its
+write is reported and the run carries on.
+
+Input is consumed line by line, so memory stays flat for any file size.
+"""
+import collections
+import functools
+import io
+import itertools
+import json
+import multiprocessing
+
+from django.db import DatabaseError, connection, connections, transaction
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import as_serializer_error
+
+from .catalog import canonical_id, resolve_ingredients, resolve_names
+from .leaderboard import refresh_scores
+from .models import Recipe, RecipeIngredient, RecipeStep, Region
+from .search import update_search_vectors
+from .serializers import RecipeSerializer
+
+BATCH_SIZE = 500
+
+
+def _copy_value(value):
+    # PostgreSQL COPY text format
+    if value is None:
+        return '\\N'
+    if hasattr(value, 'adapted'):
+        # psycopg2 Json wrapper of a JSONField value
+        value = value.dumps(value.adapted)
+    return (
+        str(value).replace('\\', '\\\\').replace('\t', '\\t')
+        .replace('\n', '\\n').replace('\r', '\\r')
+    )
+
+
+def copy_rows(model, columns, rows):
+    """
+    Inserts rows (tuples of column values) with COPY, or bulk_create()
+    on databases other than PostgreSQL.
+    """
+    if not rows:
+        return
+    if connection.vendor != 'postgresql':
+        model.objects.bulk_create([model(**dict(zip(columns, row))) for row in rows])
+        return
+
+    quote = connection.ops.quote_name
+    sql = f'COPY {quote(model._meta.db_table)} ({", ".join(map(quote, columns))}) FROM STDIN'
+    with connection.cursor() as cursor:
+        if hasattr(cursor.cursor, 'copy'):
+            # psycopg 3
+            with cursor.cursor.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            data = ''.join('\t'.join(map(_copy_value, row)) + '\n' for row in rows)
+            cursor.cursor.copy_expert(sql, io.StringIO(data))
+
+
+def reserve_pks(model, count):
+    """
+    Draws `count` primary keys from the table's sequence (PostgreSQL only).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+            [model._meta.db_table, model._meta.pk.column, count],
+        )
+        return [value for value, in cursor.fetchall()]
+
+
+def copy_objects(model, objs):
+    """
+    Saves new model instances with COPY. Their primary keys are drawn from
+    the table's sequence first, so they can be referenced by child rows.
+    """
+    if not objs:
+        return objs
+    if connection.vendor != 'postgresql':
+        return model.objects.bulk_create(objs)
+
+    pk = model._meta.pk
+    for obj, value in zip(objs, reserve_pks(model, len(objs))):
+        setattr(obj, pk.attname, value)
+
+    fields = model._meta.concrete_fields
+    # The connection proxy costs an attribute lookup per value; resolve it once.
+    conn = connections[connection.alias]
+    copy_rows(model, [field.column for field in fields], [
+        # pre_save() fills auto_now(_add) timestamps like a regular save()
+        tuple(field.get_db_prep_save(field.pre_save(obj, True), conn) for field in fields)
+        for obj in objs
+    ])
+    for obj in objs:
+        obj._state.adding = False
+    return objs
+
+
+def read_records(lines):
+    """
+    Yields (line number, record, error) for every non-blank NDJSON line.
+    """
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield number, None, {'non_field_errors': [f'Invalid JSON: {exc}']}
+            continue
+        if not isinstance(record, dict):
+            yield number, None, {'non_field_errors': ['Expected a JSON object.']}
+            continue
+        yield number, record, None
+
+
+@functools.lru_cache(maxsize=None)
+def _validator():
+    # One unbound serializer per process validates every record, so its
+    # fields are built once instead of per record.
+    return RecipeSerializer()
+
+
+def validate_records(records):
+    """
+    Returns [(line number, validated data, errors)] for read_records() output.
+
+    Module level so a process pool can run it.
+    """
+    validated = []
+    for number, record, errors in records:
+        data = None
+        if errors is None:
+            try:
+                data = _validator().run_validation(record)
+            except ValidationError as exc:
+                errors = as_serializer_error(exc)
+        validated.append((number, data, errors))
+    return validated
+
+
+def _forget_connections():
+    # A forked worker must not use (or close) the parent's database sockets;
+    # it opens its own if it ever needs one.
+    for conn in connections.all(initialized_only=True):
+        conn.connection = None
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+class RecipeImporter:
+    """
+    Imports NDJSON recipe records for one author.
+
+    run() yields one {'line': n, 'errors': {...}} dict per rejected record;
+    `created` and `failed` hold the running totals. With `workers` > 1,
+    records are validated in that many forked processes while the current
+    one writes.
+    """
+
+    def __init__(self, author, batch_size=BATCH_SIZE, workers=0):
+        self.author = author
+        self.batch_size = batch_size
+        self.workers = workers
+        self.created = 0
+        self.failed = 0
+
+    def validated_batches(self, lines):
+        chunks = _chunks(read_records(lines), self.batch_size)
+        if self.workers <= 1:
+            yield from map(validate_records, chunks)
+            return
+
+        with multiprocessing.get_context('fork').Pool(self.workers, _forget_connections) as pool:
+            # Keep a bounded number of chunks in flight so memory stays flat.
+            pending = collections.deque()
+            for chunk in chunks:
+                pending.append(pool.apply_async(validate_records, (chunk,)))
+                if len(pending) >= self.workers * 2:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+
+    def run(self, lines):
+        for results in self.validated_batches(lines):
+            batch = []
+            for number, data, errors in results:
+                if errors is None:
+                    batch.append((number, data))
+                else:
+                    self.failed += 1
+                    yield {'line': number, 'errors': errors}
+            yield from self.flush(batch)
+
+    def summary(self):
+        return {'created': self.created, 'failed': self.failed}
+
+    def flush(self, batch):
+        if not batch:
+            return
+        try:
+            with transaction.atomic():
+                self.write([data for _, data in batch])
+        except DatabaseError:
+            if len(batch) == 1:
+                self.failed += 1
+                yield {'line': batch[0][0], 'errors': {'non_field_errors': ['Could not be saved.']}}
+                return
+            # Retry one record per transaction to find the rows at fault.
+            for item in batch:
+                yield from self.flush([item])
+            return
+        self.created += len(batch)
+
+    def write(self, records):
+        regions = resolve_names(Region, {data['region'] for data in records})
+        taxonomy = {
+            relation: resolve_names(
+                Recipe._meta.get_field(relation).related_model,
+                {name for data in records for name in data[relation]},
+            )
+            for relation in RecipeSerializer.TAXONOMY_FIELDS
+        }
+        canonical = resolve_ingredients(
+            item['ingredient'] for data in records for item in data['ingredients']
+        )
+
+        nested = ('region', 'ingredients', 'steps', *RecipeSerializer.TAXONOMY_FIELDS)
+        recipes = copy_objects(Recipe, [
+            Recipe(
+                author=self.author, region_id=regions[data['region']],
+                **{name: value for name, value in data.items() if name not in nested},
+            )
+            for data in records
+        ])
+
+        copy_rows(RecipeIngredient, ('recipe_id', 'ingredient', 'quantity', 'canonical_id'), [
+            (recipe.pk, item['ingredient'], item['quantity'], canonical_id(canonical, item['ingredient']))
+            for recipe, data in zip(recipes, records)
+            for item in data['ingredients']
+        ])
+        # Uploaded step images can't travel in NDJSON; steps are text only.
+        copy_rows(RecipeStep, ('recipe_id', 'step_no', 'instruction', 'timer', 'image', 'image_variants'), [
+            (recipe.pk, step['step_no'], step['instruction'], step.get('timer', ''), '', '{}')
+            for recipe, data in zip(recipes, records)
+            for step in data.get('steps', [])
+        ])
+        for relation, ids in taxonomy.items():
+            field = Recipe._meta.get_field(relation)
+            copy_rows(
+                field.remote_field.through,
+                (f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id'),
+                [
+                    (recipe.pk, pk)
+                    for recipe, data in zip(recipes, records)
+                    for pk in {ids[name] for name in data[relation]}
+                ],
+            )
+
+        # bulk_create() sends no post_save, so index and score the batch here.
+        recipe_ids = [recipe.pk for recipe in recipes]
+        update_search_vectors(recipe_ids)
+        refresh_scores(recipe_ids)
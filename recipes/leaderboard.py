@@ -0,0 +1,111 @@
+"""
+Time-decayed "top recipes" leaderboard.
+
+A recipe's popularity is a weighted sum of its likes, saves, comments and
+views. Its rank in a window is popularity * 2 ** (-age / half_life), which is
+stored in log form:
+
+    log(popularity) + created_at * ln(2) / half_life
+
+Ordering by that gives the same order at any moment, so a score only has to be
+recomputed when the recipe's counters change, never because time passed.
+
+Every window ranks all published recipes; they differ in half-life only. With
+a short one an old recipe needs far more popularity to outrank a new one, but
+nothing is cut off by creation date.
+"""
+import math
+from datetime import timedelta
+
+from django.core.cache import cache
+
+from .metrics import count_cache_lookup
+from .models import Recipe, RecipeScore
+
+# Weight of each counter in the popularity sum
+WEIGHTS = {
+    'like_count': 3.0,
+    'save_count': 4.0,
+    'comment_count': 2.0,
+    'view_count': 0.1,
+}
+
+# window name -> (RecipeScore field, half-life)
+WINDOWS = {
+    'day': ('day', timedelta(hours=6)),
+    'week': ('week', timedelta(days=1)),
+    'all': ('all_time', timedelta(days=30)),
+}
+DEFAULT_WINDOW = 'week'
+
+TOP_LIMIT = 6
+CACHE_TIMEOUT = 60
+REFRESH_BATCH_SIZE = 1000
+
+
+def popularity(recipe):
+    # Starts at 1 so brand-new recipes still rank by recency.
+    return 1.0 + sum(weight * getattr(recipe, field) for field, weight in WEIGHTS.items())
+
+
+def compute_scores(recipe):
+    created = recipe.created_at.timestamp()
+    base = math.log(popularity(recipe))
+    return {
+        field: base + created * math.log(2) / half_life.total_seconds()
+        for field, half_life in WINDOWS.values()
+    }
+
+
+def refresh_scores(recipe_ids=None):
+    """
+    Recomputes and upserts RecipeScore rows. Pass None to refresh every recipe.
+
+    Costs one read and one INSERT ... ON CONFLICT per batch of recipes.
+    """
+    recipes = Recipe.objects.only('pk', 'created_at', *WEIGHTS).order_by('pk')
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=list(recipe_ids))
+    fields = [field for field, _ in WINDOWS.values()]
+
+    refreshed = 0
+    last_pk = 0
+    while True:
+        batch = list(recipes.filter(pk__gt=last_pk)[:REFRESH_BATCH_SIZE])
+        if not batch:
+            return refreshed
+        RecipeScore.objects.bulk_create(
+            [RecipeScore(recipe_id=recipe.pk, **compute_scores(recipe)) for recipe in batch],
+            update_conflicts=True,
+            unique_fields=['recipe'],
+            update_fields=fields + ['updated_at'],
+        )
+        refreshed += len(batch)
+        if len(batch) < REFRESH_BATCH_SIZE:
+            return refreshed
+        last_pk = batch[-1].pk
+
+
+def top_recipes(window, queryset=None, limit=TOP_LIMIT):
+    """
+    Returns the best published recipes for a window, read from the score index.
+    """
+    field, _ = WINDOWS[window]
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    queryset = queryset.filter(is_published=True, score__isnull=False)
+    return queryset.order_by(f'-score__{field}', '-pk')[:limit]
+
+
+def get_cached(window, key, build):
+    """
+    Serves a rendered leaderboard from the cache, rebuilding it at most once
+    per CACHE_TIMEOUT.
+    """
+    cache_key = f'top-recipes:{window}:{key}'
+    payload = cache.get(cache_key)
+    count_cache_lookup('top-recipes', payload is not None)
+    if payload is None:
+        payload = build()
+        cache.set(cache_key, payload, CACHE_TIMEOUT)
+    return payload
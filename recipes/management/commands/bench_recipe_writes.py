@@ -0,0 +1,76 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from recipes.catalog import canonical_id, resolve_ingredients
+from recipes.models import Recipe, RecipeIngredient, RecipeStep
+from recipes.nested import create_ingredients, create_steps
+
+User = get_user_model()
+
+
+def per_row_insert(recipe, ingredients_data, steps_data):
+    # The previous write path: one INSERT per ingredient and per step
+    canonical = resolve_ingredients(item['ingredient'] for item in ingredients_data)
+    for item in ingredients_data:
+        RecipeIngredient.objects.create(
+            recipe=recipe, canonical_id=canonical_id(canonical, item['ingredient']), **item
+        )
+    for step in steps_data:
+        RecipeStep.objects.create(recipe=recipe, **step)
+
+
+def bulk_insert(recipe, ingredients_data, steps_data):
+    create_ingredients(recipe, ingredients_data)
+    create_steps(recipe, steps_data)
+
+
+class Command(BaseCommand):
+    help = ("Compare nested ingredient/step insert latency of the per-row and bulk write paths. "
+            "Runs in a transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[5, 15, 30, 60, 120],
+                            help="Ingredient counts to measure; each run uses half as many steps.")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs per size (median is reported).")
+
+    def measure(self, insert, author, ingredients_data, steps_data, repeat):
+        timings = []
+        for _ in range(repeat):
+            recipe = Recipe.objects.create(author=author, title='bench', description='bench')
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                insert(recipe, ingredients_data, steps_data)
+                timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), len(queries)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'ingredients':>11} {'steps':>5} | {'per-row ms':>10} {'queries':>7} | "
+                          f"{'bulk ms':>8} {'queries':>7} | {'speedup':>7}")
+        with transaction.atomic():
+            author = User.objects.create_user(
+                email='bench-writes@example.com', username='bench-writes', password=None
+            )
+            for size in options['sizes']:
+                ingredients_data = [
+                    {'ingredient': f'Ingredient {i}', 'quantity': f'{i} g'} for i in range(size)
+                ]
+                steps_data = [
+                    {'step_no': i + 1, 'instruction': f'Step {i + 1}', 'timer': ''} for i in range(size // 2)
+                ]
+                # Warm up the ingredient catalog so both paths only insert rows
+                resolve_ingredients(item['ingredient'] for item in ingredients_data)
+
+                row_ms, row_queries = self.measure(per_row_insert, author, ingredients_data, steps_data,
+                                                   options['repeat'])
+                bulk_ms, bulk_queries = self.measure(bulk_insert, author, ingredients_data, steps_data,
+                                                     options['repeat'])
+                self.stdout.write(
+                    f"{size:>11} {len(steps_data):>5} | {row_ms:>10.2f} {row_queries:>7} | "
+                    f"{bulk_ms:>8.2f} {bulk_queries:>7} | {row_ms / bulk_ms:>6.1f}x"
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,95 @@
+import json
+import os
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from recipes import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Load-test the hot recipe endpoints and report p50/p95/p99 latency and req/s per scenario. "
+            "The first run is saved as the baseline; later runs are compared against it. "
+            "Seed data first with seed_corpus.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Base URL of a running server, e.g. http://127.0.0.1:8000 "
+                                          "(default: in process through the test client).")
+        parser.add_argument('--host', default='localhost', help="Host header of in-process requests.")
+        parser.add_argument('--scenarios', nargs='+', choices=list(benchmark.SCENARIOS),
+                            default=list(benchmark.SCENARIOS))
+        parser.add_argument('--concurrency', type=int, default=8, help="Concurrent clients.")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per scenario.")
+        parser.add_argument('--requests', type=int, help="Requests per scenario, instead of --duration.")
+        parser.add_argument('--warmup', type=float, default=2.0, help="Unmeasured seconds before each scenario.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed of the request mix.")
+        parser.add_argument('--baseline', default='benchmark-baseline.json', help="Baseline file.")
+        parser.add_argument('--update-baseline', action='store_true',
+                            help="Save this run as the baseline after comparing.")
+        parser.add_argument('--tolerance', type=float, default=0.1,
+                            help="Relative change tolerated before a metric counts as a regression.")
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help="Exit with an error if any metric regressed.")
+
+    def handle(self, *args, **options):
+        corpus = benchmark.Corpus.load(random.Random(options['seed']), users=options['concurrency'] * 4)
+        if not corpus.recipe_ids or not corpus.tokens:
+            raise CommandError("No published recipes or active users; run seed_corpus first.")
+
+        if options['url']:
+            make_client = lambda: benchmark.HTTPClient(options['url'])
+        else:
+            make_client = lambda: benchmark.InProcessClient(options['host'])
+
+        config = {
+            key: options[key] for key in ('url', 'concurrency', 'duration', 'requests', 'seed')
+        }
+        results = {}
+        self.stdout.write(f"{'scenario':<14} {'requests':>8} {'errors':>6} {'req/s':>8} "
+                          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for name in options['scenarios']:
+            build = benchmark.SCENARIOS[name]
+            if options['warmup'] > 0:
+                benchmark.run_scenario(build, corpus, make_client, options['concurrency'],
+                                       duration=options['warmup'], seed=options['seed'] + 1)
+            result = benchmark.run_scenario(
+                build, corpus, make_client, options['concurrency'],
+                duration=options['duration'], requests=options['requests'], seed=options['seed'],
+            )
+            results[name] = result
+            self.stdout.write(
+                f"{name:<14} {result['requests']:>8} {result['errors']:>6} {result['rps']:>8.1f} "
+                + ' '.join(f"{result[key]:>8.2f}" if result[key] is not None else f"{'-':>8}"
+                           for key in benchmark.PERCENTILES)
+            )
+
+        path = options['baseline']
+        regressed = []
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                baseline = json.load(file)
+            if baseline.get('config') != config:
+                self.stdout.write(self.style.WARNING(
+                    f"Baseline was measured with {baseline.get('config')}; this run used {config}."
+                ))
+            self.stdout.write(f"\nCompared with {path} ({baseline.get('created')}):")
+            for name, metric, old, new, change, worse in benchmark.compare(
+                results, baseline['results'], options['tolerance']
+            ):
+                line = f"{name:<14} {metric:<6} {old:>10.2f} -> {new:>10.2f}"
+                if change is not None:
+                    line += f" ({change:+.1%})"
+                if worse:
+                    regressed.append(f"{name} {metric}")
+                    line = self.style.ERROR(line + "  regressed")
+                self.stdout.write(line)
+
+        if not os.path.exists(path) or options['update_baseline']:
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump({'created': timezone.now().isoformat(), 'config': config, 'results': results},
+                          file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {path}."))
+
+        if regressed and options['fail_on_regression']:
+            raise CommandError(f"Regressed: {', '.join(regressed)}.")
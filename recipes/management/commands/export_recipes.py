@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import exporter
+
+
+class Command(BaseCommand):
+    help = ("Stream every recipe with its ingredients, steps and taxonomy as NDJSON or CSV. "
+            "Prints the watermark for the next incremental export on stderr.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(exporter.FORMATS), default='ndjson')
+        parser.add_argument('--output', '-o', default='-', help="File to write, or - for stdout.")
+        parser.add_argument('--since', help="Only recipes updated after this ISO 8601 time.")
+        parser.add_argument('--after-id', type=int,
+                            help="With --since: also recipes updated at exactly --since whose id is greater.")
+        parser.add_argument('--chunk-size', type=int, default=exporter.CHUNK_SIZE,
+                            help="Recipes fetched (and prefetched for) per round trip.")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = exporter.parse_since(options['since'])
+            except ValueError as exc:
+                raise CommandError(exc)
+
+        queryset = exporter.export_queryset(since, options['after_id'])
+        progress = {'count': 0}
+
+        def records():
+            for record in exporter.iter_records(queryset, options['chunk_size']):
+                progress.update(count=progress['count'] + 1, since=record['updated_at'], after_id=record['id'])
+                yield record
+
+        lines = exporter.FORMATS[options['format']](records())
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+        else:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
+
+        if progress['count']:
+            self.stderr.write(f"Exported {progress['count']} recipes. "
+                              f"Next run: --since {progress['since']} --after-id {progress['after_id']}")
+        else:
+            self.stderr.write("No recipes to export.")
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes import view_counter
+
+
+class Command(BaseCommand):
+    help = "Write buffered recipe views to Recipe.view_count."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep running and flush once per RECIPE_VIEW_FLUSH_INTERVAL.")
+
+    def handle(self, *args, **options):
+        while True:
+            written = view_counter.flush()
+            self.stdout.write(f"Flushed {written} views.")
+            if not options['loop']:
+                break
+            time.sleep(view_counter.get_interval())
@@ -0,0 +1,46 @@
+import json
+import os
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.importer import BATCH_SIZE, RecipeImporter
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ("Import recipes from an NDJSON file (one recipe per line, same fields as the create API). "
+            "Rejected records are reported on stderr and do not stop the import.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="NDJSON file to read, or - for stdin.")
+        parser.add_argument('--author', required=True, help="Email of the user the recipes are credited to.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help="Recipes written per transaction.")
+        parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 1) - 1),
+                            help="Processes validating records while this one writes (1 validates in process).")
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(email=options['author'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user with email {options['author']!r}.")
+
+        importer = RecipeImporter(author, batch_size=options['batch_size'], workers=options['workers'])
+        stream = sys.stdin if options['path'] == '-' else open(options['path'], encoding='utf-8')
+        start = time.monotonic()
+        try:
+            for error in importer.run(stream):
+                self.stderr.write(json.dumps(error))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {importer.created} recipes ({importer.failed} rejected) in {elapsed:.1f}s "
+            f"({importer.created / max(elapsed, 1e-9):.0f} recipes/s)."
+        ))
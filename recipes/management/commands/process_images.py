@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from recipes import images
+
+
+class Command(BaseCommand):
+    help = ("Render the resized copies of recipe, step and profile images that are missing "
+            "or were made from an older upload.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help="Re-render every image, e.g. after changing the variant sizes or format.")
+
+    def handle(self, *args, **options):
+        for model, field_name in images.image_fields():
+            column = images.variants_field(field_name)
+            rows = model._default_manager.values_list('pk', field_name, column).order_by('pk')
+            pks = [
+                pk for pk, name, variants in rows.iterator()
+                if options['force'] or (variants or {}).get('source', '') != (name or '')
+            ]
+            updated = images.process_many(model, pks, field_name, force=options['force'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{model._meta.verbose_name_plural}: rendered {updated} of {len(pks)} stale images."
+            ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipes.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = "Recompute Recipe.search_vector for every recipe (or the given ids)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('recipe_ids', nargs='*', type=int,
+                            help="Only reindex these recipes (default: all).")
+
+    def handle(self, *args, **options):
+        updated = update_search_vectors(options['recipe_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Reindexed {updated} recipes."))
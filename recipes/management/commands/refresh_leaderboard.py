@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipes.leaderboard import refresh_scores
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed top-recipes scores for every recipe (or the given ids)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('recipe_ids', nargs='*', type=int,
+                            help="Only refresh these recipes (default: all).")
+
+    def handle(self, *args, **options):
+        refreshed = refresh_scores(options['recipe_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed scores for {refreshed} recipes."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import refresh_counters
+
+
+class Command(BaseCommand):
+    help = "Recompute Recipe.like_count, save_count and comment_count from their tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('recipe_ids', nargs='*', type=int,
+                            help="Only refresh these recipes (default: all).")
+
+    def handle(self, *args, **options):
+        updated = refresh_counters(options['recipe_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed counters for {updated} recipes."))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.seeding import BATCH_SIZE, SEED_PASSWORD, CorpusSeeder
+
+
+class Command(BaseCommand):
+    help = ("Seed a synthetic corpus of users, recipes, ingredients, steps, likes, saves and comments "
+            "for load tests. The same --seed and sizes always produce the same corpus.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000, help="Recipes to create.")
+        parser.add_argument('--users', type=int, default=10_000,
+                            help=f"Users to create (password {SEED_PASSWORD!r}); they author, like and comment.")
+        parser.add_argument('--likes', type=float, default=20.0, help="Average likes per recipe.")
+        parser.add_argument('--saves', type=float, default=5.0, help="Average saves per recipe.")
+        parser.add_argument('--comments', type=float, default=3.0, help="Average comments per recipe.")
+        parser.add_argument('--days', type=int, default=365, help="Recipes are spread over this many days.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Recipes written per transaction.")
+
+    def handle(self, *args, **options):
+        seeder = CorpusSeeder(
+            options['users'], options['recipes'],
+            likes_per_recipe=options['likes'], saves_per_recipe=options['saves'],
+            comments_per_recipe=options['comments'], days=options['days'],
+            seed=options['seed'], batch_size=options['batch_size'],
+        )
+        start = time.monotonic()
+        for created in seeder.run():
+            elapsed = time.monotonic() - start
+            self.stdout.write(f"{created}/{options['recipes']} recipes ({created / max(elapsed, 1e-9):.0f}/s)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(seeder.user_ids)} users, {seeder.created_recipes} recipes, {seeder.created_likes} likes, "
+            f"{seeder.created_saves} saves and {seeder.created_comments} comments "
+            f"in {time.monotonic() - start:.1f}s."
+        ))
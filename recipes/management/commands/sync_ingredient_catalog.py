@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from recipes.catalog import link_ingredients, prune_ingredients
+
+
+class Command(BaseCommand):
+    help = "Link every RecipeIngredient to its normalized Ingredient catalog entry."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true',
+                            help="Also delete catalog entries no recipe uses.")
+
+    def handle(self, *args, **options):
+        linked = link_ingredients()
+        self.stdout.write(self.style.SUCCESS(f"Linked {linked} recipe ingredients."))
+        if options['prune']:
+            pruned = prune_ingredients()
+            self.stdout.write(self.style.SUCCESS(f"Pruned {pruned} unused ingredients."))
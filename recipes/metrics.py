@@ -0,0 +1,26 @@
+"""
+Prometheus metrics of recipe activity and of the recipe caches.
+
+Served with the request metrics at /metrics (see backend.metrics).
+"""
+from prometheus_client import Counter
+
+LIKES = Counter('recipe_likes', 'Recipe likes added and removed.', ['action'])
+SAVES = Counter('recipe_saves', 'Recipe saves added and removed.', ['action'])
+COMMENTS = Counter('recipe_comments', 'Comments posted on recipes.')
+VIEWS = Counter('recipe_views', 'Recipe detail views.')
+
+# M2M relation toggled by recipes.counters -> its counter
+TOGGLES = {
+    'likes': LIKES,
+    'saved_by': SAVES,
+}
+
+CACHE_LOOKUPS = Counter(
+    'recipe_cache_lookups', 'Lookups in the recipe caches, by cache and result (hit/miss).',
+    ['cache', 'result'],
+)
+
+
+def count_cache_lookup(cache_name, hit):
+    CACHE_LOOKUPS.labels(cache=cache_name, result='hit' if hit else 'miss').inc()
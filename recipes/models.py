@@ -1,5 +1,8 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 
 class Region(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -34,6 +37,8 @@ class Recipe(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     image = models.ImageField(upload_to='recipe_images/', blank=True, null=True)
+    # Resized copies of `image`, maintained by recipes.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     region = models.ForeignKey(Region, on_delete=models.CASCADE, related_name='recipes', null=True, blank=True)
     session = models.ManyToManyField(Session, related_name='recipes', blank=True)
@@ -44,25 +49,77 @@ class Recipe(models.Model):
     saved_by = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='saved_recipes', blank=True)
     view_count = models.PositiveIntegerField(default=0)
 
+    # Denormalized sizes of `likes`, `saved_by` and `comments`, kept in step by recipes.counters
+    like_count = models.PositiveIntegerField(default=0)
+    save_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also moved by changes to comments and image copies (recipes.conditional)
     updated_at = models.DateTimeField(auto_now=True)
+    # Last change to `likes` or `saved_by`
+    counters_updated_at = models.DateTimeField(default=timezone.now, editable=False)
 
     is_published = models.BooleanField(default=True)
     servings = models.IntegerField(default=1)
     prep_time = models.IntegerField(help_text="Prep time in minutes", default=0)
     cook_time = models.IntegerField(help_text="Cook time in minutes", default=0)
 
+    # Weighted full-text document, maintained by recipes.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='recipe_search_vector_gin'),
+            # Keyset pagination over the newest-first lists
+            models.Index(fields=['-created_at', '-id'], name='recipe_created_idx'),
+            # Partial: the public lists only ever read published recipes
+            models.Index(
+                fields=['-created_at', '-id'], condition=models.Q(is_published=True),
+                name='recipe_published_created_idx',
+            ),
+            models.Index(fields=['author', '-created_at', '-id'], name='recipe_author_created_idx'),
+            # Incremental exports seek by (updated_at, id) watermarks
+            models.Index(fields=['updated_at', 'id'], name='recipe_updated_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
     def total_likes(self):
-        return self.likes.count()
+        return self.like_count
+
+
+class Ingredient(models.Model):
+    """
+    Canonical ingredient names (trimmed, lowercase) shared by all recipes.
+    """
+    name = models.CharField(max_length=100, unique=True)
+
+    class Meta:
+        ordering = ['name']
+        indexes = [
+            # Serves substring lookups (name__contains) through pg_trgm
+            GinIndex(fields=['name'], name='ingredient_name_trgm', opclasses=['gin_trgm_ops']),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    @staticmethod
+    def normalize(name):
+        return ' '.join(name.split()).lower()
 
 
 class RecipeIngredient(models.Model):
     recipe = models.ForeignKey("Recipe", on_delete=models.CASCADE, related_name="recipe_ingredients")
+    # Name as the author wrote it; `canonical` links it to the catalog
     ingredient = models.CharField(max_length=100)
     quantity = models.CharField(max_length=100)
+    canonical = models.ForeignKey(
+        Ingredient, on_delete=models.PROTECT, related_name='recipe_ingredients',
+        null=True, blank=True, editable=False,
+    )
 
     def __str__(self):
         return f"{self.ingredient} - {self.quantity}"
@@ -74,9 +131,15 @@ class RecipeStep(models.Model):
     instruction = models.TextField()
     timer = models.CharField(max_length=50, blank=True)
     image = models.ImageField(upload_to='step_images/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         ordering = ['step_no']
+        indexes = [
+            models.Index(fields=['step_no', 'id'], name='step_no_id_idx'),
+            # A recipe's steps in order (detail prefetch, nested updates)
+            models.Index(fields=['recipe', 'step_no'], name='step_recipe_no_idx'),
+        ]
 
     def __str__(self):
         return f"Step {self.step_no} for {self.recipe.title}"
@@ -93,10 +156,38 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipe', '-created_at', '-id'], name='comment_recipe_created_idx'),
+        ]
 
     def __str__(self):
         return f'Comment by {self.author.username} on {self.recipe.title}'
 
+class RecipeScore(models.Model):
+    """
+    Precomputed popularity of a recipe for each leaderboard window.
+
+    Scores are log(popularity) plus a recency term that grows with the
+    recipe's creation time, so ordering by them decays exponentially with age
+    and they only change when the recipe's counters do (see recipes.leaderboard).
+    """
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE, primary_key=True, related_name='score')
+    day = models.FloatField(default=0)
+    week = models.FloatField(default=0)
+    all_time = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-day'], name='recipescore_day_idx'),
+            models.Index(fields=['-week'], name='recipescore_week_idx'),
+            models.Index(fields=['-all_time'], name='recipescore_all_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"Score for recipe {self.recipe_id}"
+
+
 class Feedback(models.Model):
     email = models.EmailField()
     message = models.TextField()
@@ -0,0 +1,216 @@
+"""
+Writes of a recipe's ingredients and steps.
+
+Updates are diffed against the stored rows instead of replacing them:
+steps are matched by step_no, ingredients by id or else by position, and
+only the difference is written, with at most one bulk_update, one
+bulk_create and one DELETE per table. Unchanged rows keep their primary
+keys and are not rewritten.
+
+With partial=True (PATCH) items are merged into the existing rows: fields
+left out of an item keep their value, rows left out of the list are kept,
+and an item with `delete: true` removes its row. Otherwise (PUT) the list
+is the complete set and unmatched rows are deleted.
+"""
+from django.db import transaction
+from django.db.models import FileField
+from django.db.models.fields.files import FieldFile
+
+from . import images
+from .catalog import canonical_id, resolve_ingredients
+from .models import RecipeIngredient, RecipeStep
+
+# Item keys that pick the row to write rather than holding a value
+CONTROL_KEYS = ('id', 'delete')
+
+
+def _values(item):
+    return {name: value for name, value in item.items() if name not in CONTROL_KEYS}
+
+
+def create_ingredients(recipe, ingredients_data, canonical=None):
+    # `canonical` may hold the names' catalog ids, resolved by the caller.
+    if canonical is None:
+        canonical = resolve_ingredients(item['ingredient'] for item in ingredients_data)
+    return RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(
+            recipe=recipe, canonical_id=canonical_id(canonical, item['ingredient']), **_values(item)
+        )
+        for item in ingredients_data
+    ])
+
+
+def create_steps(recipe, steps_data):
+    # bulk_create() runs FileField.pre_save on every row, so uploaded step
+    # images are written to storage first and the INSERT stores their names.
+    steps = RecipeStep.objects.bulk_create([
+        RecipeStep(recipe=recipe, **_values(step)) for step in steps_data
+    ])
+    # bulk_create() sends no post_save, so queue the resized copies here.
+    for step in steps:
+        images.refresh_if_stale(step, 'image')
+    return steps
+
+
+class Diff:
+    """
+    Collects the rows to update, create and delete for one table.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.updated = []
+        self.update_fields = set()
+        self.created = []
+        self.deleted = []
+        # Stored files that are no longer referenced once the diff is written
+        self.discarded_files = []
+
+    def assign(self, row, item):
+        """
+        Copies the item's values onto a matched row and queues it for
+        bulk_update if any of them differ.
+        """
+        changed = set()
+        for name, value in _values(item).items():
+            current = getattr(row, name)
+            if isinstance(current, FieldFile):
+                # A new upload always replaces the file; None clears it.
+                if not value and not current:
+                    continue
+                if current:
+                    # Its resized copies are replaced by recipes.images.
+                    self.discarded_files.append((current.storage, current.name))
+            elif current == value:
+                continue
+            setattr(row, name, value)
+            changed.add(name)
+
+        if changed:
+            self.updated.append(row)
+            self.update_fields |= changed
+        return changed
+
+    def delete(self, row):
+        self.deleted.append(row.pk)
+        for field in self.model._meta.concrete_fields:
+            # Checked first: reading a foreign key here would load its row.
+            if not isinstance(field, FileField):
+                continue
+            file = getattr(row, field.name)
+            if file:
+                # The resized copies (recipes.images) go with the file.
+                variants = getattr(row, images.variants_field(field.name), None)
+                for name in [file.name, *images.variant_names(variants)]:
+                    self.discarded_files.append((file.storage, name))
+
+    def save(self, create):
+        if self.deleted:
+            self.model.objects.filter(pk__in=self.deleted).delete()
+        if self.updated:
+            file_fields = [
+                field for field in self.model._meta.concrete_fields
+                if isinstance(field, FileField) and field.name in self.update_fields
+            ]
+            for field in file_fields:
+                # bulk_update() writes values as they are, so store new uploads first.
+                for row in self.updated:
+                    field.pre_save(row, add=False)
+            self.model.objects.bulk_update(self.updated, sorted(self.update_fields))
+            for field in file_fields:
+                # bulk_update() sends no post_save, so queue the resized copies here.
+                for row in self.updated:
+                    images.refresh_if_stale(row, field.name)
+        if self.created:
+            create(self.created)
+
+        # Only drop the old files once the rows pointing at them are gone for good.
+        for storage, name in self.discarded_files:
+            transaction.on_commit(lambda storage=storage, name=name: storage.delete(name))
+
+
+def sync_steps(recipe, steps_data, partial=False):
+    """
+    Writes the difference between the recipe's stored steps and steps_data,
+    matching them by step_no.
+    """
+    existing = {}
+    duplicates = []
+    for step in recipe.steps.order_by('step_no', 'pk'):
+        if step.step_no in existing:
+            duplicates.append(step)
+        else:
+            existing[step.step_no] = step
+
+    diff = Diff(RecipeStep)
+    for item in steps_data:
+        step = existing.pop(item['step_no'], None)
+        if item.get('delete'):
+            if step is not None:
+                diff.delete(step)
+        elif step is None:
+            diff.created.append(item)
+        else:
+            diff.assign(step, item)
+
+    if not partial:
+        for step in [*existing.values(), *duplicates]:
+            diff.delete(step)
+
+    diff.save(lambda items: create_steps(recipe, items))
+    return diff
+
+
+def sync_ingredients(recipe, ingredients_data, partial=False):
+    """
+    Writes the difference between the recipe's stored ingredients and
+    ingredients_data. Items carrying an id update that row; the others take
+    the remaining rows in order (PUT) or are added as new rows (PATCH).
+    """
+    rows = list(recipe.recipe_ingredients.order_by('pk'))
+    by_id = {row.pk: row for row in rows}
+    claimed = set()
+
+    pairs = []
+    for item in ingredients_data:
+        row = by_id.get(item.get('id'))
+        if row is not None:
+            claimed.add(row.pk)
+        pairs.append((row, item))
+
+    if not partial:
+        free = iter([row for row in rows if row.pk not in claimed])
+        pairs = [
+            (row, item) if row is not None or item.get('delete') else (next(free, None), item)
+            for row, item in pairs
+        ]
+        claimed.update(row.pk for row, _ in pairs if row is not None)
+
+    diff = Diff(RecipeIngredient)
+    renamed = []
+    for row, item in pairs:
+        if item.get('delete'):
+            if row is not None:
+                diff.delete(row)
+        elif row is None:
+            diff.created.append(item)
+        elif 'ingredient' in diff.assign(row, item):
+            renamed.append(row)
+
+    if not partial:
+        for row in rows:
+            if row.pk not in claimed:
+                diff.delete(row)
+
+    # Renamed and new rows look their names up in the catalog together.
+    canonical = resolve_ingredients(
+        [row.ingredient for row in renamed] + [item['ingredient'] for item in diff.created]
+    )
+    if renamed:
+        # Point renamed rows at their catalog entry in the same bulk_update
+        for row in renamed:
+            row.canonical_id = canonical_id(canonical, row.ingredient)
+        diff.update_fields.add('canonical')
+
+    diff.save(lambda items: create_ingredients(recipe, items, canonical))
+    return diff
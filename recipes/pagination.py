@@ -0,0 +1,157 @@
+"""
+Keyset (seek) pagination.
+
+Pages are cut with a WHERE on the last row's ordering values instead of an
+OFFSET, so page 500 costs the same as page 1 when an index matches the
+ordering. The primary key is appended to any ordering as a tie-breaker.
+
+The values go through the cursor as JSON, so ordering keys must compare
+exactly after that round trip: columns, integers, timestamps and decimals
+do, computed floats don't (see recipes.search for the rank).
+"""
+import datetime
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder rounds to milliseconds; the seek needs exact values.
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_ordering(self, queryset):
+        """
+        Returns the active ordering as [(attribute, descending)], ending in pk.
+        """
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        if not ordering:
+            model_fields = {field.name for field in queryset.model._meta.get_fields()}
+            ordering = ['-created_at'] if 'created_at' in model_fields else []
+
+        keys = []
+        for item in ordering:
+            if not isinstance(item, str):
+                raise TypeError('KeysetPagination only supports orderings by field or annotation name.')
+            descending = item.startswith('-')
+            name = item.lstrip('-')
+            keys.append(('pk' if name == 'id' else name, descending))
+
+        if not any(name == 'pk' for name, _ in keys):
+            keys.append(('pk', keys[0][1] if keys else False))
+        return keys
+
+    def decode_cursor(self, request, keys):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            values = cursor['v']
+            if cursor['o'] != [name for name, _ in keys] or len(values) != len(keys):
+                raise ValueError
+        except (BinasciiError, KeyError, TypeError, UnicodeEncodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def encode_cursor(self, row, keys):
+        cursor = {
+            'o': [name for name, _ in keys],
+            'v': [getattr(row, name) for name, _ in keys],
+        }
+        payload = json.dumps(cursor, cls=CursorEncoder, separators=(',', ':'))
+        return urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def seek(self, keys, values):
+        """
+        Builds the "comes after (v1, v2, ...)" condition for the ordering.
+        """
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(keys, values):
+            condition |= equal & Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+            equal &= Q(**{name: value})
+
+        # A plain range on the leading column lets the index narrow the scan.
+        name, descending = keys[0]
+        return Q(**{f'{name}__{"lte" if descending else "gte"}': values[0]}) & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        keys = self.get_ordering(queryset)
+        queryset = queryset.order_by(*[f'-{name}' if descending else name for name, descending in keys])
+
+        values = self.decode_cursor(request, keys)
+        if values is not None:
+            queryset = queryset.filter(self.seek(keys, values))
+
+        # One extra row tells whether another page exists.
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1], keys) if len(rows) > page_size else None
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results to return per page.',
+                'schema': {'type': 'integer'},
+            },
+        ]
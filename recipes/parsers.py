@@ -0,0 +1,14 @@
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Hands the view the request body as a lazy iterator of lines, so large
+    NDJSON uploads are never held in memory.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return iter(())
+        return iter(stream.readline, b'')
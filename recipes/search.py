@@ -0,0 +1,118 @@
+"""
+PostgreSQL full-text search over recipes.
+
+Recipe.search_vector stores a weighted tsvector (title A, description B,
+ingredient and taxonomy names C) behind a GIN index. It is refreshed with
+update_search_vectors() wherever recipes or their nested rows are written.
+"""
+import re
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db.models import DecimalField, F, OuterRef, Subquery
+from django.db.models.functions import Cast
+
+from .models import Recipe, RecipeIngredient, Region
+
+SEARCH_CONFIG = 'english'
+UPDATE_BATCH_SIZE = 1000
+
+# ts_rank() returns a float4, which doesn't survive the round trip through a
+# pagination cursor (recipes.pagination): ranks are compared as numeric with
+# this many decimals instead, exactly.
+RANK_DECIMAL_PLACES = 6
+
+# "a phrase" or a single term, optionally ending in * for prefix matching
+TOKEN_RE = re.compile(r'"([^"]+)"|(\S+)')
+WORD_RE = re.compile(r'\w+')
+
+
+def _names(queryset, field):
+    # Space-joined names of the rows related to the outer recipe
+    return Subquery(
+        queryset.order_by()
+        .values('recipe_id')
+        .annotate(names=StringAgg(field, ' '))
+        .values('names')
+    )
+
+
+def _taxonomy_names(relation):
+    through = getattr(Recipe, relation).through
+    target = Recipe._meta.get_field(relation).related_model._meta.model_name
+    return _names(through.objects.filter(recipe_id=OuterRef('pk')), f'{target}__name')
+
+
+def build_search_vector():
+    region = Subquery(Region.objects.filter(pk=OuterRef('region_id')).values('name')[:1])
+    ingredients = _names(RecipeIngredient.objects.filter(recipe_id=OuterRef('pk')), 'ingredient')
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(
+            ingredients, region,
+            _taxonomy_names('session'), _taxonomy_names('category'), _taxonomy_names('type'),
+            weight='C', config=SEARCH_CONFIG,
+        )
+    )
+
+
+def update_search_vectors(recipe_ids=None):
+    """
+    Recomputes Recipe.search_vector. Pass None to rebuild every recipe.
+    """
+    queryset = Recipe.objects.order_by('pk')
+    if recipe_ids is not None:
+        return queryset.filter(pk__in=list(recipe_ids)).update(search_vector=build_search_vector())
+
+    updated = 0
+    last_pk = 0
+    while True:
+        ids = list(queryset.filter(pk__gt=last_pk).values_list('pk', flat=True)[:UPDATE_BATCH_SIZE])
+        if not ids:
+            return updated
+        updated += Recipe.objects.filter(pk__in=ids).update(search_vector=build_search_vector())
+        last_pk = ids[-1]
+
+
+def parse_query(text):
+    """
+    Turns user input into a SearchQuery, or None if it has no searchable terms.
+
+    "quoted words" match as a phrase, a trailing * matches by prefix
+    (e.g. `pan*`), and all terms must match.
+    """
+    query = None
+    for phrase, term in TOKEN_RE.findall(text):
+        if phrase:
+            part = SearchQuery(phrase, search_type='phrase', config=SEARCH_CONFIG)
+        else:
+            words = WORD_RE.findall(term)
+            if not words:
+                continue
+            if term.endswith('*'):
+                # Only \w characters reach the raw tsquery syntax
+                raw = ' & '.join(words[:-1] + [f'{words[-1]}:*'])
+                part = SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+            else:
+                part = SearchQuery(' '.join(words), search_type='plain', config=SEARCH_CONFIG)
+        query = part if query is None else query & part
+    return query
+
+
+def search(queryset, text):
+    """
+    Filters a recipe queryset to full-text matches, ranked best first.
+    """
+    query = parse_query(text)
+    if query is None:
+        return queryset
+    rank = Cast(
+        SearchRank(F('search_vector'), query),
+        DecimalField(max_digits=RANK_DECIMAL_PLACES + 4, decimal_places=RANK_DECIMAL_PLACES),
+    )
+    return (
+        queryset.filter(search_vector=query)
+        .annotate(rank=rank)
+        .order_by('-rank', '-created_at')
+    )
@@ -0,0 +1,218 @@
+"""
+Synthetic recipe corpus for load tests and benchmarks.
+
+CorpusSeeder writes users, recipes with ingredients, steps and taxonomy,
+likes, saves and comments straight into the tables with COPY, one
+transaction per batch of recipes, so memory stays flat from 10^5 to 10^7
+recipes and the time goes into PostgreSQL's COPY and index upkeep.
+Everything is drawn from a seeded random generator, so the same options
+produce the same corpus on any database.
+
+Likes, saves and comments per recipe follow a long-tailed distribution
+(most recipes get a few, some get thousands), and recipes are spread over
+the last `days` days, so lists, search and the leaderboard see realistic
+data. Counters are written with the rows, and search vectors and scores
+are computed per batch, as the importer does.
+"""
+import itertools
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog import resolve_ingredients, resolve_names
+from .importer import copy_objects, copy_rows, reserve_pks
+from .leaderboard import refresh_scores
+from .models import Category, Comment, Recipe, RecipeIngredient, RecipeStep, Region, Session, Type
+from .search import update_search_vectors
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+SEED_PASSWORD = 'seed-password'
+
+REGIONS = [
+    'Indian', 'Italian', 'Mexican', 'Chinese', 'Japanese', 'Thai', 'French', 'Greek',
+    'Spanish', 'Lebanese', 'Korean', 'Vietnamese', 'Moroccan', 'Turkish', 'American',
+]
+SESSIONS = ['Breakfast', 'Brunch', 'Lunch', 'Snack', 'Dinner', 'Dessert']
+CATEGORIES = [
+    'Salad', 'Soup', 'Curry', 'Pasta', 'Rice', 'Bread', 'Grill', 'Stew', 'Baking',
+    'Noodles', 'Sandwich', 'Drink', 'Sauce', 'Stir-fry', 'Roast',
+]
+TYPES = ['Vegetarian', 'Vegan', 'Non-vegetarian', 'Eggetarian', 'Gluten-free', 'Dairy-free']
+
+INGREDIENT_BASES = [
+    'onion', 'garlic', 'ginger', 'tomato', 'potato', 'carrot', 'spinach', 'lentils', 'chickpeas',
+    'rice', 'flour', 'butter', 'olive oil', 'chicken', 'paneer', 'tofu', 'egg', 'milk', 'yogurt',
+    'cream', 'cheese', 'basil', 'coriander', 'mint', 'cumin', 'paprika', 'turmeric', 'chili',
+    'lemon', 'lime', 'honey', 'sugar', 'salt', 'pepper', 'mushroom', 'zucchini', 'eggplant',
+    'bell pepper', 'coconut milk', 'noodles', 'beef', 'pork', 'prawns', 'salmon', 'beans',
+]
+INGREDIENT_MODIFIERS = ['', 'fresh', 'dried', 'smoked', 'roasted', 'ground', 'chopped', 'red', 'green']
+QUANTITIES = ['1 cup', '2 cups', '1/2 cup', '1 tbsp', '2 tbsp', '1 tsp', '200 g', '500 g', '1 pinch', '2 pieces']
+
+TITLE_ADJECTIVES = [
+    'Spicy', 'Creamy', 'Smoky', 'Crispy', 'Quick', 'Classic', 'Rustic', 'Tangy', 'Golden',
+    'Herby', 'Sticky', 'Zesty', 'Hearty', 'Light', 'Slow-cooked',
+]
+DESCRIPTION_WORDS = [
+    'easy', 'weeknight', 'family', 'favourite', 'comforting', 'fragrant', 'bright', 'fresh',
+    'simmered', 'baked', 'tossed', 'layered', 'served', 'with', 'and', 'a', 'the', 'warm',
+    'bowl', 'crunchy', 'topping', 'sauce', 'glaze', 'side', 'leftovers', 'freezer', 'friendly',
+]
+STEP_VERBS = ['Chop', 'Heat', 'Stir in', 'Simmer', 'Season', 'Bake', 'Whisk', 'Fold in', 'Fry', 'Garnish with']
+COMMENT_TEXTS = [
+    'Loved it!', 'Made this twice already.', 'Needed a bit more salt.', 'Great weeknight dinner.',
+    'My kids asked for seconds.', 'Swapped the chili for paprika, still great.', 'Too spicy for me.',
+    'Perfect with rice.', 'Will make again.', 'Took longer than stated but worth it.',
+]
+
+
+def ingredient_names():
+    return [
+        f'{modifier} {base}'.strip()
+        for modifier in INGREDIENT_MODIFIERS for base in INGREDIENT_BASES
+    ]
+
+
+class CorpusSeeder:
+    """
+    Seeds `recipes` recipes from `users` new users.
+
+    run() yields the number of recipes written after each batch; the
+    `created_*` attributes hold the running totals. Users are named
+    `<prefix><n>` and numbered after the ones an earlier run left, so a
+    corpus can be grown by seeding again.
+    """
+
+    def __init__(self, users, recipes, likes_per_recipe=20.0, saves_per_recipe=5.0,
+                 comments_per_recipe=3.0, days=365, seed=0, batch_size=BATCH_SIZE, prefix='seed-user-'):
+        self.users = users
+        self.recipes = recipes
+        self.likes_per_recipe = likes_per_recipe
+        self.saves_per_recipe = saves_per_recipe
+        self.comments_per_recipe = comments_per_recipe
+        self.span = timedelta(days=days).total_seconds()
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.rng = random.Random(seed)
+        self.now = timezone.now()
+        self.user_ids = []
+        self.created_recipes = 0
+        self.created_likes = 0
+        self.created_saves = 0
+        self.created_comments = 0
+
+    def long_tail(self, mean):
+        # Pareto(2) - 1 has a mean of 1 and a heavy tail.
+        return min(len(self.user_ids), int(mean * (self.rng.paretovariate(2) - 1)))
+
+    def run(self):
+        with transaction.atomic():
+            self.seed_catalog()
+        for start in range(0, self.users, self.batch_size):
+            with transaction.atomic():
+                self.seed_users(min(self.batch_size, self.users - start))
+        if not self.user_ids:
+            return
+        for start in range(0, self.recipes, self.batch_size):
+            with transaction.atomic():
+                self.seed_recipes(min(self.batch_size, self.recipes - start))
+            yield self.created_recipes
+
+    def seed_catalog(self):
+        # Listed in a fixed order, so the same seed picks the same names.
+        def ids(model, names):
+            resolved = resolve_names(model, names)
+            return [resolved[name] for name in names]
+
+        self.regions = ids(Region, REGIONS)
+        self.taxonomy = {
+            'session': ids(Session, SESSIONS),
+            'category': ids(Category, CATEGORIES),
+            'type': ids(Type, TYPES),
+        }
+        names = ingredient_names()
+        resolved = resolve_ingredients(names)
+        self.ingredients = [(name, resolved[name]) for name in names]
+
+    def seed_users(self, count):
+        offset = User.objects.filter(username__startswith=self.prefix).count()
+        password = make_password(SEED_PASSWORD)
+        users = copy_objects(User, [
+            User(email=f'{self.prefix}{n}@example.com', username=f'{self.prefix}{n}', password=password)
+            for n in range(offset, offset + count)
+        ])
+        self.user_ids.extend(user.pk for user in users)
+
+    def random_time(self, after=None):
+        if after is None:
+            return self.now - timedelta(seconds=self.rng.random() * self.span)
+        return after + (self.now - after) * self.rng.random()
+
+    def seed_recipes(self, count):
+        rng = self.rng
+        ids = reserve_pks(Recipe, count)
+        recipes, ingredients, steps, links, likes, saves, comments = [], [], [], [], [], [], []
+
+        for pk in ids:
+            created = self.random_time()
+            liked_by = rng.sample(self.user_ids, self.long_tail(self.likes_per_recipe))
+            saved_by = rng.sample(self.user_ids, self.long_tail(self.saves_per_recipe))
+            comment_count = self.long_tail(self.comments_per_recipe)
+            picked = rng.sample(self.ingredients, rng.randint(4, 10))
+            main = picked[0][0]
+            recipes.append((
+                pk, rng.choice(self.user_ids),
+                f'{rng.choice(TITLE_ADJECTIVES)} {main.title()} {rng.choice(CATEGORIES)}',
+                ' '.join(rng.choices(DESCRIPTION_WORDS, k=20)) + f' {main}.',
+                '', '{}', rng.choice(self.regions),
+                # Views grow with likes, with some noise
+                len(liked_by) * rng.randint(5, 50) + rng.randint(0, 100),
+                len(liked_by), len(saved_by), comment_count,
+                created, created, created, rng.random() < 0.95,
+                rng.randint(1, 8), rng.choice([5, 10, 15, 20, 30]), rng.choice([0, 10, 20, 30, 45, 60, 90]),
+            ))
+            ingredients.extend((pk, name, rng.choice(QUANTITIES), ingredient_id) for name, ingredient_id in picked)
+            steps.extend(
+                (pk, step_no, f'{rng.choice(STEP_VERBS)} the {rng.choice(picked)[0]}.', '', '', '{}')
+                for step_no in range(1, rng.randint(3, 8) + 1)
+            )
+            for relation, choices in self.taxonomy.items():
+                links.extend((relation, pk, target) for target in rng.sample(choices, rng.randint(1, 2)))
+            likes.extend((pk, user_id) for user_id in liked_by)
+            saves.extend((pk, user_id) for user_id in saved_by)
+            comments.extend(
+                (pk, rng.choice(self.user_ids), rng.choice(COMMENT_TEXTS), self.random_time(created))
+                for _ in range(comment_count)
+            )
+
+        copy_rows(Recipe, (
+            'id', 'author_id', 'title', 'description', 'image', 'image_variants', 'region_id',
+            'view_count', 'like_count', 'save_count', 'comment_count',
+            'created_at', 'updated_at', 'counters_updated_at', 'is_published',
+            'servings', 'prep_time', 'cook_time',
+        ), recipes)
+        copy_rows(RecipeIngredient, ('recipe_id', 'ingredient', 'quantity', 'canonical_id'), ingredients)
+        copy_rows(RecipeStep, ('recipe_id', 'step_no', 'instruction', 'timer', 'image', 'image_variants'), steps)
+        for relation, rows in itertools.groupby(sorted(links, key=lambda link: link[0]), key=lambda link: link[0]):
+            field = Recipe._meta.get_field(relation)
+            copy_rows(
+                field.remote_field.through,
+                (f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id'),
+                [(recipe_id, target) for _, recipe_id, target in rows],
+            )
+        copy_rows(Recipe.likes.through, ('recipe_id', 'user_id'), likes)
+        copy_rows(Recipe.saved_by.through, ('recipe_id', 'user_id'), saves)
+        copy_rows(Comment, ('recipe_id', 'author_id', 'text', 'created_at'), comments)
+
+        update_search_vectors(ids)
+        refresh_scores(ids)
+        self.created_recipes += len(ids)
+        self.created_likes += len(likes)
+        self.created_saves += len(saves)
+        self.created_comments += len(comments)
@@ -1,18 +1,74 @@
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Prefetch
+from django.urls import reverse
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
+from rest_framework.utils.urls import replace_query_param
 from .models import (
     Recipe, Region, Session, Category,
     RecipeStep, Type, Feedback, RecipeIngredient, Comment
 )
+from .catalog import link_taxonomy, resolve_names
+from .pagination import KeysetPagination
+from .nested import create_ingredients, create_steps, sync_ingredients, sync_steps
+from .search import update_search_vectors
 
-class CommentSerializer(serializers.ModelSerializer):
+User = get_user_model()
+
+
+class EagerLoadingSerializerMixin:
+    """
+    Lets a serializer declare the related data it reads, so list views can
+    fetch it in a fixed number of queries instead of one per row.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    annotations = {}
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+        if cls.annotations:
+            queryset = queryset.annotate(**cls.annotations)
+        return queryset
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    URLs of an image's resized copies (see recipes.images), e.g.
+    {"thumbnail": ..., "320w": ..., "640w": ...}; the "<width>w" entries
+    make up a srcset. Empty until the copies are rendered.
+    """
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for variant, name in (value or {}).items():
+            if variant == 'source':
+                continue
+            url = default_storage.url(name)
+            urls[variant] = request.build_absolute_uri(url) if request is not None else url
+        return urls
+
+
+# Newest first; the comment list pages by keyset over (recipe, created_at, id)
+COMMENT_ORDERING = ('-created_at', '-id')
+
+
+class CommentSerializer(EagerLoadingSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the Comment model.
     """
     # Use ReadOnlyField to display the username instead of the user ID.
     author = serializers.ReadOnlyField(source='author.username')
 
+    select_related_fields = ('author',)
+
     class Meta:
         model = Comment
         fields = ['id', 'author', 'text', 'created_at']
@@ -50,14 +106,21 @@ from .models import (
 
 
 class RecipeIngredientSerializer(serializers.Serializer):
+    # On update, `id` picks the row to change and `delete` removes it.
+    id = serializers.IntegerField(required=False)
     ingredient = serializers.CharField()
     quantity = serializers.CharField()
+    delete = serializers.BooleanField(required=False, write_only=True)
 
 
 class RecipeStepSerializer(serializers.ModelSerializer):
+    # On update, steps are matched by step_no and `delete` removes one.
+    delete = serializers.BooleanField(required=False, write_only=True)
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = RecipeStep
-        fields = ['step_no', 'instruction', 'timer', 'image']
+        fields = ['step_no', 'instruction', 'timer', 'image', 'image_variants', 'delete']
 
 
 
@@ -72,7 +135,7 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     @extend_schema_field(OpenApiTypes.INT)
     def get_total_likes(self, obj):
-        return obj.likes.count()
+        return obj.like_count
 
     # These fields are for output only.
     total_likes = serializers.SerializerMethodField(method_name='get_total_likes')
@@ -87,39 +150,69 @@ class RecipeSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at', 'total_likes', 'is_published'
         ]
 
+    # M2M relations written from lists of names
+    TAXONOMY_FIELDS = ('session', 'category', 'type')
+
+    def validate_ingredients(self, ingredients):
+        ids = [item['id'] for item in ingredients if 'id' in item]
+        if ids and self.instance is None:
+            raise serializers.ValidationError("Ingredient ids can only be given when updating a recipe.")
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("Each ingredient id may appear only once.")
+        if ids:
+            known = set(self.instance.recipe_ingredients.filter(pk__in=ids).values_list('pk', flat=True))
+            unknown = sorted(set(ids) - known)
+            if unknown:
+                raise serializers.ValidationError(f"Unknown ingredient ids for this recipe: {unknown}")
+        if self.partial:
+            # Items without an id become new rows, so they need every value.
+            for item in ingredients:
+                if 'id' not in item and not item.get('delete') and not {'ingredient', 'quantity'} <= item.keys():
+                    raise serializers.ValidationError("New ingredients need both `ingredient` and `quantity`.")
+        return ingredients
+
+    def validate_steps(self, steps):
+        numbers = [step.get('step_no') for step in steps]
+        if None in numbers:
+            raise serializers.ValidationError("Every step needs a `step_no`.")
+        if len(numbers) != len(set(numbers)):
+            raise serializers.ValidationError("Each step_no may appear only once.")
+        if self.partial and any('instruction' not in step and not step.get('delete') for step in steps):
+            # Steps without an instruction can only patch an existing step.
+            existing = set(self.instance.steps.values_list('step_no', flat=True))
+            missing = sorted(
+                step['step_no'] for step in steps
+                if 'instruction' not in step and not step.get('delete') and step['step_no'] not in existing
+            )
+            if missing:
+                raise serializers.ValidationError(f"New steps need an `instruction`: step_no {missing}")
+        return steps
+
     def create(self, validated_data):
         # Pop the nested data from the validated data
         ingredients_data = validated_data.pop('ingredients')
         steps_data = validated_data.pop('steps', [])
         region_name = validated_data.pop('region')
-        session_names = validated_data.pop('session')
-        category_names = validated_data.pop('category')
-        type_names = validated_data.pop('type')
-
-        # It returns a tuple (object, created_boolean), we only need the object.
-        region, _ = Region.objects.get_or_create(name=region_name)
-
-        # Create the recipe instance with the simple fields
-        recipe = Recipe.objects.create(region=region, **validated_data)
+        taxonomy = {relation: validated_data.pop(relation) for relation in self.TAXONOMY_FIELDS}
 
-        for name in session_names:
-            session, _ = Session.objects.get_or_create(name=name)
-            recipe.session.add(session)
+        # All or nothing: a failure halfway must not leave a partial recipe
+        with transaction.atomic():
+            # Names are resolved in one IN lookup per table (and cached in process)
+            region_id = resolve_names(Region, [region_name])[region_name]
 
-        for name in category_names:
-            category, _ = Category.objects.get_or_create(name=name)
-            recipe.category.add(category)
+            # Create the recipe instance with the simple fields
+            recipe = Recipe.objects.create(region_id=region_id, **validated_data)
 
-        for name in type_names:
-            type_obj, _ = Type.objects.get_or_create(name=name)
-            recipe.type.add(type_obj)
+            # One bulk insert per M2M relation
+            for relation, names in taxonomy.items():
+                link_taxonomy(recipe, relation, names)
 
-        # Create the related Ingredient and Step objects
-        for item in ingredients_data:
-            RecipeIngredient.objects.create(recipe=recipe, **item)
+            # Create the related Ingredient and Step objects, one INSERT each
+            create_ingredients(recipe, ingredients_data)
+            create_steps(recipe, steps_data)
 
-        for step in steps_data:
-            RecipeStep.objects.create(recipe=recipe, **step)
+            # Index the recipe together with its ingredient and taxonomy names
+            update_search_vectors([recipe.pk])
 
         return recipe
 
@@ -128,77 +221,92 @@ class RecipeSerializer(serializers.ModelSerializer):
         ingredients_data = validated_data.pop('ingredients', None)
         steps_data = validated_data.pop('steps', None)
         region_name = validated_data.pop('region', None)
-        session_names = validated_data.pop('session', None)
-        category_names = validated_data.pop('category', None)
-        type_names = validated_data.pop('type', None)
-
-        if region_name:
-            instance.region, _ = Region.objects.get_or_create(name=region_name)
-
-        if session_names:
-            instance.session.clear()
-            for name in session_names:
-                session, _ = Session.objects.get_or_create(name=name)
-                instance.session.add(session)
-
-        if category_names:
-            instance.category.clear()
-            for name in category_names:
-                category, _ = Category.objects.get_or_create(name=name)
-                instance.category.add(category)
-
-        if type_names:
-            instance.type.clear()
-            for name in type_names:
-                type_obj, _ = Type.objects.get_or_create(name=name)
-                instance.type.add(type_obj)
-
-        # Handle ingredients and steps update (delete old, create new)
-        if ingredients_data is not None:
-            instance.recipe_ingredients.all().delete()
-            for item in ingredients_data:
-                RecipeIngredient.objects.create(recipe=instance, **item)
-
-        if steps_data is not None:
-            instance.steps.all().delete()
-            for step in steps_data:
-                RecipeStep.objects.create(recipe=instance, **step)
-
-        # Update the remaining simple fields on the instance
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-
-        instance.save()
+        taxonomy = {relation: validated_data.pop(relation, None) for relation in self.TAXONOMY_FIELDS}
+
+        with transaction.atomic():
+            if region_name:
+                instance.region_id = resolve_names(Region, [region_name])[region_name]
+
+            # Replace the links of every non-empty list, without a clear() + add() per name
+            for relation, names in taxonomy.items():
+                if names:
+                    link_taxonomy(instance, relation, names, replace=True)
+
+            # Write only what changed in the ingredients and steps (see nested.py)
+            if ingredients_data is not None:
+                sync_ingredients(instance, ingredients_data, partial=self.partial)
+
+            if steps_data is not None:
+                sync_steps(instance, steps_data, partial=self.partial)
+
+            # Update the remaining simple fields on the instance
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+
+            instance.save()
+            update_search_vectors([instance.pk])
+
         return instance
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(EagerLoadingSerializerMixin, serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source='author.username')
 
     @extend_schema_field(OpenApiTypes.INT)
     def get_likes(self, obj):
-        return obj.total_likes()
+        return obj.like_count
 
     likes = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
+
+    select_related_fields = ('author',)
+    # Keeps the `likes__count` ordering on list views working off the counter column.
+    annotations = {'likes__count': F('like_count')}
 
     class Meta:
         model = Recipe
-        fields = ['id', 'title', 'description', 'image', 'likes', 'author', 'view_count']
+        fields = ['id', 'title', 'description', 'image', 'image_variants', 'likes', 'author', 'view_count']
 
 
-class RecipeDetailSerializer(serializers.ModelSerializer):
+class RecipeDetailSerializer(EagerLoadingSerializerMixin, serializers.ModelSerializer):
     region = serializers.StringRelatedField()
     session = serializers.StringRelatedField(many=True)
     category = serializers.StringRelatedField(many=True)
     type = serializers.StringRelatedField(many=True)
     steps = RecipeStepSerializer(many=True, read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
+    image_variants = ImageVariantsField()
+
+    # Only the newest comments are embedded; `comments_next` continues in
+    # the comment list. `comment_count` has the total.
+    RECENT_COMMENTS = 10
+
+    @extend_schema_field(CommentSerializer(many=True))
+    def get_comments(self, obj):
+        comments = obj.recent_comments[:self.RECENT_COMMENTS]
+        return CommentSerializer(comments, many=True, context=self.context).data
+
+    @extend_schema_field(OpenApiTypes.URI)
+    def get_comments_next(self, obj):
+        if len(obj.recent_comments) <= self.RECENT_COMMENTS:
+            return None
+        paginator = KeysetPagination()
+        keys = paginator.get_ordering(Comment.objects.order_by(*COMMENT_ORDERING))
+        cursor = paginator.encode_cursor(obj.recent_comments[self.RECENT_COMMENTS - 1], keys)
+        url = replace_query_param(
+            reverse('comment-list-create', kwargs={'recipe_pk': obj.pk}), paginator.cursor_query_param, cursor
+        )
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+    comments = serializers.SerializerMethodField()
+    comments_next = serializers.SerializerMethodField()
 
     @extend_schema_field({
         'type': 'array',
         'items': {
             'type': 'object',
             'properties': {
+                'id': {'type': 'integer'},
                 'ingredient': {'type': 'string'},
                 'quantity': {'type': 'string'}
             }
@@ -206,15 +314,31 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
     })
     def get_ingredients(self, obj):
         return [
-            {"ingredient": ri.ingredient, "quantity": ri.quantity}
+            {"id": ri.id, "ingredient": ri.ingredient, "quantity": ri.quantity}
             for ri in obj.recipe_ingredients.all()
         ]
 
     ingredients = serializers.SerializerMethodField()
 
+    select_related_fields = ('region',)
+    prefetch_related_fields = (
+        'session', 'category', 'type', 'steps',
+        # In insertion order, which is the order updates match by position
+        Prefetch('recipe_ingredients', queryset=RecipeIngredient.objects.order_by('pk')),
+        # One more than is shown tells whether there are older ones
+        Prefetch(
+            'comments',
+            queryset=Comment.objects.select_related('author').order_by(*COMMENT_ORDERING)[:RECENT_COMMENTS + 1],
+            to_attr='recent_comments',
+        ),
+        # Only the ids are rendered, so don't load whole user rows.
+        Prefetch('likes', queryset=User.objects.only('id')),
+        Prefetch('saved_by', queryset=User.objects.only('id')),
+    )
+
     class Meta:
         model = Recipe
-        fields = '__all__'
+        exclude = ['search_vector', 'counters_updated_at']
 
 
 class FeedbackSerializer(serializers.ModelSerializer):
@@ -0,0 +1,207 @@
+from django.conf import settings
+from django.db import connections
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import caching, detail_cache, images
+from .conditional import touch_recipes
+from .catalog import forget_names
+from .counters import COUNTER_FIELDS, comment_added, comment_removed, refresh_counters
+from .leaderboard import refresh_scores
+from .models import (
+    Category, Comment, Ingredient, Recipe, RecipeIngredient, RecipeStep, Region, Session, Type,
+)
+from .search import update_search_vectors
+
+
+def _affected_recipe_ids(instance, reverse, pk_set):
+    if not reverse:
+        return [instance.pk]
+    if pk_set is not None:
+        return list(pk_set)
+    return None
+
+
+def _make_counter_receiver(relation):
+    related_name = Recipe._meta.get_field(relation).remote_field.related_name
+
+    def sync_counter(sender, instance, action, reverse, pk_set, **kwargs):
+        # `clear` on the reverse side carries no pk_set, so remember the
+        # user's recipes before the rows go away.
+        if action == 'pre_clear' and reverse:
+            instance._cleared_recipe_ids = list(
+                getattr(instance, related_name).values_list('pk', flat=True)
+            )
+        elif action in ('post_add', 'post_remove'):
+            refresh_counters(_affected_recipe_ids(instance, reverse, pk_set))
+        elif action == 'post_clear':
+            if reverse:
+                refresh_counters(getattr(instance, '_cleared_recipe_ids', []))
+            else:
+                refresh_counters([instance.pk])
+
+    return sync_counter
+
+
+# Keep like_count/save_count right when the M2M managers are used directly,
+# e.g. from the admin. The toggle views go through recipes.counters instead.
+for _relation in COUNTER_FIELDS:
+    m2m_changed.connect(
+        _make_counter_receiver(_relation),
+        sender=getattr(Recipe, _relation).through,
+        weak=False,
+        dispatch_uid=f'recipes.sync_{_relation}_counter',
+    )
+
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def remember_counted_recipes(sender, instance, **kwargs):
+    # Deleting a user cascades through the M2M tables without m2m_changed.
+    ids = set()
+    for relation in COUNTER_FIELDS:
+        related_name = Recipe._meta.get_field(relation).remote_field.related_name
+        ids.update(getattr(instance, related_name).values_list('pk', flat=True))
+    instance._counted_recipe_ids = ids
+    instance._deleted_recipe_ids = set(instance.recipes.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def refresh_counted_recipes(sender, instance, **kwargs):
+    ids = getattr(instance, '_counted_recipe_ids', None)
+    if ids:
+        refresh_counters(ids)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        comment_added(instance.recipe_id)
+    else:
+        # An edited comment changes the recipe's detail as well.
+        touch_recipes([instance.recipe_id])
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, origin=None, **kwargs):
+    # Comments deleted along with their recipe (or its author) leave no
+    # counter to update, and rescoring the recipe would re-insert its
+    # deleted score row.
+    if isinstance(origin, Recipe) or (isinstance(origin, QuerySet) and origin.model is Recipe):
+        return
+    if instance.recipe_id in getattr(origin, '_deleted_recipe_ids', ()):
+        return
+    comment_removed(instance.recipe_id)
+
+
+@receiver(post_save, sender=Recipe)
+def score_new_recipe(sender, instance, created, **kwargs):
+    # New recipes enter the leaderboard on recency alone.
+    if created:
+        refresh_scores([instance.pk])
+
+
+def _make_image_receiver(field_name):
+    def queue_image_variants(sender, instance, raw=False, **kwargs):
+        # Uploads are rendered into resized copies after the save commits.
+        if not raw:
+            images.refresh_if_stale(instance, field_name)
+    return queue_image_variants
+
+
+for _model, _field_name in images.image_fields():
+    post_save.connect(
+        _make_image_receiver(_field_name),
+        sender=_model,
+        weak=False,
+        dispatch_uid=f'recipes.image_variants_{_model._meta.label_lower}',
+    )
+
+
+@receiver(images.variants_changed, sender=Recipe)
+def touch_recipe_with_new_variants(sender, pk, **kwargs):
+    touch_recipes([pk])
+    detail_cache.invalidate([pk])
+
+
+@receiver(images.variants_changed, sender=RecipeStep)
+def touch_step_recipe_with_new_variants(sender, pk, **kwargs):
+    recipe_ids = list(RecipeStep.objects.filter(pk=pk).values_list('recipe_id', flat=True))
+    touch_recipes(recipe_ids)
+    detail_cache.invalidate(recipe_ids)
+
+
+def invalidate_recipe_detail(sender, instance, raw=False, **kwargs):
+    if not raw:
+        detail_cache.invalidate([instance.pk if sender is Recipe else instance.recipe_id])
+
+
+# Everything the cached recipe detail shows. Nested writes bulk-update steps
+# and ingredients without signals, but always save the recipe as well.
+for _model in (Recipe, RecipeStep, RecipeIngredient, Comment):
+    for _signal in (post_save, post_delete):
+        _signal.connect(
+            invalidate_recipe_detail,
+            sender=_model,
+            dispatch_uid=f'recipes.invalidate_detail_{_model._meta.model_name}',
+        )
+
+
+def invalidate_tagged_recipes(sender, instance, action, reverse, pk_set, **kwargs):
+    # As in sync_counter: a reverse `clear` carries no pk_set.
+    if action == 'pre_clear' and reverse:
+        instance._tagged_recipe_ids = list(instance.recipes.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        detail_cache.invalidate(_affected_recipe_ids(instance, reverse, pk_set))
+    elif action == 'post_clear':
+        detail_cache.invalidate(getattr(instance, '_tagged_recipe_ids', []) if reverse else [instance.pk])
+
+
+for _relation in ('session', 'category', 'type'):
+    m2m_changed.connect(
+        invalidate_tagged_recipes,
+        sender=getattr(Recipe, _relation).through,
+        dispatch_uid=f'recipes.invalidate_detail_{_relation}',
+    )
+
+
+def reindex_renamed_taxonomy(sender, instance, created, **kwargs):
+    # Taxonomy names are part of the search document and the rendered detail
+    # of every tagged recipe, so their validators must change too.
+    if not created:
+        recipe_ids = instance.recipes.values_list('pk', flat=True)
+        update_search_vectors(recipe_ids)
+        touch_recipes(recipe_ids)
+
+
+for _taxonomy in (Region, Session, Category, Type):
+    post_save.connect(
+        reindex_renamed_taxonomy,
+        sender=_taxonomy,
+        dispatch_uid=f'recipes.reindex_{_taxonomy._meta.model_name}',
+    )
+
+
+def invalidate_lookups(sender, **kwargs):
+    caching.bump_version(caching.OPTIONS)
+    forget_names(sender)
+
+
+# The /filters/ and /options/ payloads list every taxonomy and catalog name,
+# and recipes.catalog caches their ids. Ingredient names come from the
+# catalog, so RecipeIngredient rows and M2M links don't affect either.
+for _model in (Region, Session, Category, Type, Ingredient):
+    for _signal in (post_save, post_delete):
+        _signal.connect(
+            invalidate_lookups,
+            sender=_model,
+            dispatch_uid=f'recipes.invalidate_lookups_{_model._meta.model_name}',
+        )
+
+
+def create_postgres_extensions(sender, using, **kwargs):
+    # Ingredient's trigram index needs pg_trgm before any table is created.
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
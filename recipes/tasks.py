@@ -0,0 +1,8 @@
+from jobs.queue import task
+
+from . import view_counter
+
+
+@task
+def flush_view_counts():
+    view_counter.flush()
@@ -1,3 +1,1139 @@
+import csv
+import io
+import json
+import random
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import Count
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from prometheus_client.parser import text_string_to_metric_families
+from rest_framework.serializers import BaseSerializer
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.querybudget import EndpointQueryTestCase
+from jobs.models import Job
+from user.authentication import add_claims
+
+from . import benchmark, counters, exporter, images, leaderboard, view_counter
+from .catalog import forget_names, link_taxonomy, resolve_ingredients, resolve_names
+from .importer import RecipeImporter
+from .models import Category, Comment, Ingredient, Recipe, RecipeScore, Region, Session, Type
+from .nested import create_ingredients, create_steps, sync_ingredients, sync_steps
+from .search import parse_query, search, update_search_vectors
+from .seeding import CorpusSeeder
+from .serializers import RecipeSerializer
+
+User = get_user_model()
+
+
+class SeedingTests(TestCase):
+    def test_counters_match_seeded_rows(self):
+        seeder = CorpusSeeder(users=30, recipes=40, batch_size=25, seed=1)
+        self.assertEqual(list(seeder.run()), [25, 40])
+
+        recipes = Recipe.objects.annotate(
+            likes_total=Count('likes', distinct=True),
+            saves_total=Count('saved_by', distinct=True),
+            comments_total=Count('comments', distinct=True),
+            steps_total=Count('steps', distinct=True),
+        )
+        self.assertEqual(len(recipes), 40)
+        for recipe in recipes:
+            self.assertEqual(recipe.like_count, recipe.likes_total)
+            self.assertEqual(recipe.save_count, recipe.saves_total)
+            self.assertEqual(recipe.comment_count, recipe.comments_total)
+            self.assertGreaterEqual(recipe.steps_total, 3)
+            self.assertIsNotNone(recipe.search_vector)
+        self.assertEqual(Comment.objects.count(), seeder.created_comments)
+
+
+class CascadeDeleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        list(CorpusSeeder(users=5, recipes=20, seed=3).run())
+
+    def test_deleting_a_recipe_with_comments_leaves_no_score(self):
+        recipe = Recipe.objects.filter(comment_count__gt=0).first()
+        recipe.delete()
+        self.assertFalse(RecipeScore.objects.filter(recipe_id=recipe.pk).exists())
+
+    def test_deleting_an_author_drops_their_recipes_and_scores(self):
+        author = Recipe.objects.filter(comment_count__gt=0).first().author
+        recipe_ids = list(author.recipes.values_list('pk', flat=True))
+        author.delete()
+        self.assertFalse(RecipeScore.objects.filter(recipe_id__in=recipe_ids).exists())
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+        cls.recipes = {}
+        for key, title, description in [
+            ('title', 'Chicken curry', 'A weeknight dinner'),
+            ('description', 'Weeknight curry', 'With chicken thighs'),
+            ('phrase', 'Green curry paste', 'Pounded by hand'),
+            ('split', 'Green beans', 'A curry on the side'),
+            ('prefix', 'Pancakes', 'Fluffy and sweet'),
+        ]:
+            cls.recipes[key] = Recipe.objects.create(
+                author=author, title=title, description=description, is_published=True,
+            )
+        update_search_vectors()
+
+    def matches(self, text):
+        return [
+            key for pk in search(Recipe.objects.all(), text).values_list('pk', flat=True)
+            for key, recipe in self.recipes.items() if recipe.pk == pk
+        ]
+
+    def test_parse_query_skips_empty_input(self):
+        for text in ('', '   ', '!!', '*'):
+            with self.subTest(text=text):
+                self.assertIsNone(parse_query(text))
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(sorted(self.matches('green curry')), ['phrase', 'split'])
+
+    def test_phrase(self):
+        self.assertEqual(self.matches('"green curry"'), ['phrase'])
+
+    def test_prefix(self):
+        self.assertEqual(self.matches('pan*'), ['prefix'])
+        self.assertEqual(self.matches('pan'), [])
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(self.matches('chicken'), ['title', 'description'])
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+        # Equal ranks, so only the tie-breakers order most of them
+        for n in range(8):
+            Recipe.objects.create(
+                author=author, title='Chicken soup', description='Chicken stock' if n % 3 else 'Broth',
+                is_published=True,
+            )
+        update_search_vectors()
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+            pages += 1
+            self.assertLessEqual(pages, 10, 'pagination does not advance')
+        return ids
+
+    def test_every_row_once(self):
+        expected = sorted(Recipe.objects.values_list('pk', flat=True))
+        for query in ('q=chicken', 'q=chick*', 'ordering=-likes__count', 'ordering=title', ''):
+            with self.subTest(query):
+                ids = self.walk(f"{reverse('recipe-list')}?page_size=3&{query}")
+                self.assertEqual(sorted(ids), expected)
+
+    def test_search_pages_follow_rank(self):
+        ids = self.walk(f"{reverse('recipe-list')}?page_size=3&q=chicken")
+        ranked = list(search(Recipe.objects.all(), 'chicken').order_by('-rank', '-created_at', '-pk')
+                      .values_list('pk', flat=True))
+        self.assertEqual(ids, ranked)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(f"{reverse('recipe-list')}?cursor=bm9wZQ").status_code, 404)
+
+
+class ToggleRelationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+        self.recipe = Recipe.objects.create(author=self.user, title='Soup', description='Hot')
+
+    def test_round_trip(self):
+        for relation, counter in counters.COUNTER_FIELDS.items():
+            with self.subTest(relation):
+                self.assertEqual(counters.toggle_relation(relation, self.recipe.pk, self.user.pk), (True, 1))
+                self.assertEqual(counters.toggle_relation(relation, self.recipe.pk, self.user.pk), (False, 0))
+                self.assertFalse(getattr(self.recipe, relation).exists())
+
+    def test_toggle_patches_cached_user_ids(self):
+        self.recipe.is_published = True
+        self.recipe.save()
+        url = reverse('recipe-detail', args=[self.recipe.pk])
+        self.assertEqual(self.client.get(url).data['likes'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.toggle_relation('likes', self.recipe.pk, self.user.pk)
+        with CaptureQueriesContext(connection) as context:
+            data = self.client.get(url).data
+        self.assertEqual((data['likes'], data['like_count']), ([self.user.pk], 1))
+        # Only the counters entry is reloaded, not the liker ids.
+        self.assertFalse(any('recipe_likes' in query['sql'] for query in context.captured_queries))
+
+    def test_removing_an_uncounted_row_stays_at_zero(self):
+        # Added behind the counter's back
+        self.recipe.likes.through.objects.create(recipe_id=self.recipe.pk, user_id=self.user.pk)
+        self.assertEqual(counters.toggle_relation('likes', self.recipe.pk, self.user.pk), (False, 0))
+
+
+class TaxonomyResolutionTests(TestCase):
+    def setUp(self):
+        forget_names(Category)
+        self.addCleanup(forget_names, Category)
+        Category.objects.create(name='Soup')
+
+    def test_names_resolve_once_per_process(self):
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(3):
+            # Lookup, insert of the new name, re-read of its id
+            ids = resolve_names(Category, ['Soup', 'Stew', 'Soup'])
+        self.assertEqual(ids, dict(Category.objects.values_list('name', 'pk')))
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_names(Category, ['Stew', 'Soup']), ids)
+
+    def test_names_are_cached_once_committed(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            resolve_names(Category, ['Soup'])
+        # Never committed, as after a rollback: looked up again
+        with self.assertNumQueries(1):
+            resolve_names(Category, ['Soup'])
+
+    def test_link_replaces_other_names(self):
+        user = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+        recipe = Recipe.objects.create(author=user, title='Soup', description='Hot')
+        link_taxonomy(recipe, 'category', ['Soup', 'Stew'])
+        link_taxonomy(recipe, 'category', ['Stew', 'Broth'], replace=True)
+        self.assertEqual(sorted(recipe.category.values_list('name', flat=True)), ['Broth', 'Stew'])
+
+
+class TaxonomyRenameTests(TestCase):
+    def test_rename_changes_tagged_recipe_etag(self):
+        user = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+        category = Category.objects.create(name='Soups')
+        recipe = Recipe.objects.create(author=user, title='Soup', description='Hot', is_published=True)
+        recipe.category.add(category)
+        url = reverse('recipe-detail', args=[recipe.pk])
+        etag = self.client.get(url)['ETag']
+
+        category.name = 'Broths'
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Broths', response.content.decode())
+
+
+class IngredientFilterTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+        self.recipes = {}
+        for title, ingredients in [
+            ('Roast', ['Chicken breast', 'chicken  STOCK', 'salt']),
+            ('Broth', ['  Chicken stock ']),
+            ('Stir-fry', ['tofu', 'soy sauce']),
+        ]:
+            recipe = Recipe.objects.create(author=user, title=title, description='Test', is_published=True)
+            create_ingredients(recipe, [{'ingredient': name, 'quantity': '1'} for name in ingredients])
+            self.recipes[title] = recipe
+
+    def titles(self, value):
+        response = self.client.get(reverse('recipe-list'), {'ingredients': value})
+        return sorted(recipe['title'] for recipe in response.json()['results'])
+
+    def test_names_share_one_catalog_entry(self):
+        self.assertEqual(sorted(Ingredient.objects.values_list('name', flat=True)),
+                         ['chicken breast', 'chicken stock', 'salt', 'soy sauce', 'tofu'])
+
+    def test_matches_part_of_a_name_once_per_recipe(self):
+        self.assertEqual(self.titles('CHICKEN'), ['Broth', 'Roast'])
+        self.assertEqual(self.titles(' chicken   stock'), ['Broth', 'Roast'])
+        self.assertEqual(self.titles('sauce'), ['Stir-fry'])
+        self.assertEqual(self.titles('lamb'), [])
+        # Blank: no filter
+        self.assertEqual(self.titles(' '), ['Broth', 'Roast', 'Stir-fry'])
+
+
+class OptionsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Region.objects.create(name='Thai')
+
+    def test_current_etag_gets_304_without_queries(self):
+        url = reverse('options')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json(), response.json())
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual((response.status_code, response['ETag']), (304, etag))
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='*').status_code, 304)
+        # Each payload has its own tag.
+        self.assertNotEqual(self.client.get(reverse('filter-options'))['ETag'], etag)
+
+    def test_new_lookup_changes_the_etag(self):
+        url = reverse('filter-options')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Region.objects.create(name='Greek')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(sorted(item['name'] for item in response.json()['regions']), ['Greek', 'Thai'])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+        self.recipe = Recipe.objects.create(author=self.user, title='Soup', description='Hot', is_published=True)
+
+    def assertRevalidates(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('W/'))
+        for headers in ({'HTTP_IF_NONE_MATCH': response['ETag']},
+                        {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}):
+            with self.subTest(url=url, headers=headers):
+                self.assertEqual(self.client.get(url, **headers).status_code, 304)
+        return response['ETag']
+
+    def test_detail(self):
+        url = reverse('recipe-detail', args=[self.recipe.pk])
+        etag = self.assertRevalidates(url)
+        # Views don't change the validators, likes do.
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.toggle_relation('likes', self.recipe.pk, self.user.pk)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.data['like_count']), (200, 1))
+
+    def test_list(self):
+        url = reverse('recipe-list')
+        etag = self.assertRevalidates(url)
+        Recipe.objects.create(author=self.user, title='Stew', description='Thick', is_published=True)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class DetailCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+        self.recipe = Recipe.objects.create(author=self.user, title='Soup', description='Hot', is_published=True)
+        self.url = reverse('recipe-detail', args=[self.recipe.pk])
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {add_claims(AccessToken.for_user(self.user), self.user)}')
+
+    def write(self, method, url, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 300, response.content)
+
+    def test_writes_replace_the_cached_detail(self):
+        self.assertEqual(self.client.get(self.url).data['title'], 'Soup')
+
+        self.write('patch', reverse('recipe-update', args=[self.recipe.pk]), {'title': 'Stew'})
+        self.assertEqual(self.client.get(self.url).data['title'], 'Stew')
+
+        self.write('post', reverse('comment-list-create', args=[self.recipe.pk]), {'text': 'Lovely'})
+        self.write('post', reverse('recipe-like-toggle', args=[self.recipe.pk]), {})
+        data = self.client.get(self.url).data
+        self.assertEqual([comment['text'] for comment in data['comments']], ['Lovely'])
+        self.assertEqual((data['comment_count'], data['like_count'], data['likes']), (1, 1, [self.user.pk]))
+
+        self.write('patch', reverse('recipe-update', args=[self.recipe.pk]), {'is_published': False})
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class EmbeddedCommentsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+        self.recipe = Recipe.objects.create(author=user, title='Soup', description='Hot', is_published=True)
+        self.comments = [
+            Comment.objects.create(recipe=self.recipe, author=user, text=f'Comment {n}') for n in range(13)
+        ]
+        self.url = reverse('recipe-detail', args=[self.recipe.pk])
+
+    def test_detail_embeds_the_newest_and_links_the_rest(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['comment_count'], 13)
+        self.assertEqual([comment['text'] for comment in data['comments']],
+                         [f'Comment {n}' for n in range(12, 2, -1)])
+
+        rest = []
+        url = data['comments_next']
+        while url:
+            page = self.client.get(url).json()
+            rest += [comment['text'] for comment in page['results']]
+            url = page['next']
+        self.assertEqual(rest, ['Comment 2', 'Comment 1', 'Comment 0'])
+
+    def test_no_link_when_every_comment_is_embedded(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for comment in self.comments[:3]:
+                comment.delete()
+        data = self.client.get(self.url).json()
+        self.assertEqual((len(data['comments']), data['comments_next']), (10, None))
+
+
+class NestedSyncTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+        self.recipe = Recipe.objects.create(author=user, title='Soup', description='Hot')
+        self.ingredients = create_ingredients(self.recipe, [
+            {'ingredient': 'salt', 'quantity': '1 tsp'}, {'ingredient': 'water', 'quantity': '1 l'},
+        ])
+        create_steps(self.recipe, [{'step_no': 1, 'instruction': 'Boil'}, {'step_no': 2, 'instruction': 'Salt'}])
+
+    def stored_ingredients(self):
+        return list(self.recipe.recipe_ingredients.order_by('pk').values_list('pk', 'ingredient', 'quantity'))
+
+    def stored_steps(self):
+        return list(self.recipe.steps.values_list('step_no', 'instruction'))
+
+    def test_ingredients_match_by_id_then_position(self):
+        salt, water = self.ingredients
+        sync_ingredients(self.recipe, [
+            {'ingredient': 'pepper', 'quantity': '1 pinch'},
+            {'id': salt.pk, 'ingredient': 'salt', 'quantity': '2 tsp'},
+        ])
+        # The item without an id takes the row left over (water's).
+        self.assertEqual(self.stored_ingredients(), [(salt.pk, 'salt', '2 tsp'), (water.pk, 'pepper', '1 pinch')])
+
+    def test_full_replace_deletes_unmatched_rows(self):
+        salt, _ = self.ingredients
+        sync_ingredients(self.recipe, [{'id': salt.pk, 'ingredient': 'salt', 'quantity': '1 tsp'}])
+        self.assertEqual(self.stored_ingredients(), [(salt.pk, 'salt', '1 tsp')])
+        sync_steps(self.recipe, [{'step_no': 2, 'instruction': 'Salt'}, {'step_no': 3, 'instruction': 'Serve'}])
+        self.assertEqual(self.stored_steps(), [(2, 'Salt'), (3, 'Serve')])
+
+    def test_partial_keeps_unlisted_rows_and_adds_new_ones(self):
+        salt, water = self.ingredients
+        sync_ingredients(self.recipe, [
+            {'id': water.pk, 'quantity': '2 l'}, {'ingredient': 'pepper', 'quantity': '1 pinch'},
+        ], partial=True)
+        self.assertEqual(self.stored_ingredients()[:2], [(salt.pk, 'salt', '1 tsp'), (water.pk, 'water', '2 l')])
+        self.assertEqual(self.stored_ingredients()[2][1:], ('pepper', '1 pinch'))
+        sync_steps(self.recipe, [{'step_no': 1, 'instruction': 'Simmer'}], partial=True)
+        self.assertEqual(self.stored_steps(), [(1, 'Simmer'), (2, 'Salt')])
+
+    def test_delete(self):
+        salt, water = self.ingredients
+        for partial in (True, False):
+            with self.subTest(partial=partial):
+                sync_ingredients(self.recipe, [
+                    {'id': salt.pk, 'ingredient': 'salt', 'quantity': '1 tsp', 'delete': True},
+                    {'id': water.pk, 'ingredient': 'water', 'quantity': '1 l'},
+                ], partial=partial)
+                self.assertEqual(self.stored_ingredients(), [(water.pk, 'water', '1 l')])
+        sync_steps(self.recipe, [{'step_no': 1, 'delete': True}], partial=True)
+        self.assertEqual(self.stored_steps(), [(2, 'Salt')])
+
+    def test_delete_matching_no_row_is_skipped(self):
+        _, water = self.ingredients
+        for partial in (True, False):
+            with self.subTest(partial=partial):
+                sync_ingredients(self.recipe, [
+                    {'id': water.pk, 'ingredient': 'water', 'quantity': '1 l'},
+                    {'ingredient': 'ghost', 'quantity': '1', 'delete': True},
+                ], partial=partial)
+                self.assertNotIn('ghost', [name for _, name, _ in self.stored_ingredients()])
+                sync_steps(self.recipe, [
+                    {'step_no': 1, 'instruction': 'Boil'}, {'step_no': 9, 'instruction': 'Ghost', 'delete': True},
+                ], partial=partial)
+                self.assertNotIn(9, [step_no for step_no, _ in self.stored_steps()])
+
+
+class ViewCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+        self.recipe = Recipe.objects.create(author=user, title='Soup', description='Hot', is_published=True)
+
+    def at_epoch(self, epoch):
+        return mock.patch.object(view_counter, 'current_epoch', return_value=epoch)
+
+    def view_count(self):
+        return Recipe.objects.values_list('view_count', flat=True).get(pk=self.recipe.pk)
+
+    def test_flush_writes_closed_epochs_once(self):
+        with self.at_epoch(100):
+            for _ in range(3):
+                view_counter.record_view(self.recipe.pk)
+        with self.at_epoch(101):
+            # The previous epoch may still be written to.
+            self.assertEqual(view_counter.flush(), 0)
+        with self.at_epoch(102):
+            self.assertEqual(view_counter.flush(), 3)
+            self.assertEqual(view_counter.flush(), 0)
+            self.assertEqual(view_counter.pending_views(self.recipe.pk), 0)
+        self.assertEqual(self.view_count(), 3)
+
+    def test_failed_write_keeps_the_views(self):
+        with self.at_epoch(100):
+            view_counter.record_view(self.recipe.pk)
+        with self.at_epoch(102), mock.patch.object(view_counter, '_write_counts', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                view_counter.flush()
+        with self.at_epoch(104):
+            self.assertEqual(view_counter.flush(), 1)
+        self.assertEqual(self.view_count(), 1)
+
+    def test_detail_queues_one_flush_per_interval(self):
+        url = reverse('recipe-detail', args=[self.recipe.pk])
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(Job.objects.filter(name='recipes.tasks.flush_view_counts').count(), 1)
+
+    def test_detail_flushes_when_the_jobs_fall_behind(self):
+        url = reverse('recipe-detail', args=[self.recipe.pk])
+        with self.at_epoch(100):
+            view_counter.record_view(self.recipe.pk)
+        with self.at_epoch(102):
+            view_counter.flush()
+            view_counter.record_view(self.recipe.pk)
+        self.assertEqual(self.view_count(), 1)
+        # No worker has run since; the request flushes the oldest epochs itself.
+        with self.at_epoch(102 + view_counter.OVERDUE_EPOCHS + 1):
+            self.client.get(url)
+        self.assertEqual(self.view_count(), 2)
+
+    def test_overdue_flush_is_bounded(self):
+        with self.at_epoch(100):
+            view_counter.record_view(self.recipe.pk)
+        with self.at_epoch(100 + view_counter.OVERDUE_EPOCHS):
+            self.assertEqual(view_counter.flush(), 1)
+        with self.at_epoch(100 + 2 * view_counter.OVERDUE_EPOCHS - 1):
+            view_counter.record_view(self.recipe.pk)
+        with self.at_epoch(100 + 4 * view_counter.OVERDUE_EPOCHS):
+            # The view lies past the oldest OVERDUE_EPOCHS unflushed epochs.
+            self.assertEqual(view_counter.flush_if_overdue(), 0)
+            self.assertEqual(view_counter.flush_if_overdue(), 1)
+            self.assertEqual(view_counter.flush_if_overdue(), 0)
+
+    def test_pending_views_scans_recent_epochs_only(self):
+        with self.at_epoch(100):
+            view_counter.record_view(self.recipe.pk)
+        with self.at_epoch(100 + view_counter.MAX_PENDING_EPOCHS - 1):
+            self.assertEqual(view_counter.pending_views(self.recipe.pk), 1)
+        with self.at_epoch(100 + view_counter.MAX_PENDING_EPOCHS):
+            self.assertEqual(view_counter.pending_views(self.recipe.pk), 0)
+
+
+# Exported fields the importer reads back (everything else is derived or per-instance)
+CONTENT_FIELDS = [
+    'title', 'description', 'region', 'session', 'category', 'type',
+    'servings', 'prep_time', 'cook_time', 'is_published', 'ingredients', 'steps',
+]
+
+
+def exported_content(queryset):
+    records = exporter.iter_records(exporter.export_queryset().filter(pk__in=queryset))
+    return sorted(
+        (
+            {
+                name: sorted(record[name]) if name in RecipeSerializer.TAXONOMY_FIELDS else record[name]
+                for name in CONTENT_FIELDS
+            }
+            for record in records
+        ),
+        key=lambda content: (content['title'], content['description']),
+    )
+
+
+class ImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        list(CorpusSeeder(users=3, recipes=12, seed=7).run())
+        cls.author = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+
+    def test_export_imports_back_unchanged(self):
+        originals = list(Recipe.objects.values_list('pk', flat=True))
+        lines = list(exporter.ndjson_lines(exporter.iter_records(exporter.export_queryset())))
+
+        importer = RecipeImporter(self.author, batch_size=5)
+        self.assertEqual(list(importer.run(lines)), [])
+        self.assertEqual(importer.summary(), {'created': 12, 'failed': 0})
+        imported = Recipe.objects.filter(author=self.author)
+        self.assertEqual(exported_content(imported), exported_content(originals))
+        # Indexed for search and ranked like any other recipe
+        title = imported.first().title
+        self.assertIn(title, [recipe.title for recipe in search(Recipe.objects.all(), title)])
+        self.assertEqual(RecipeScore.objects.filter(recipe__in=imported).count(), 12)
+
+    def test_rejected_records_are_reported_by_line(self):
+        valid = {
+            'title': 'Toast', 'description': 'Crisp', 'region': 'French', 'session': ['Breakfast'],
+            'category': ['Bread'], 'type': ['Vegan'], 'ingredients': [{'ingredient': 'bread', 'quantity': '2'}],
+            'steps': [{'step_no': 1, 'instruction': 'Toast it'}],
+        }
+        lines = [
+            json.dumps(valid),
+            '{not json',
+            '',
+            json.dumps([valid]),
+            json.dumps({**valid, 'title': ''}),
+            json.dumps({**valid, 'title': 'Jam toast'}),
+        ]
+        importer = RecipeImporter(self.author)
+        errors = {error['line']: error['errors'] for error in importer.run(lines)}
+        self.assertEqual(sorted(errors), [2, 4, 5])
+        self.assertIn('title', errors[5])
+        self.assertEqual(importer.summary(), {'created': 2, 'failed': 3})
+        self.assertEqual(
+            sorted(Recipe.objects.filter(author=self.author).values_list('title', flat=True)), ['Jam toast', 'Toast'],
+        )
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+        self.recipe = Recipe.objects.create(
+            author=user, title='Green curry', description='Mild, with "quotes", commas\nand lines',
+            region=Region.objects.create(name='Thai'), servings=4, prep_time=10, cook_time=20,
+        )
+        self.recipe.session.add(Session.objects.create(name='Dinner'))
+        self.recipe.category.add(Category.objects.create(name='Curry'), Category.objects.create(name='Rice'))
+        self.recipe.type.add(Type.objects.create(name='Vegan'))
+        create_ingredients(self.recipe, [
+            {'ingredient': 'coconut milk', 'quantity': '400 ml'}, {'ingredient': 'basil', 'quantity': '1 bunch'},
+        ])
+        create_steps(self.recipe, [
+            {'step_no': 2, 'instruction': 'Simmer', 'timer': '15 min'}, {'step_no': 1, 'instruction': 'Fry the paste'},
+        ])
+        self.other = Recipe.objects.create(author=user, title='Rice', description='Plain')
+
+    def export(self, format, **kwargs):
+        queryset = exporter.export_queryset(**kwargs)
+        return ''.join(exporter.FORMATS[format](exporter.iter_records(queryset, chunk_size=1)))
+
+    def test_ndjson_record(self):
+        records = [json.loads(line) for line in self.export('ndjson').splitlines()]
+        self.assertEqual([record['id'] for record in records], [self.recipe.pk, self.other.pk])
+        record = records[0]
+        self.assertEqual(
+            {name: record[name] for name in ('title', 'author', 'region', 'servings', 'prep_time', 'cook_time')},
+            {'title': 'Green curry', 'author': 'cook', 'region': 'Thai', 'servings': 4, 'prep_time': 10,
+             'cook_time': 20},
+        )
+        self.assertEqual(record['description'], self.recipe.description)
+        self.assertEqual((record['session'], sorted(record['category']), record['type']),
+                         (['Dinner'], ['Curry', 'Rice'], ['Vegan']))
+        self.assertEqual(record['ingredients'], [
+            {'ingredient': 'coconut milk', 'quantity': '400 ml'}, {'ingredient': 'basil', 'quantity': '1 bunch'},
+        ])
+        self.assertEqual(record['steps'], [
+            {'step_no': 1, 'instruction': 'Fry the paste', 'timer': '', 'image': None},
+            {'step_no': 2, 'instruction': 'Simmer', 'timer': '15 min', 'image': None},
+        ])
+        self.assertIsNone(record['image'])
+        self.assertEqual(records[1]['region'], None)
+
+    def test_csv_rows(self):
+        rows = list(csv.reader(self.export('csv').splitlines(keepends=True)))
+        self.assertEqual(rows[0], exporter.CSV_COLUMNS)
+        self.assertEqual(len(rows), 3)
+        row = dict(zip(exporter.CSV_COLUMNS, rows[1]))
+        self.assertEqual(row['description'], self.recipe.description)
+        self.assertEqual(sorted(row['category'].split(exporter.CSV_LIST_SEPARATOR)), ['Curry', 'Rice'])
+        self.assertEqual(json.loads(row['ingredients'])[0], {'ingredient': 'coconut milk', 'quantity': '400 ml'})
+        self.assertEqual([step['step_no'] for step in json.loads(row['steps'])], [1, 2])
+
+    def test_watermark_resumes_after_the_last_row(self):
+        first = json.loads(self.export('ndjson').splitlines()[0])
+        since = exporter.parse_since(first['updated_at'])
+        # Same timestamp as the watermark: only the rows after its id
+        Recipe.objects.filter(pk=self.other.pk).update(updated_at=since)
+        rest = self.export('ndjson', since=since, after_id=first['id']).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in rest], [self.other.pk])
+        self.assertEqual(self.export('ndjson', since=since), '')
+
+    def test_invalid_watermark(self):
+        with self.assertRaises(ValueError):
+            exporter.parse_since('yesterday')
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+
+    def make_recipe(self, title, age, like_count=0):
+        recipe = Recipe.objects.create(author=self.user, title=title, description='Test', is_published=True)
+        Recipe.objects.filter(pk=recipe.pk).update(created_at=timezone.now() - age, like_count=like_count)
+        return recipe
+
+    def top(self, window):
+        leaderboard.refresh_scores()
+        return [recipe.title for recipe in leaderboard.top_recipes(window)]
+
+    def test_windows_rank_older_recipes_by_decayed_score(self):
+        self.make_recipe('Old favourite', timedelta(days=3), like_count=10_000)
+        self.make_recipe('New', timedelta(hours=1))
+        self.make_recipe('Old', timedelta(days=3))
+        # Not cut off by age, but much less popular old recipes decay below new ones
+        self.assertEqual(self.top('day'), ['Old favourite', 'New', 'Old'])
+        self.assertEqual(self.top('week'), ['Old favourite', 'New', 'Old'])
+
+    def test_shorter_half_life_favours_recency(self):
+        self.make_recipe('Popular', timedelta(days=3), like_count=100)
+        self.make_recipe('Fresh', timedelta(hours=1))
+        self.assertEqual(self.top('day'), ['Fresh', 'Popular'])
+        self.assertEqual(self.top('week'), ['Popular', 'Fresh'])
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        self.url = '/media/' + default_storage.save('recipe_images/digits.txt', ContentFile(b'0123456789'))
+
+    def get(self, **headers):
+        return self.client.get(self.url, **headers)
+
+    def test_full_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_satisfiable_range(self):
+        for header, body, content_range in [
+            ('bytes=2-4', b'234', 'bytes 2-4/10'),
+            ('bytes=7-', b'789', 'bytes 7-9/10'),
+            ('bytes=8-20', b'89', 'bytes 8-9/10'),
+        ]:
+            with self.subTest(header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b''.join(response.streaming_content), body)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(body)))
+
+    def test_suffix_range(self):
+        response = self.get(HTTP_RANGE='bytes=-3')
+        self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 7-9/10'))
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        # Longer than the file: all of it
+        response = self.get(HTTP_RANGE='bytes=-50')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+    def test_unsatisfiable_range(self):
+        for header in ('bytes=10-', 'bytes=5-2', 'bytes=-0'):
+            with self.subTest(header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_range(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE=etag).status_code, 206)
+        # A changed file is sent whole.
+        response = self.get(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+    def test_paths_outside_files_are_not_found(self):
+        for path in ('/media/../manage.py', '/media/recipe_images', '/media/missing.jpg'):
+            with self.subTest(path):
+                self.assertEqual(self.client.get(path).status_code, 404)
+
+
+def image_bytes(size, image_format='JPEG', orientation=None):
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    Image.new('RGB', size, 'orange').save(buffer, image_format, exif=exif)
+    return buffer.getvalue()
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        # Render in the test's own process and thread
+        self.enterContext(self.settings(MEDIA_ROOT=media_root, IMAGE_PIPELINE_WORKERS=0, IMAGE_VARIANT_FORMAT='WEBP'))
+        user = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+        self.recipe = Recipe.objects.create(author=user, title='Soup', description='Hot')
+
+    def upload(self, content, name='soup.jpg'):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.image = ContentFile(content, name=name)
+            self.recipe.save()
+        self.recipe.refresh_from_db()
+        return self.recipe.image_variants
+
+    def sizes(self, variants):
+        sizes = {}
+        for key, name in variants.items():
+            if key != 'source':
+                with default_storage.open(name) as file, Image.open(file) as image:
+                    self.assertEqual((image.format, image.getexif().get(0x0112)), ('WEBP', None))
+                    sizes[key] = image.size
+        return sizes
+
+    def test_render_sizes_and_orientation(self):
+        # Orientation 6: stored landscape, shown portrait
+        rendered, extension = images.render_variants(image_bytes((1500, 1000), orientation=6))
+        self.assertEqual(extension, 'webp')
+        self.assertEqual(sorted(rendered), ['320w', '640w', 'thumbnail'])
+        # A small original is never scaled up.
+        rendered, _ = images.render_variants(image_bytes((100, 50)), 'JPEG')
+        self.assertEqual(sorted(rendered), ['100w', 'thumbnail'])
+
+    def test_upload_stores_the_copies(self):
+        variants = self.upload(image_bytes((1500, 1000), orientation=6))
+        self.assertEqual(variants['source'], self.recipe.image.name)
+        self.assertEqual(self.sizes(variants), {'thumbnail': (200, 200), '320w': (320, 480), '640w': (640, 960)})
+        # Same upload: nothing to redo
+        self.assertFalse(images.process(Recipe, self.recipe.pk, 'image'))
+
+    def test_replacing_or_clearing_the_image_deletes_old_copies(self):
+        old = images.variant_names(self.upload(image_bytes((800, 600))))
+        new = images.variant_names(self.upload(image_bytes((400, 300)), name='stew.jpg'))
+        self.assertTrue(new)
+        self.assertFalse(any(default_storage.exists(name) for name in old))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.image = None
+            self.recipe.save()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, {'source': ''})
+        self.assertFalse(any(default_storage.exists(name) for name in new))
+
+    def test_unreadable_upload_is_not_retried(self):
+        with self.assertLogs('recipes.images', 'WARNING'):
+            variants = self.upload(b'not an image', name='soup.png')
+        self.assertEqual(variants, {'source': self.recipe.image.name})
+        self.assertFalse(images.process(Recipe, self.recipe.pk, 'image'))
+
+
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        list(CorpusSeeder(users=3, recipes=10, seed=5).run())
+
+    def test_serializer_time_without_patching_drf(self):
+        response = self.client.get(reverse('recipe-list'))
+        serialize = re.search(r'serialize;dur=([\d.]+)', response['Server-Timing'])
+        self.assertGreater(float(serialize.group(1)), 0)
+        self.assertEqual(BaseSerializer.__dict__['data'].fget.__module__, 'rest_framework.serializers')
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+        self.recipe = Recipe.objects.create(author=user, title='Soup', description='Hot', is_published=True)
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return {
+            (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+            for family in text_string_to_metric_families(response.content.decode())
+            for sample in family.samples
+        }
+
+    def test_requests_views_and_queue_depth(self):
+        route = (('method', 'GET'), ('route', 'recipe-detail'), ('status', '2xx'))
+        requests = ('http_request_duration_seconds_count', route)
+        queries = ('http_request_db_queries_count', (('route', 'recipe-detail'),))
+        views = ('recipe_views_total', ())
+        before = self.scrape()
+        self.client.get(reverse('recipe-detail', args=[self.recipe.pk]))
+        after = self.scrape()
+
+        for key in (requests, queries, views):
+            with self.subTest(key[0]):
+                self.assertEqual(after[key] - before.get(key, 0), 1)
+        # The detail request queued the view count flush.
+        queue = Job.objects.get().queue
+        self.assertEqual(after[('jobs', (('queue', queue), ('state', 'ready')))], 1)
+        self.assertEqual(after[('jobs', (('queue', queue), ('state', 'failed')))], 0)
+
+    def test_token(self):
+        with self.settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        list(CorpusSeeder(users=10, recipes=30, seed=2).run())
+
+    def setUp(self):
+        cache.clear()
+
+    def test_every_scenario_runs_without_errors(self):
+        corpus = benchmark.Corpus.load(random.Random(0), sample_size=100)
+        for name, build in benchmark.SCENARIOS.items():
+            with self.subTest(name):
+                result = benchmark.run_scenario(
+                    build, corpus, lambda: benchmark.InProcessClient('testserver'), requests=5,
+                )
+                self.assertEqual(result['requests'], 5)
+                self.assertEqual(result['errors'], 0)
+                self.assertLessEqual(result['p50'], result['p99'])
+
+    def test_compare_flags_slower_and_fewer_requests(self):
+        baseline = {'detail': {'p50': 10.0, 'p95': 20.0, 'p99': 30.0, 'rps': 100.0, 'errors': 0}}
+        results = {'detail': {'p50': 10.5, 'p95': 25.0, 'p99': 30.0, 'rps': 80.0, 'errors': 0}}
+        regressed = {row[1] for row in benchmark.compare(results, baseline, 0.1) if row[5]}
+        self.assertEqual(regressed, {'p95', 'rps'})
+
+
+class RecipeEndpointQueryTests(EndpointQueryTestCase):
+    """
+    Query budgets and index use of every endpoint in recipes/urls.py, each
+    measured before and after its data grows.
+    """
+    urlconf = 'recipes.urls'
+
+    @classmethod
+    def setUpTestData(cls):
+        list(CorpusSeeder(users=20, recipes=60, seed=3).run())
+        cls.user = User.objects.create_user(email='cook@example.com', username='cook', password='pw-12345678')
+        cls.admin = User.objects.create_superuser(email='admin@example.com', username='admin', password='pw-12345678')
+        cls.small = cls.make_recipe(cls.user, size=1)
+        cls.large = cls.make_recipe(cls.user, size=15)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    @classmethod
+    def make_recipe(cls, author, size):
+        """
+        A recipe with `size` ingredients, steps, comments, likes and saves.
+        """
+        recipe = Recipe.objects.create(author=author, title=f'Recipe of {size}', description='Test recipe')
+        recipe.session.add(Session.objects.first())
+        create_ingredients(recipe, [{'ingredient': f'item {n}', 'quantity': '1 cup'} for n in range(size)])
+        create_steps(recipe, [{'step_no': n + 1, 'instruction': f'Step {n + 1}'} for n in range(size)])
+        users = list(User.objects.order_by('pk')[:size])
+        Comment.objects.bulk_create([Comment(recipe=recipe, author=user, text='Nice') for user in users])
+        recipe.likes.add(*users)
+        recipe.saved_by.add(*users)
+        Recipe.objects.filter(pk=recipe.pk).update(comment_count=size)
+        return recipe
+
+    def setUp(self):
+        super().setUp()
+        for model in (Region, Session, Category, Type, Ingredient):
+            forget_names(model)
+
+    def add_recipes(self):
+        list(CorpusSeeder(users=5, recipes=30, seed=4, prefix='more-').run())
+
+    def get(self, url, **extra):
+        return lambda: self.client.get(url, **extra)
+
+    def recipe_payload(self, size):
+        return {
+            'title': 'New recipe', 'description': 'From the test', 'region': 'Indian',
+            'session': ['Lunch'], 'category': ['Curry', 'Soup'][:size], 'type': ['Vegan'],
+            'ingredients': [{'ingredient': f'fresh item {n}', 'quantity': '2 tbsp'} for n in range(size)],
+            'steps': [{'step_no': n + 1, 'instruction': f'Do {n + 1}'} for n in range(size)],
+        }
+
+    def test_api_root(self):
+        self.assertQueryBudget(0, self.get(reverse('api-root')))
+
+    def test_recipe_list(self):
+        url = reverse('recipe-list')
+        self.assertQueryBudget(1, self.get(url), self.get(url), between=self.add_recipes)
+        # Facet filters look their names up first, one query each.
+        for query, budget in [('q=smoked', 1), ('q="fresh garlic" chick*', 1), ('ingredients=garlic', 1),
+                              ('region=Indian&category=Curry', 3), ('ordering=-likes__count', 1)]:
+            with self.subTest(query):
+                self.assertQueryBudget(budget, self.get(f'{url}?{query}'))
+
+        etag = self.client.get(url)['ETag']
+        self.assertQueryBudget(1, self.get(url, HTTP_IF_NONE_MATCH=etag), status=304)
+
+        # The router's recipe list renders full details.
+        self.assertQueryBudget(9, self.get('/api/recipes/recipes/'), self.get('/api/recipes/recipes/'),
+                               between=self.add_recipes)
+
+    def test_recipe_detail(self):
+        # Includes queuing the view count flush: the cache, and with it the
+        # once-per-interval flag, is cleared before each request.
+        self.assertQueryBudget(
+            12,
+            self.get(reverse('recipe-detail', args=[self.small.pk])),
+            self.get(reverse('recipe-detail', args=[self.large.pk])),
+        )
+        self.assertQueryBudget(
+            9,
+            self.get(f'/api/recipes/recipes/{self.small.pk}/'),
+            self.get(f'/api/recipes/recipes/{self.large.pk}/'),
+        )
+
+    def taxonomy_budget(self, model, basename):
+        add = lambda: model.objects.bulk_create([model(name=f'{basename} {n}') for n in range(30)])
+        url = reverse(f'{basename}-list')
+        self.assertQueryBudget(1, self.get(url), self.get(url), between=add)
+        self.assertQueryBudget(1, self.get(reverse(f'{basename}-detail', args=[model.objects.first().pk])))
+
+    def test_region_list(self):
+        self.taxonomy_budget(Region, 'region')
+
+    test_region_detail = test_region_list
+
+    def test_session_list(self):
+        self.taxonomy_budget(Session, 'session')
+
+    test_session_detail = test_session_list
+
+    def test_category_list(self):
+        self.taxonomy_budget(Category, 'category')
+
+    test_category_detail = test_category_list
+
+    def test_type_list(self):
+        self.taxonomy_budget(Type, 'type')
+
+    test_type_detail = test_type_list
+
+    def test_recipestep_list(self):
+        url = reverse('recipestep-list')
+        self.assertQueryBudget(1, self.get(url), self.get(url), between=self.add_recipes)
+        self.assertQueryBudget(1, self.get(reverse('recipestep-detail', args=[self.large.steps.first().pk])))
+
+    test_recipestep_detail = test_recipestep_list
+
+    def test_top_recipes(self):
+        url = reverse('top-recipes')
+        for window in ('day', 'week', 'all'):
+            with self.subTest(window):
+                self.assertQueryBudget(1, self.get(f'{url}?window={window}'), self.get(f'{url}?window={window}'),
+                                       between=self.add_recipes)
+
+    def toggle_budget(self, name):
+        self.authenticate(self.user)
+        self.assertQueryBudget(
+            8,
+            lambda: self.client.post(reverse(name, args=[self.small.pk])),
+            lambda: self.client.post(reverse(name, args=[self.large.pk])),
+        )
+
+    def test_recipe_like_toggle(self):
+        self.toggle_budget('recipe-like-toggle')
+
+    def test_recipe_save_toggle(self):
+        self.toggle_budget('recipe-save-toggle')
+
+    def test_saved_recipe_list(self):
+        self.authenticate(self.user)
+        save_more = lambda: self.user.saved_recipes.add(*Recipe.objects.order_by('-pk')[:30])
+        url = reverse('saved-recipe-list')
+        self.assertQueryBudget(1, self.get(url), self.get(url), between=save_more)
+
+    def test_my_recipes(self):
+        self.authenticate(self.user)
+        write_more = lambda: [self.make_recipe(self.user, size=2) for _ in range(25)]
+        url = reverse('my-recipes')
+        self.assertQueryBudget(1, self.get(url), self.get(url), between=write_more)
+
+    def test_comment_list_create(self):
+        self.assertQueryBudget(
+            1,
+            self.get(reverse('comment-list-create', args=[self.small.pk])),
+            self.get(reverse('comment-list-create', args=[self.large.pk])),
+        )
+        self.authenticate(self.user)
+        post = lambda: self.client.post(reverse('comment-list-create', args=[self.large.pk]), {'text': 'Yum'})
+        self.assertQueryBudget(6, post, status=201)
+
+    def test_comment_detail(self):
+        comment = self.large.comments.first()
+        url = reverse('comment-detail', args=[comment.pk])
+        self.assertQueryBudget(1, self.get(url))
+        self.authenticate(comment.author)
+        self.assertQueryBudget(4, lambda: self.client.patch(url, {'text': 'Edited'}))
+        self.assertQueryBudget(6, lambda: self.client.delete(url), status=204)
+
+    def test_filter_options(self):
+        add = lambda: resolve_ingredients(f'extra {n}' for n in range(50))
+        url = reverse('filter-options')
+        self.assertQueryBudget(5, self.get(url), self.get(url), between=add)
+
+    def test_options(self):
+        add = lambda: resolve_ingredients(f'extra {n}' for n in range(50))
+        url = reverse('options')
+        self.assertQueryBudget(5, self.get(url), self.get(url), between=add)
+
+    def test_feedback_create(self):
+        post = lambda: self.client.post(reverse('feedback-create'), {'email': 'a@example.com', 'message': 'Hi'})
+        self.assertQueryBudget(1, post, status=201)
+
+    def test_recipe_create(self):
+        self.authenticate(self.user)
+        self.assertQueryBudget(
+            17,
+            lambda: self.client.post(reverse('recipe-create'), self.recipe_payload(1), format='json'),
+            lambda: self.client.post(reverse('recipe-create'), self.recipe_payload(2) | {
+                'ingredients': [{'ingredient': f'new item {n}', 'quantity': '1 g'} for n in range(20)],
+                'steps': [{'step_no': n + 1, 'instruction': 'Stir'} for n in range(20)],
+            }, format='json'),
+            status=201,
+        )
+
+    def test_recipe_update(self):
+        self.authenticate(self.user)
+        patch = lambda recipe: lambda: self.client.patch(
+            reverse('recipe-update', args=[recipe.pk]),
+            {'title': 'Renamed', 'steps': [{'step_no': 1, 'instruction': 'Changed'}]}, format='json',
+        )
+        self.assertQueryBudget(7, patch(self.small), patch(self.large))
+        put = lambda recipe: lambda: self.client.put(
+            reverse('recipe-update', args=[recipe.pk]), self.recipe_payload(2), format='json',
+        )
+        self.assertQueryBudget(24, put(self.small), put(self.large))
+
+    def test_recipe_delete(self):
+        self.authenticate(self.user)
+        delete = lambda recipe: lambda: self.client.delete(reverse('recipe-delete', args=[recipe.pk]))
+        self.assertQueryBudget(15, delete(self.small), delete(self.large), status=204)
+
+    def test_recipe_import(self):
+        self.authenticate(self.admin)
+        def post(count):
+            lines = [
+                json.dumps(self.recipe_payload(2) | {
+                    'title': f'Imported {n}',
+                    'ingredients': [{'ingredient': f'import {count} item {n}', 'quantity': '1 tsp'}],
+                })
+                for n in range(count)
+            ]
+            return lambda: self.client.post(reverse('recipe-import'), '\n'.join(lines),
+                                            content_type='application/x-ndjson')
+
+        self.assertQueryBudget(12, post(2), post(40))
 
-# Create your tests here.
+    def test_recipe_export(self):
+        self.authenticate(self.admin)
+        url = reverse('recipe-export')
+        self.assertQueryBudget(7, self.get(url), self.get(url), between=self.add_recipes)
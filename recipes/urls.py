@@ -24,6 +24,8 @@ from .views import (
     MyRecipeListView,
     MyRecipeUpdateView,
     MyRecipeDeleteView,
+    RecipeImportView,
+    RecipeExportView,
 
     FeedbackCreateView, CommentListCreateView, CommentRetrieveUpdateDestroyView
 )
@@ -56,6 +58,8 @@ urlpatterns = [
     
     path("my-recipes/", MyRecipeListView.as_view(), name="my-recipes"),
     path('create/', MyRecipeCreateView.as_view(), name='recipe-create'),
+    path('import/', RecipeImportView.as_view(), name='recipe-import'),
+    path('export/', RecipeExportView.as_view(), name='recipe-export'),
     path('<int:pk>/update/',MyRecipeUpdateView.as_view(), name='recipe-update'),
     path('<int:pk>/delete/', MyRecipeDeleteView.as_view(), name='recipe-delete'),
 
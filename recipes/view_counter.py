@@ -0,0 +1,206 @@
+"""
+Write-behind buffer for Recipe.view_count.
+
+Views are counted in the cache instead of the database. Counters are kept per
+time bucket ("epoch"), and the closed epochs are written to the database in
+batched UPDATEs by flush(). Nothing counts into a closed epoch any more, so
+flush() reads and deletes its keys before writing: a flush that runs twice,
+or dies halfway, never counts a view twice. Recipe detail requests queue a
+flush job (recipes.tasks) at most once per interval (flush_due); the
+`flush_view_counts` management command flushes directly. If the jobs fall
+more than OVERDUE_EPOCHS behind, because no worker is running, that request
+also flushes the oldest epochs itself (flush_if_overdue), so views reach the
+database before their keys expire.
+
+Use a cache shared between workers (Redis, Memcached) in production. With the
+per-process LocMemCache every worker buffers and flushes its own views.
+"""
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from . import detail_cache, metrics
+from .leaderboard import refresh_scores
+from .models import Recipe
+
+KEY_PREFIX = 'recipe-views'
+# Buffered keys must outlive the gap between two flushes.
+KEY_TIMEOUT = 60 * 60 * 24
+# How far back to look for buffered views before the first flush
+INITIAL_LOOKBACK = 10
+# Unflushed epochs a request tolerates before flushing inline, and how many
+# of them it flushes at once
+OVERDUE_EPOCHS = 5
+# Most recent epochs pending_views() adds up; the inline flush keeps the
+# backlog below this.
+MAX_PENDING_EPOCHS = 2 * OVERDUE_EPOCHS
+UPDATE_BATCH_SIZE = 500
+
+
+def get_interval():
+    return getattr(settings, 'RECIPE_VIEW_FLUSH_INTERVAL', 60)
+
+
+def current_epoch():
+    return int(time.time() // get_interval())
+
+
+def _counter_key(epoch, recipe_id):
+    return f'{KEY_PREFIX}:{epoch}:{recipe_id}'
+
+
+def _seq_key(epoch):
+    return f'{KEY_PREFIX}:{epoch}:seq'
+
+
+def _slot_key(epoch, slot):
+    return f'{KEY_PREFIX}:{epoch}:id:{slot}'
+
+
+def _flushed_key():
+    return f'{KEY_PREFIX}:flushed'
+
+
+def _incr(key, delta=1):
+    # add() is a no-op if the key exists, so the first writer seeds it.
+    if cache.add(key, delta, KEY_TIMEOUT):
+        return delta
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.set(key, delta, KEY_TIMEOUT)
+        return delta
+
+
+def _last_flushed_epoch(epoch):
+    flushed = cache.get(_flushed_key())
+    if flushed is None:
+        return epoch - INITIAL_LOOKBACK
+    return flushed
+
+
+def _unflushed_epochs(epoch, limit):
+    # Up to `epoch`, at most the last `limit` of them
+    start = max(_last_flushed_epoch(epoch) + 1, epoch - limit + 1)
+    return range(start, epoch + 1)
+
+
+def pending_views(recipe_id):
+    """
+    Returns the number of buffered views for a recipe not yet in the database,
+    from the last MAX_PENDING_EPOCHS epochs.
+    """
+    epoch = current_epoch()
+    keys = [_counter_key(e, recipe_id) for e in _unflushed_epochs(epoch, MAX_PENDING_EPOCHS)]
+    return sum(cache.get_many(keys).values())
+
+
+def record_view(recipe_id):
+    """
+    Counts one view of a recipe and returns its pending (unflushed) views.
+    """
+    metrics.VIEWS.inc()
+    _buffer(current_epoch(), recipe_id)
+    return pending_views(recipe_id)
+
+
+def _buffer(epoch, recipe_id, count=1):
+    if _incr(_counter_key(epoch, recipe_id), count) == count:
+        # First views of this recipe in the epoch: register it for the flush.
+        slot = _incr(_seq_key(epoch))
+        cache.set(_slot_key(epoch, slot), recipe_id, KEY_TIMEOUT)
+
+
+def flush_due():
+    """
+    Whether a flush should be queued now: true at most once per interval
+    across everyone sharing the cache.
+    """
+    return cache.add(f'{KEY_PREFIX}:flush-due', 1, get_interval())
+
+
+def flush_if_overdue():
+    """
+    Flushes the oldest OVERDUE_EPOCHS epochs if the flush has fallen further
+    behind than that, and returns the number of views written.
+    """
+    epoch = current_epoch()
+    if epoch - _last_flushed_epoch(epoch) <= OVERDUE_EPOCHS:
+        return 0
+    return flush(max_epochs=OVERDUE_EPOCHS)
+
+
+def _collect_epoch(epoch):
+    slots = cache.get(_seq_key(epoch)) or 0
+    slot_keys = [_slot_key(epoch, slot) for slot in range(1, slots + 1)]
+    recipe_ids = set(cache.get_many(slot_keys).values())
+
+    counter_keys = {_counter_key(epoch, pk): pk for pk in recipe_ids}
+    counts = {
+        counter_keys[key]: value
+        for key, value in cache.get_many(list(counter_keys)).items()
+        if value
+    }
+    return counts, slot_keys + list(counter_keys) + [_seq_key(epoch)]
+
+
+def _write_counts(counts):
+    items = list(counts.items())
+    for start in range(0, len(items), UPDATE_BATCH_SIZE):
+        batch = items[start:start + UPDATE_BATCH_SIZE]
+        increment = Case(
+            *[When(pk=pk, then=Value(count)) for pk, count in batch],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        Recipe.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+            view_count=F('view_count') + increment
+        )
+    refresh_scores(counts)
+    # The cached detail shows persisted + pending views; the pending ones just moved.
+    detail_cache.invalidate_counters(counts)
+
+
+def flush(max_epochs=None):
+    """
+    Writes the views of every closed epoch, or of the oldest `max_epochs`
+    ones, to Recipe.view_count.
+
+    The current epoch is still being written to and is left alone, as is the
+    one before it, so requests that straddle the boundary are not lost.
+    Epochs older than KEY_TIMEOUT have expired and are skipped.
+    Returns the number of views written.
+    """
+    lock_key = f'{KEY_PREFIX}:flush-lock'
+    if not cache.add(lock_key, 1, get_interval()):
+        # Another worker is flushing.
+        return 0
+
+    try:
+        epoch = current_epoch()
+        counts = Counter()
+        closed_epochs = _unflushed_epochs(epoch - 2, KEY_TIMEOUT // get_interval())
+        for closed in closed_epochs[:max_epochs]:
+            # Take the epoch's views out of the cache before writing them.
+            epoch_counts, keys = _collect_epoch(closed)
+            cache.delete_many(keys)
+            cache.set(_flushed_key(), closed, None)
+            counts.update(epoch_counts)
+
+        if counts:
+            try:
+                with transaction.atomic():
+                    _write_counts(counts)
+            except Exception:
+                # Back into the current epoch, for the next flush
+                for pk, count in counts.items():
+                    _buffer(epoch, pk, count)
+                raise
+        return sum(counts.values())
+    finally:
+        cache.delete(lock_key)
@@ -1,66 +1,161 @@
-from django.db.models import F
-from drf_spectacular.utils import extend_schema
+import json
+
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 from rest_framework import viewsets, permissions, generics, filters
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
+
+from backend.instrumentation import SerializerTimingMixin
+from jobs.queue import enqueue
 
 from .models import (
     Recipe, Region, Session, Category,
-    RecipeStep, Type, Feedback, RecipeIngredient, Comment
+    RecipeStep, Type, Feedback, RecipeIngredient, Comment, Ingredient
 )
+from . import caching, conditional, detail_cache, exporter, leaderboard, view_counter
+from .counters import toggle_relation
+from .importer import RecipeImporter
+from .parsers import NDJSONParser
+from .renderers import CSVRenderer, NDJSONRenderer
 from .permissions import IsOwnerOrReadOnly
+from .tasks import flush_view_counts
 from .serializers import (
     RecipeSerializer, RecipeIngredientSerializer, RegionSerializer,
     SessionSerializer, CategorySerializer, RecipeListSerializer,
     RecipeDetailSerializer, RecipeStepSerializer, TypeSerializer,
-    FeedbackSerializer, CommentSerializer
+    FeedbackSerializer, CommentSerializer, COMMENT_ORDERING
 )
 
 from django_filters.rest_framework import DjangoFilterBackend
-from .filters import RecipeFilter # Import the custom filter class
+from .filters import RecipeFilter, RecipeSearchFilter # Import the custom filter classes
 
 
 # Helper function to check ownership
 def user_is_recipe_author(user, recipe_id):
     return Recipe.objects.filter(id=recipe_id, author=user).exists()
 
+
+class EagerLoadingMixin:
+    """
+    Builds the view's queryset from the related data its serializer declares,
+    so rendering a page costs the same number of queries for any row count.
+    """
+    def eager_load(self, queryset):
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
+
+    def get_queryset(self):
+        return self.eager_load(super().get_queryset())
+
+class ConditionalListMixin:
+    """
+    Lets clients revalidate a page of recipes. The ETag fingerprints the URL
+    and the validators of the page's rows (see recipes.conditional); on a
+    conditional request only those columns are read first, and a match is
+    answered with 304 before the page is loaded and serialized.
+    """
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        if conditional.is_conditional(request):
+            rows = self.paginate_queryset(conditional.validator_queryset(queryset))
+            response = conditional.not_modified(request, [conditional.validators(row) for row in rows])
+            if response is not None:
+                return response
+
+        page = self.paginate_queryset(queryset)
+        response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return conditional.add_validators(request, response, [conditional.validators(row) for row in page])
+
 # ========== Public Recipes ==========
 
-class RecipeListView(generics.ListAPIView):
+class RecipeListView(
+    SerializerTimingMixin, ConditionalListMixin, EagerLoadingMixin, generics.ListAPIView,
+):
     queryset = Recipe.objects.filter(is_published=True).order_by('-created_at')
     serializer_class = RecipeListSerializer
-    # Keep the backends, but we will replace filterset_fields
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    # Facet filters first, then ranked full-text search (?q=), then explicit ordering
+    filter_backends = [DjangoFilterBackend, RecipeSearchFilter, filters.OrderingFilter]
 
     filterset_class = RecipeFilter
 
-    # Keep search and ordering fields as they are
-    search_fields = ['title', 'description']
     ordering_fields = ['created_at', 'likes__count']  # Note: ordering by likes is more efficient this way
 
-class TopRecipesListView(generics.ListAPIView):
-    queryset = Recipe.objects.filter(is_published=True)[:6]
+class TopRecipesListView(SerializerTimingMixin, EagerLoadingMixin, generics.ListAPIView):
+    """
+    The most popular published recipes, e.g. /api/recipes/top-recipes/?window=day
+    Ranked by the precomputed, time-decayed scores in recipes.leaderboard and
+    served from the cache.
+    """
+    queryset = Recipe.objects.all()
     serializer_class = RecipeListSerializer
+    # Always a fixed handful of recipes
+    pagination_class = None
 
+    def get_window(self):
+        window = self.request.query_params.get('window', leaderboard.DEFAULT_WINDOW)
+        if window not in leaderboard.WINDOWS:
+            raise ValidationError({'window': f"Must be one of: {', '.join(leaderboard.WINDOWS)}."})
+        return window
 
-class RecipeDetailView(generics.RetrieveAPIView):
+    def get_queryset(self):
+        return leaderboard.top_recipes(self.get_window(), super().get_queryset())
+
+    @extend_schema(parameters=[
+        OpenApiParameter('window', str, enum=list(leaderboard.WINDOWS),
+                         description=f"Defaults to '{leaderboard.DEFAULT_WINDOW}'."),
+    ])
+    def list(self, request, *args, **kwargs):
+        window = self.get_window()
+        # Image URLs are absolute, so the rendered list depends on the host
+        data = leaderboard.get_cached(
+            window, request.get_host(),
+            lambda: self.get_serializer(self.get_queryset(), many=True).data,
+        )
+        return Response(data)
+
+
+class RecipeDetailView(SerializerTimingMixin, EagerLoadingMixin, generics.RetrieveAPIView):
     queryset = Recipe.objects.filter(is_published=True)
     serializer_class = RecipeDetailSerializer
 
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        # Increment view_count efficiently without race conditions
-        instance.view_count = F('view_count') + 1
-        instance.save(update_fields=['view_count'])
-        instance.refresh_from_db()  # Refresh to get the updated value
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        # Buffered views are written back by a job, queued once per interval;
+        # if the jobs aren't keeping up, this request writes some back itself.
+        if view_counter.flush_due():
+            enqueue(flush_view_counts)
+            view_counter.flush_if_overdue()
+        pk = self.kwargs['pk']
+
+        # Validators and counters come from a small cached entry (one query on
+        # a miss); a client with the current version is answered right away.
+        counters = detail_cache.get_counters(pk)
+        if counters is None:
+            raise Http404
+        rows = [(pk, *(counters[name] for name in conditional.VALIDATOR_FIELDS))]
+        response = conditional.not_modified(request, rows)
+        # Buffer the view instead of writing it; show persisted + pending views
+        pending_views = view_counter.record_view(pk)
+        if response is not None:
+            return response
+
+        payload = detail_cache.get_detail(
+            pk, request.get_host(), lambda: dict(self.get_serializer(self.get_object()).data)
+        )
+        data = detail_cache.overlay(payload, counters, detail_cache.get_user_ids(pk, counters), pending_views)
+        return conditional.add_validators(request, Response(data), rows)
 
 # ========== Comments ==========
 
-class CommentListCreateView(generics.ListCreateAPIView):
+class CommentListCreateView(SerializerTimingMixin, EagerLoadingMixin, generics.ListCreateAPIView):
     """
     View to list all comments for a recipe or create a new one.
     """
@@ -72,7 +167,8 @@ class CommentListCreateView(generics.ListCreateAPIView):
         if getattr(self, 'swagger_fake_view', False):
             return Comment.objects.none()
         recipe_pk = self.kwargs['recipe_pk']
-        return Comment.objects.filter(recipe_id=recipe_pk)
+        # Keyset pages over the (recipe, created_at, id) index
+        return self.eager_load(Comment.objects.filter(recipe_id=recipe_pk).order_by(*COMMENT_ORDERING))
 
     def perform_create(self, serializer):
         # Automatically associate the comment with the recipe and the user
@@ -80,11 +176,13 @@ class CommentListCreateView(generics.ListCreateAPIView):
         serializer.save(author=self.request.user, recipe=recipe)
 
 
-class CommentRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class CommentRetrieveUpdateDestroyView(
+    SerializerTimingMixin, generics.RetrieveUpdateDestroyAPIView,
+):
     """
     View to retrieve, update, or delete a single comment.
     """
-    queryset = Comment.objects.all()
+    queryset = Comment.objects.select_related('author')
     serializer_class = CommentSerializer
     # Use the custom permission to ensure only authors can edit/delete
     permission_classes = [IsOwnerOrReadOnly]
@@ -115,23 +213,15 @@ class RecipeLikeToggleView(APIView):
     )
     def post(self, request, pk):
         # Get the recipe object, or return 404 if not found
-        recipe = get_object_or_404(Recipe, pk=pk)
-        user = request.user
-
-        # Check if the user has already liked the recipe
-        if user in recipe.likes.all():
-            # If liked, remove the like (unlike)
-            recipe.likes.remove(user)
-            liked = False
-        else:
-            # If not liked, add the like
-            recipe.likes.add(user)
-            liked = True
+        get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+
+        # Add or remove the like with one indexed lookup and update the counter
+        liked, total_likes = toggle_relation('likes', pk, request.user.pk)
 
         # Return a response with the current like status and total likes
         return Response({
             'liked': liked,
-            'total_likes': recipe.total_likes()
+            'total_likes': total_likes
         }, status=status.HTTP_200_OK)
 
 
@@ -159,22 +249,17 @@ class RecipeSaveToggleView(APIView):
         }
     )
     def post(self, request, pk):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        user = request.user
+        get_object_or_404(Recipe.objects.only('pk'), pk=pk)
 
-        if user in recipe.saved_by.all():
-            # If already saved, remove it from saved list
-            recipe.saved_by.remove(user)
-            saved = False
-        else:
-            # If not saved, add it to the saved list
-            recipe.saved_by.add(user)
-            saved = True
+        # Save or unsave with one indexed lookup and update the counter
+        saved, _ = toggle_relation('saved_by', pk, request.user.pk)
 
         return Response({'saved': saved}, status=status.HTTP_200_OK)
 
 
-class SavedRecipeListView(generics.ListAPIView):
+class SavedRecipeListView(
+    SerializerTimingMixin, ConditionalListMixin, EagerLoadingMixin, generics.ListAPIView,
+):
     """
     View to list all recipes saved by the currently authenticated user.
     """
@@ -185,11 +270,36 @@ class SavedRecipeListView(generics.ListAPIView):
         # Return all recipes from the 'saved_recipes' related manager
         if getattr(self, 'swagger_fake_view', False):
             return Recipe.objects.none()
-        return self.request.user.saved_recipes.all().order_by('-created_at')
+        return self.eager_load(self.request.user.saved_recipes.all().order_by('-created_at'))
 
 
 # ========== Filter Options ==========
 
+class CachedOptionsMixin:
+    """
+    Serves get_options() from the versioned cache. A client that already holds
+    the current version (If-None-Match) gets a 304 without any database work.
+    """
+    cache_name = None
+
+    def get_options(self):
+        raise NotImplementedError
+
+    def get(self, request):
+        version = caching.get_version(caching.OPTIONS)
+        etag = caching.make_etag(self.cache_name, version, request.accepted_renderer.format)
+
+        if caching.etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = caching.get_or_build(caching.OPTIONS, version, self.cache_name, self.get_options)
+            response = Response(data, status=status.HTTP_200_OK)
+
+        response['ETag'] = etag
+        # Let clients keep the payload but revalidate it on every use
+        patch_cache_control(response, no_cache=True)
+        return response
+
 @extend_schema(
     responses={
         200: {
@@ -205,17 +315,18 @@ class SavedRecipeListView(generics.ListAPIView):
     }
 )
 
-class FilterOptionsView(APIView):
-    def get(self, request):
-        data = {
+class FilterOptionsView(CachedOptionsMixin, APIView):
+    cache_name = 'filters'
+
+    def get_options(self):
+        return {
             "types": list(Type.objects.values("name")),
             "categories": list(Category.objects.values("name")),
             "regions": list(Region.objects.values("name")),
             "sessions": list(Session.objects.values("name")),
-            # --- ADDED THIS LINE ---
-            "ingredients": list(RecipeIngredient.objects.values_list('ingredient', flat=True).distinct().order_by('ingredient')),
+            # Read from the normalized catalog, already unique and indexed by name
+            "ingredients": list(Ingredient.objects.values_list('name', flat=True)),
         }
-        return Response(data, status=status.HTTP_200_OK)
 
 @extend_schema(
     responses={
@@ -231,21 +342,22 @@ class FilterOptionsView(APIView):
         }
     }
 )
-class OptionsView(APIView):
-    def get(self, request):
-        data = {
+class OptionsView(CachedOptionsMixin, APIView):
+    cache_name = 'options'
+
+    def get_options(self):
+        return {
             "types": list(Type.objects.values("name")),
             "categories": list(Category.objects.values("name")),
             "regions": list(Region.objects.values("name")),
-            # Corrected this line to provide a distinct list of ingredient names
-            "ingredients": list(RecipeIngredient.objects.values_list('ingredient', flat=True).distinct().order_by('ingredient')),
+            # Distinct ingredient names from the normalized catalog
+            "ingredients": list(Ingredient.objects.values_list('name', flat=True)),
             "sessions": list(Session.objects.values("name")),
         }
-        return Response(data, status=status.HTTP_200_OK)
 
 # ========== ReadOnly ViewSets ==========
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SerializerTimingMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all().order_by('-created_at')
 
     def get_serializer_class(self):
@@ -253,34 +365,34 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeDetailSerializer
         return RecipeSerializer
 
-class RegionViewSet(viewsets.ReadOnlyModelViewSet):
+class RegionViewSet(SerializerTimingMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Region.objects.all()
     serializer_class = RegionSerializer
 
 
-class SessionViewSet(viewsets.ReadOnlyModelViewSet):
+class SessionViewSet(SerializerTimingMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Session.objects.all()
     serializer_class = SessionSerializer
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(SerializerTimingMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
 
-class TypeViewSet(viewsets.ReadOnlyModelViewSet):
+class TypeViewSet(SerializerTimingMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Type.objects.all()
     serializer_class = TypeSerializer
 
 
-class StepsViewSet(viewsets.ReadOnlyModelViewSet):
+class StepsViewSet(SerializerTimingMixin, viewsets.ReadOnlyModelViewSet):
     queryset = RecipeStep.objects.all()
     serializer_class = RecipeStepSerializer
 
 
 # ========== User's Own Recipes (CRUD) ==========
 
-class MyRecipeCreateView(generics.CreateAPIView):
+class MyRecipeCreateView(SerializerTimingMixin, generics.CreateAPIView):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -290,21 +402,94 @@ class MyRecipeCreateView(generics.CreateAPIView):
         serializer.save(author=self.request.user)
 
 
-class MyRecipeListView(generics.ListAPIView):
+class RecipeImportView(APIView):
+    """
+    Bulk-imports recipes from an NDJSON body (one recipe per line, same
+    fields as `create/`), authored by the requesting user.
+
+    The response streams one NDJSON line per rejected record and ends with
+    a {"summary": {"created": n, "failed": n}} line.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [NDJSONParser]
+
+    @extend_schema(
+        request={'application/x-ndjson': OpenApiTypes.STR},
+        responses={(200, 'application/x-ndjson'): OpenApiTypes.STR},
+    )
+    def post(self, request):
+        importer = RecipeImporter(request.user)
+
+        def lines():
+            for error in importer.run(request.data):
+                yield json.dumps(error) + '\n'
+            yield json.dumps({'summary': importer.summary()}) + '\n'
+
+        return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+
+class RecipeExportView(APIView):
+    """
+    Streams every recipe with its ingredients, steps and taxonomy as NDJSON
+    (default) or CSV (`?format=csv` or `Accept: text/csv`).
+
+    Rows are ordered by (updated_at, id). Pass the last row's `updated_at`
+    and `id` as `since` and `after_id` to export only what changed since.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+
+    def get_watermark(self):
+        since = after_id = None
+        if 'since' in self.request.query_params:
+            try:
+                since = exporter.parse_since(self.request.query_params['since'])
+            except ValueError:
+                raise ValidationError({'since': 'Expected an ISO 8601 datetime.'})
+        if 'after_id' in self.request.query_params:
+            try:
+                after_id = int(self.request.query_params['after_id'])
+            except ValueError:
+                raise ValidationError({'after_id': 'Expected an integer.'})
+        return since, after_id
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('since', OpenApiTypes.DATETIME, description="Only recipes updated after this time."),
+            OpenApiParameter('after_id', OpenApiTypes.INT, description="With `since`: also recipes updated at exactly "
+                                                                       "`since` whose id is greater."),
+        ],
+        responses={(200, 'application/x-ndjson'): OpenApiTypes.STR, (200, 'text/csv'): OpenApiTypes.STR},
+    )
+    def get(self, request):
+        since, after_id = self.get_watermark()
+        renderer = request.accepted_renderer
+        records = exporter.iter_records(exporter.export_queryset(since, after_id))
+        response = StreamingHttpResponse(
+            exporter.FORMATS[renderer.format](records),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        )
+        response['Content-Disposition'] = f'attachment; filename="recipes.{renderer.format}"'
+        return response
+
+
+class MyRecipeListView(
+    SerializerTimingMixin, ConditionalListMixin, EagerLoadingMixin, generics.ListAPIView,
+):
     serializer_class = RecipeListSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, RecipeSearchFilter, filters.OrderingFilter]
     filterset_fields = ['region', 'type__name', 'session__name', 'category__name']
-    search_fields = ['title', 'description']
-    ordering_fields = ['created_at', 'total_likes']
+    # `likes__count` is annotated by RecipeListSerializer
+    ordering_fields = ['created_at', 'likes__count']
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Recipe.objects.none()
-        return Recipe.objects.filter(author=self.request.user).order_by('-created_at')
+        return self.eager_load(Recipe.objects.filter(author=self.request.user).order_by('-created_at'))
 
 
-class MyRecipeUpdateView(generics.RetrieveUpdateAPIView):
+class MyRecipeUpdateView(SerializerTimingMixin, generics.RetrieveUpdateAPIView):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -315,7 +500,7 @@ class MyRecipeUpdateView(generics.RetrieveUpdateAPIView):
         return Recipe.objects.filter(author=self.request.user)
 
 
-class MyRecipeDeleteView(generics.DestroyAPIView):
+class MyRecipeDeleteView(SerializerTimingMixin, generics.DestroyAPIView):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -328,7 +513,7 @@ class MyRecipeDeleteView(generics.DestroyAPIView):
 
 # ========== Feedback ==========
 
-class FeedbackCreateView(generics.CreateAPIView):
+class FeedbackCreateView(SerializerTimingMixin, generics.CreateAPIView):
     queryset = Feedback.objects.all()
     serializer_class = FeedbackSerializer
     permission_classes = [permissions.AllowAny]
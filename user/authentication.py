@@ -0,0 +1,113 @@
+"""
+JWT authentication that reads the user from the token.
+
+Tokens from SigninView carry the user's email, username, role and staff
+flags. For read-only requests, ClaimsJWTAuthentication builds the user from
+those claims without querying the database; its other columns (bio,
+profile picture, ...) are deferred and load together on first access.
+Requests that can write, staff users and tokens without the claims load
+the user row as before, so a stale claim is never saved back. Views that
+show the user their own account call load_row(), and refreshing a token
+copies the claims from the row again (ClaimsRefreshToken), so a changed
+username or email doesn't outlive the access token that carried it.
+
+Deactivated, deleted users and password changes are enforced through the
+cached revocations of user.revocation rather than the row.
+"""
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import revocation
+
+User = get_user_model()
+
+# Claims copied onto the user, besides the id
+CLAIM_FIELDS = ('email', 'username', 'role')
+STAFF_CLAIMS = ('is_staff', 'is_superuser')
+
+
+def add_claims(token, user):
+    for field in CLAIM_FIELDS + STAFF_CLAIMS:
+        token[field] = getattr(user, field)
+    return token
+
+
+def claims_user(token):
+    """
+    Returns a User built from the token's claims, or None when they don't
+    describe a regular active user.
+    """
+    if any(field not in token for field in CLAIM_FIELDS + STAFF_CLAIMS):
+        return None
+    if any(token[field] for field in STAFF_CLAIMS):
+        return None
+    values = {field: token[field] for field in CLAIM_FIELDS}
+    values.update({
+        User._meta.get_field(api_settings.USER_ID_FIELD).attname: token[api_settings.USER_ID_CLAIM],
+        'is_staff': False, 'is_superuser': False, 'is_active': True,
+    })
+    # from_db() defers every concrete field it isn't given.
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(router.db_for_read(User), fields, [values[name] for name in fields])
+
+
+def load_row(user):
+    """
+    Loads every column of a user built from claims in one query, claims
+    included, and returns the user.
+    """
+    if user.get_deferred_fields():
+        user.refresh_from_db(fields=[field.attname for field in User._meta.concrete_fields])
+    return user
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """
+    A refresh token whose claims are copied again from the user row, so the
+    access tokens and rotated refresh tokens made from it carry current ones.
+    """
+
+    def __init__(self, token=None, verify=True):
+        super().__init__(token, verify)
+        if token is not None:
+            user = User.objects.filter(
+                **{api_settings.USER_ID_FIELD: self[api_settings.USER_ID_CLAIM]}
+            ).first()
+            if user is not None:
+                add_claims(self, user)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        if revocation.is_revoked(user_id, validated_token.get('iat')):
+            raise AuthenticationFailed(_('Token has been revoked.'), code='token_revoked')
+
+        user = claims_user(validated_token) if request.method in SAFE_METHODS else None
+        if user is None:
+            user = self.get_user(validated_token)
+        return user, validated_token
+
+
+class ClaimsJWTScheme(SimpleJWTScheme):
+    # Same bearer scheme in the OpenAPI schema
+    target_class = ClaimsJWTAuthentication
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from user import revocation
+from user.tokens import PRUNE_BATCH_SIZE, prune_expired_tokens
+
+
+class Command(BaseCommand):
+    help = ("Delete expired outstanding refresh tokens with their blacklist entries, and token "
+            "revocations older than the access token lifetime.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PRUNE_BATCH_SIZE,
+                            help="Token ids covered per transaction.")
+        parser.add_argument('--pause', type=float, default=0.1,
+                            help="Seconds to sleep between batches, to leave room for live traffic.")
+
+    def handle(self, *args, **options):
+        deleted = 0
+        for count in prune_expired_tokens(options['batch_size'], options['pause']):
+            deleted += count
+        revocations = revocation.prune()
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted} expired tokens and {revocations} old revocations."
+        ))
@@ -30,11 +30,16 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     bio = models.TextField(blank=True, null=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    # Resized copies of `profile_picture`, maintained by recipes.images
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     role = models.CharField(max_length=50, choices=Role.choices, default=Role.FOODY)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     date_joined = models.DateTimeField(auto_now_add=True)
+    # Set by DeleteAccountView until the user.tasks.delete_user job runs;
+    # such an account can no longer be reactivated.
+    deletion_requested_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     objects = UserManager()
 
@@ -43,3 +48,21 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     def __str__(self):
         return self.username
+
+    def refresh_from_db(self, using=None, fields=None):
+        # Reading one deferred column (e.g. of a user built from token claims
+        # by user.authentication) loads all the deferred ones at once.
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using=using, fields=fields)
+
+
+class TokenRevocation(models.Model):
+    """
+    When a user's tokens were last revoked (deactivation, deletion or a
+    password change): tokens issued before `revoked_at` are refused. Not a
+    foreign key, so it outlives a deleted user.
+    """
+    user_id = models.BigIntegerField(primary_key=True)
+    revoked_at = models.DateTimeField(db_index=True)
@@ -0,0 +1,82 @@
+"""
+Token revocations, cached in process.
+
+Authenticating from token claims (user.authentication) skips the user row,
+so deactivation, deletion and password changes are recorded in
+TokenRevocation instead. Every process keeps the revocations younger than
+an access token's lifetime in memory and reloads them after
+TOKEN_REVOCATION_TTL seconds: other processes honor a revocation within
+that delay, the one that made it right away.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import TokenRevocation
+
+_lock = threading.Lock()
+# (reload deadline on the monotonic clock, {user id: revoked at, in epoch seconds})
+_state = (0.0, {})
+
+
+def load():
+    """
+    Reloads the revocations that can still concern an unexpired token.
+    """
+    global _state
+    since = timezone.now() - api_settings.ACCESS_TOKEN_LIFETIME
+    revoked = {
+        user_id: revoked_at.timestamp()
+        for user_id, revoked_at in TokenRevocation.objects.filter(revoked_at__gte=since)
+        .values_list('user_id', 'revoked_at')
+    }
+    _state = (time.monotonic() + settings.TOKEN_REVOCATION_TTL, revoked)
+    return revoked
+
+
+def _revocations():
+    deadline, revoked = _state
+    if time.monotonic() < deadline:
+        return revoked
+    with _lock:
+        deadline, revoked = _state
+        if time.monotonic() < deadline:
+            return revoked
+        return load()
+
+
+def is_revoked(user_id, issued_at):
+    """
+    Whether a token for `user_id` issued at `issued_at` (its `iat` claim)
+    predates the user's last revocation. Tokens issued within the second
+    of the revocation are let through: `iat` has a one second resolution.
+    """
+    revoked_at = _revocations().get(user_id)
+    return revoked_at is not None and (issued_at or 0) < int(revoked_at)
+
+
+def revoke(user_ids):
+    """
+    Refuses the tokens issued so far to the given users.
+    """
+    global _state
+    now = timezone.now()
+    TokenRevocation.objects.bulk_create(
+        [TokenRevocation(user_id=user_id, revoked_at=now) for user_id in user_ids],
+        update_conflicts=True, unique_fields=['user_id'], update_fields=['revoked_at'],
+    )
+    with _lock:
+        deadline, revoked = _state
+        _state = (deadline, {**revoked, **{user_id: now.timestamp() for user_id in user_ids}})
+
+
+def prune():
+    """
+    Deletes the revocations older than any unexpired access token, and
+    returns how many.
+    """
+    since = timezone.now() - api_settings.ACCESS_TOKEN_LIFETIME
+    return TokenRevocation.objects.filter(revoked_at__lt=since).delete()[0]
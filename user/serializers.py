@@ -5,6 +5,9 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model, authenticate
 from django.contrib.auth.password_validation import validate_password
 
+from recipes.serializers import ImageVariantsField
+from .authentication import ClaimsRefreshToken, add_claims
+
 User = get_user_model()
 
 class UserSignupSerializer(serializers.ModelSerializer):
@@ -37,26 +40,27 @@ class UserSigninSerializer(serializers.Serializer):
     password = serializers.CharField(write_only=True, required=True)
 
 
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
-        token = super().get_token(user)
-
-        token['role'] = user.role
-        token['email'] = user.email
-        token['username'] = user.username
+        # The claims let user.authentication skip the user row.
+        return add_claims(super().get_token(user), user)
 
-        return token
+class MyTokenRefreshSerializer(TokenRefreshSerializer):
+    # Refreshed tokens take the user's current claims.
+    token_class = ClaimsRefreshToken
 
 class UserProfileSerializer(serializers.ModelSerializer):
     """
     Serializer for viewing and updating the user's own profile.
     """
+    profile_picture_variants = ImageVariantsField()
+
     class Meta:
         model = User
-        fields = ('email', 'username', 'bio', 'profile_picture', 'role', 'date_joined')
+        fields = ('email', 'username', 'bio', 'profile_picture', 'profile_picture_variants', 'role', 'date_joined')
         read_only_fields = ('email', 'role','date_joined') # These fields should not be editable here
 
 class ChangePasswordSerializer(serializers.Serializer):
@@ -96,6 +100,10 @@ class ReactivateAccountSerializer(serializers.Serializer):
         if user.is_active:
             raise serializers.ValidationError("This account is already active.")
 
+        # Deleted accounts wait deactivated for the deletion job
+        if user.deletion_requested_at is not None:
+            raise serializers.ValidationError("This account has been deleted.")
+
         return user
 
 class PasswordResetRequestSerializer(serializers.Serializer):
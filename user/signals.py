@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .revocation import revoke
+from .tokens import blacklist_user_tokens
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def revoke_tokens_on_credential_change(sender, instance, created, **kwargs):
+    # set_password() leaves the raw password in `_password` until the save.
+    # Saving a deactivated user again just moves the revocation forward.
+    # Refresh tokens are blacklisted too, so they can't mint new access tokens.
+    if not created and (instance._password is not None or not instance.is_active):
+        revoke([instance.pk])
+        blacklist_user_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def revoke_tokens_of_deleted_user(sender, instance, **kwargs):
+    revoke([instance.pk])
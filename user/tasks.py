@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core.mail import send_mail
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from jobs.queue import task
+
+User = get_user_model()
+
+
+@task
+def send_password_reset_email(email):
+    user = User.objects.filter(email=email).first()
+    if user is None:
+        return
+
+    # Generate token and UID
+    token = PasswordResetTokenGenerator().make_token(user)
+    uidb64 = urlsafe_base64_encode(force_bytes(user.pk))
+
+    # Construct reset link (customize the domain for your frontend)
+    reset_link = f"http://localhost:3000/reset-password?uidb64={uidb64}&token={token}"
+
+    send_mail(
+        'Password Reset Request',
+        f'Hi {user.username},\n\nPlease use the following link to reset your password:\n{reset_link}',
+        settings.DEFAULT_FROM_EMAIL,
+        [user.email],
+        fail_silently=False,
+    )
+
+
+@task
+def delete_user(user_id):
+    # Deleted through the instance: recipes.signals relies on the cascade's
+    # origin being the user. Only accounts still marked by DeleteAccountView.
+    user = User.objects.filter(pk=user_id, deletion_requested_at__isnull=False).first()
+    if user is not None:
+        user.delete()
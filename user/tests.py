@@ -1,3 +1,329 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from backend.querybudget import EndpointQueryTestCase
+from jobs.queue import enqueue
+from jobs.worker import run_pending
+from recipes.models import Comment, Recipe
+from . import revocation
+from .authentication import add_claims
+from .models import TokenRevocation
+from .serializers import MyTokenRefreshSerializer
+from .tasks import delete_user
+from .tokens import blacklist_user_tokens
+
+User = get_user_model()
+
+PASSWORD = 'pw-12345678'
+
+
+class UserEndpointQueryTests(EndpointQueryTestCase):
+    """
+    Query budgets of every endpoint in user/urls.py, each measured before
+    and after the user's tokens and content grow.
+    """
+    urlconf = 'user.urls'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.make_user('cook')
+        cls.other = cls.make_user('guest')
+
+    @classmethod
+    def make_user(cls, name):
+        return User.objects.create_user(email=f'{name}@example.com', username=name, password=PASSWORD)
+
+    def issue_tokens(self, user, count=20):
+        for _ in range(count):
+            RefreshToken.for_user(user)
+
+    def add_content(self, user, size):
+        """
+        Gives `user` `size` recipes, each liked, saved and commented on by
+        someone else, and `size` comments on someone else's recipe.
+        """
+        other_recipe = Recipe.objects.create(author=self.other, title='Not mine', description='Test recipe')
+        for n in range(size):
+            recipe = Recipe.objects.create(author=user, title=f'Mine {n}', description='Test recipe')
+            recipe.likes.add(self.other)
+            recipe.saved_by.add(self.other)
+            Comment.objects.create(recipe=recipe, author=self.other, text='Nice')
+            Comment.objects.create(recipe=other_recipe, author=user, text='Yum')
+
+    def reset_payload(self, user, password):
+        return {
+            'uidb64': urlsafe_base64_encode(force_bytes(user.pk)),
+            'token': PasswordResetTokenGenerator().make_token(user),
+            'new_password': password,
+        }
+
+    def test_signup(self):
+        def post(name):
+            data = {'email': f'{name}@example.com', 'username': name, 'password': PASSWORD, 'password2': PASSWORD}
+            return lambda: self.client.post(reverse('signup'), data)
+        self.assertQueryBudget(1, post('new-1'), post('new-2'), status=201)
+        self.assertQueryBudget(0, lambda: self.client.get(reverse('signup')))
+
+    def test_signin(self):
+        post = lambda: self.client.post(reverse('signin'), {'email': self.user.email, 'password': PASSWORD})
+        self.assertQueryBudget(3, post, post, between=lambda: self.issue_tokens(self.user))
+
+    def test_token_refresh(self):
+        # Routed to the profile view
+        self.authenticate(self.user)
+        get = lambda: self.client.get(reverse('token_refresh'))
+        self.assertQueryBudget(1, get, get, between=lambda: self.add_content(self.user, 10))
+
+    def test_user_profile(self):
+        self.authenticate(self.user)
+        url = reverse('user-profile')
+        get = lambda: self.client.get(url)
+        self.assertQueryBudget(1, get, get, between=lambda: self.add_content(self.user, 10))
+        self.assertQueryBudget(2, lambda: self.client.patch(url, {'bio': 'Cooks a lot'}))
+
+    def change_password(self):
+        passwords = iter([(PASSWORD, 'pw-87654321'), ('pw-87654321', PASSWORD)])
+        def put():
+            old, new = next(passwords)
+            return self.client.put(reverse('change-password'), {'old_password': old, 'new_password': new})
+        return put
+
+    def test_change_password(self):
+        self.issue_tokens(self.user, 1)
+        self.authenticate(self.user)
+        put = self.change_password()
+        def grow():
+            self.issue_tokens(self.user)
+            # The change revoked the token sent first.
+            self.authenticate(self.user)
+        self.assertQueryBudget(4, put, put, between=grow)
+
+    def test_deactivate_account(self):
+        self.authenticate(self.user)
+        post = lambda: self.client.post(reverse('deactivate-account'))
+        def grow():
+            User.objects.filter(pk=self.user.pk).update(is_active=True)
+            self.add_content(self.user, 10)
+            self.authenticate(self.user)
+        self.assertQueryBudget(4, post, post, between=grow)
+
+    def test_reactivate_account(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        post = lambda: self.client.post(
+            reverse('reactivate-account'), {'email': self.user.email, 'password': PASSWORD},
+        )
+        def grow():
+            User.objects.filter(pk=self.user.pk).update(is_active=False)
+            self.add_content(self.user, 10)
+        self.assertQueryBudget(2, post, post, between=grow)
+
+    def delete_account(self, user):
+        def delete():
+            self.authenticate(user)
+            return self.client.delete(reverse('delete-account'))
+        return delete
+
+    def test_delete_account(self):
+        # The cascade itself runs in a background job.
+        small, large = self.make_user('small'), self.make_user('large')
+        self.add_content(small, 1)
+        self.add_content(large, 10)
+        self.assertQueryBudget(5, self.delete_account(small), self.delete_account(large), status=202)
+
+    def test_password_reset_request(self):
+        post = lambda: self.client.post(reverse('password-reset-request'), {'email': self.user.email})
+        self.assertQueryBudget(2, post, post, between=lambda: self.add_content(self.user, 10))
+
+    def reset_password(self):
+        passwords = iter(['pw-87654321', PASSWORD])
+        def post():
+            return self.client.post(reverse('password-reset-confirm'), self.reset_payload(self.user, next(passwords)))
+        return post
+
+    def test_password_reset_confirm(self):
+        self.issue_tokens(self.user, 1)
+        post = self.reset_password()
+        def grow():
+            self.user.refresh_from_db()
+            self.issue_tokens(self.user)
+        self.assertQueryBudget(4, post, post, between=grow)
+
+
+class ClaimsAuthenticationTests(APITestCase):
+    """
+    Users built from token claims, and revocations standing in for the
+    user row.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='cook@example.com', username='cook', password=PASSWORD)
+
+    def authenticate(self, user, issued=None):
+        token = add_claims(AccessToken.for_user(user), user)
+        # Issued earlier than the revocations the test makes
+        token.set_iat(at_time=issued or timezone.now() - timedelta(minutes=1))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return token
+
+    def test_read_uses_claims_and_loads_the_row_once(self):
+        self.user.bio = 'Cooks a lot'
+        self.user.save()
+        self.authenticate(self.user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('user-profile'))
+        self.assertEqual(response.data['bio'], 'Cooks a lot')
+        self.assertEqual(len(context.captured_queries), 1)
+
+    def test_write_loads_the_row(self):
+        token = self.authenticate(self.user)
+        User.objects.filter(pk=self.user.pk).update(username='renamed')
+        response = self.client.patch(reverse('user-profile'), {'bio': 'New bio'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['username'], response.data['bio']), ('renamed', 'New bio'))
+        self.user.refresh_from_db()
+        # The stale username claim isn't written back.
+        self.assertEqual((self.user.username, self.user.bio), ('renamed', 'New bio'))
+        self.assertEqual(token['username'], 'cook')
+
+    def test_profile_read_shows_the_row_not_the_claims(self):
+        self.authenticate(self.user)
+        User.objects.filter(pk=self.user.pk).update(username='renamed', email='renamed@example.com')
+        response = self.client.get(reverse('user-profile'))
+        self.assertEqual((response.data['username'], response.data['email']), ('renamed', 'renamed@example.com'))
+
+    def test_refresh_copies_current_claims(self):
+        refresh = add_claims(RefreshToken.for_user(self.user), self.user)
+        User.objects.filter(pk=self.user.pk).update(username='renamed')
+        serializer = MyTokenRefreshSerializer(data={'refresh': str(refresh)})
+        serializer.is_valid(raise_exception=True)
+        self.assertEqual(AccessToken(serializer.validated_data['access'])['username'], 'renamed')
+        self.assertEqual(RefreshToken(serializer.validated_data['refresh'])['username'], 'renamed')
+
+    def test_staff_token_loads_the_row(self):
+        admin = User.objects.create_superuser(email='admin@example.com', username='admin', password=PASSWORD)
+        self.authenticate(admin)
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('user-profile'))
+        self.assertIn('"user_user"', context.captured_queries[0]['sql'])
+
+    def test_password_change_revokes_earlier_tokens(self):
+        self.authenticate(self.user)
+        response = self.client.put(
+            reverse('change-password'), {'old_password': PASSWORD, 'new_password': 'pw-87654321'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 401)
+        # Tokens from signing in again work.
+        self.authenticate(self.user, issued=timezone.now())
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 200)
+
+    def test_deactivation_revokes_tokens(self):
+        self.authenticate(self.user)
+        self.assertEqual(self.client.post(reverse('deactivate-account')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 401)
+
+    def test_deletion_revokes_tokens(self):
+        self.authenticate(self.user)
+        self.assertEqual(self.client.delete(reverse('delete-account')).status_code, 202)
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 401)
+
+    def test_revocations_from_other_processes_apply_after_reload(self):
+        self.authenticate(self.user)
+        revocation.load()
+        TokenRevocation.objects.create(user_id=self.user.pk, revoked_at=timezone.now())
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 200)
+        revocation.load()
+        self.assertEqual(self.client.get(reverse('user-profile')).status_code, 401)
+
+
+class TokenPruningTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='cook@example.com', username='cook', password=PASSWORD)
+        self.live = [OutstandingToken.objects.get(jti=RefreshToken.for_user(self.user)['jti']) for _ in range(3)]
+        past = timezone.now() - timedelta(days=1)
+        self.expired = [
+            OutstandingToken.objects.create(
+                user=self.user, jti=f'expired-{n}', token='-', created_at=past, expires_at=past,
+            )
+            for n in range(5)
+        ]
+
+    def test_blacklists_unexpired_tokens_once(self):
+        BlacklistedToken.objects.create(token=self.live[0])
+        self.assertEqual(blacklist_user_tokens(self.user.pk), 2)
+        self.assertEqual(blacklist_user_tokens(self.user.pk), 0)
+        self.assertEqual(
+            set(BlacklistedToken.objects.values_list('token_id', flat=True)), {token.pk for token in self.live},
+        )
+
+    def test_deactivation_blacklists_refresh_tokens(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(BlacklistedToken.objects.count(), len(self.live))
+
+    def test_prunes_expired_tokens_in_batches(self):
+        BlacklistedToken.objects.create(token=self.expired[0])
+        BlacklistedToken.objects.create(token=self.live[0])
+        TokenRevocation.objects.create(user_id=0, revoked_at=timezone.now() - timedelta(days=30))
+        call_command('prune_tokens', '--batch-size', '2', '--pause', '0', stdout=io.StringIO())
+        self.assertEqual(
+            set(OutstandingToken.objects.values_list('pk', flat=True)), {token.pk for token in self.live},
+        )
+        self.assertEqual(list(BlacklistedToken.objects.values_list('token_id', flat=True)), [self.live[0].pk])
+        self.assertFalse(TokenRevocation.objects.filter(user_id=0).exists())
+
+
+class AccountJobTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='cook@example.com', username='cook', password=PASSWORD)
+
+    def test_delete_account_deletes_in_the_background(self):
+        recipe = Recipe.objects.create(author=self.user, title='Mine', description='Test recipe')
+        Comment.objects.create(recipe=recipe, author=self.user, text='Yum')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {add_claims(AccessToken.for_user(self.user), self.user)}')
+        response = self.client.delete(reverse('delete-account'))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data, {'status': 'Account scheduled for deletion'})
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_active)
+
+        self.assertEqual(run_pending(), 1)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(Recipe.objects.filter(pk=recipe.pk).exists())
+
+    def test_deleted_account_cannot_be_reactivated(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {add_claims(AccessToken.for_user(self.user), self.user)}')
+        self.assertEqual(self.client.delete(reverse('delete-account')).status_code, 202)
+        self.client.credentials()
+        response = self.client.post(reverse('reactivate-account'), {'email': self.user.email, 'password': PASSWORD})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_active)
+
+    def test_delete_job_spares_unmarked_accounts(self):
+        # e.g. a job left from an earlier deletion of a since recreated id
+        enqueue(delete_user, self.user.pk)
+        self.assertEqual(run_pending(), 1)
+        self.assertTrue(User.objects.filter(pk=self.user.pk).exists())
+
+    def test_password_reset_email_is_sent_in_the_background(self):
+        response = self.client.post(reverse('password-reset-request'), {'email': self.user.email})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mail.outbox, [])
+
+        run_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+        self.assertIn('reset-password?uidb64=', mail.outbox[0].body)
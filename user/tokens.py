@@ -0,0 +1,64 @@
+"""
+Set-based refresh token blacklisting and pruning.
+
+Blacklisting a user's refresh tokens is one INSERT ... SELECT, however
+many tokens they hold. Pruning walks the outstanding tokens in primary
+key ranges, deleting the expired ones (and their blacklist entries) one
+short transaction per range, so it can run next to live traffic.
+"""
+import time
+
+from django.db import connection, transaction
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+PRUNE_BATCH_SIZE = 1000
+
+
+def _tables():
+    quote = connection.ops.quote_name
+    return quote(OutstandingToken._meta.db_table), quote(BlacklistedToken._meta.db_table)
+
+
+def blacklist_user_tokens(user_id):
+    """
+    Blacklists every unexpired refresh token of the user that isn't
+    already, and returns how many were added.
+    """
+    outstanding, blacklisted = _tables()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {blacklisted} (token_id, blacklisted_at) '
+            f'SELECT id, now() FROM {outstanding} WHERE user_id = %s AND expires_at > now() '
+            f'ON CONFLICT (token_id) DO NOTHING',
+            [user_id],
+        )
+        return cursor.rowcount
+
+
+def prune_expired_tokens(batch_size=PRUNE_BATCH_SIZE, pause=0.0):
+    """
+    Deletes expired outstanding tokens with their blacklist entries, one
+    range of `batch_size` ids at a time, sleeping `pause` seconds between
+    ranges. Yields the number of tokens deleted per range.
+    """
+    outstanding, blacklisted = _tables()
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT min(id), max(id) FROM {outstanding}')
+        low, high = cursor.fetchone()
+    if low is None:
+        return
+    for start in range(low, high + 1, batch_size):
+        bounds = [start, start + batch_size]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {blacklisted} WHERE token_id IN ('
+                f'SELECT id FROM {outstanding} WHERE id >= %s AND id < %s AND expires_at <= now())',
+                bounds,
+            )
+            cursor.execute(
+                f'DELETE FROM {outstanding} WHERE id >= %s AND id < %s AND expires_at <= now()',
+                bounds,
+            )
+            yield cursor.rowcount
+        if pause:
+            time.sleep(pause)
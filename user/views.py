@@ -1,9 +1,4 @@
-from django.conf import settings
-from django.contrib.auth.tokens import PasswordResetTokenGenerator
-from django.core.mail import send_mail
 from django.utils import timezone
-from django.utils.encoding import force_bytes
-from django.utils.http import urlsafe_base64_encode
 from drf_spectacular.utils import extend_schema
 
 from rest_framework import status, generics
@@ -11,14 +6,17 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 
+from backend.instrumentation import SerializerTimingMixin
+from jobs.queue import enqueue
+
+from .authentication import load_row
 from .serializers import UserSignupSerializer, UserSigninSerializer, MyTokenObtainPairSerializer, UserProfileSerializer, \
     ChangePasswordSerializer, ReactivateAccountSerializer, PasswordResetRequestSerializer, \
     PasswordResetConfirmSerializer
+from .tasks import delete_user, send_password_reset_email
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
 
 User = get_user_model()
 
@@ -56,7 +54,7 @@ class SigninView(APIView):
 
             user = authenticate(request, email=email, password=password)
             if user is not None:
-                refresh = RefreshToken.for_user(user)
+                refresh = MyTokenObtainPairSerializer.get_token(user)
                 user.last_login = timezone.now()
                 user.save()  # Save the updated last_login
                 return Response({
@@ -72,7 +70,7 @@ class MyTokenObtainPairView(TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
 
 
-class UserProfileView(generics.RetrieveUpdateAPIView):
+class UserProfileView(SerializerTimingMixin, generics.RetrieveUpdateAPIView):
     """
     View for the currently authenticated user to retrieve and update their profile.
     """
@@ -81,11 +79,12 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        # Returns the user object for the currently authenticated user
-        return self.request.user
+        # Returns the user object for the currently authenticated user,
+        # read from the row rather than the token's possibly stale claims
+        return load_row(self.request.user)
 
 
-class ChangePasswordView(generics.UpdateAPIView):
+class ChangePasswordView(SerializerTimingMixin, generics.UpdateAPIView):
     """
     An endpoint for changing password.
     """
@@ -107,12 +106,9 @@ class ChangePasswordView(generics.UpdateAPIView):
 
             # set_password also hashes the password that the user will get
             self.object.set_password(serializer.data.get("new_password"))
+            # Revokes the user's tokens (user.signals)
             self.object.save()
 
-            tokens = OutstandingToken.objects.filter(user_id=self.object.id)
-            for token in tokens:
-                BlacklistedToken.objects.get_or_create(token=token)
-
             return Response({"status": "password set successfully"}, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -157,19 +153,26 @@ class ReactivateAccountView(APIView):
 
 class DeleteAccountView(APIView):
     """
-    View to permanently delete the user's account.
+    View to delete the user's account. It is deactivated at once and
+    deleted, with all its data, by a background job.
     """
     permission_classes = [IsAuthenticated]
 
-    @extend_schema(summary="Delete User Account Permanently", request=None,
-                   responses={204: {'description': 'Account deleted permanently'}})
+    @extend_schema(summary="Schedule User Account Deletion", request=None,
+                   responses={202: {'description': 'Account deactivated and scheduled for deletion'}})
     def delete(self, request, *args, **kwargs):
         user = request.user
-        user.delete()
-        return Response({"status": "Account deleted permanently"}, status=status.HTTP_204_NO_CONTENT)
+        # Deactivating revokes the tokens right away; the user's recipes,
+        # comments, likes and saves are deleted by a background job, which
+        # only deletes accounts still marked for deletion.
+        user.is_active = False
+        user.deletion_requested_at = timezone.now()
+        user.save(update_fields=['is_active', 'deletion_requested_at'])
+        enqueue(delete_user, user.pk)
+        return Response({"status": "Account scheduled for deletion"}, status=status.HTTP_202_ACCEPTED)
 
 
-class PasswordResetRequestView(generics.GenericAPIView):
+class PasswordResetRequestView(SerializerTimingMixin, generics.GenericAPIView):
     """
     View to request a password reset.
     """
@@ -179,29 +182,12 @@ class PasswordResetRequestView(generics.GenericAPIView):
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        email = serializer.validated_data['email']
-        user = User.objects.get(email=email)
-
-        # Generate token and UID
-        token_generator = PasswordResetTokenGenerator()
-        token = token_generator.make_token(user)
-        uidb64 = urlsafe_base64_encode(force_bytes(user.pk))
-
-        # Construct reset link (customize the domain for your frontend)
-        reset_link = f"http://localhost:3000/reset-password?uidb64={uidb64}&token={token}"
-
-        # Send email
-        send_mail(
-            'Password Reset Request',
-            f'Hi {user.username},\n\nPlease use the following link to reset your password:\n{reset_link}',
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            fail_silently=False,
-        )
+        # Sent by a background job
+        enqueue(send_password_reset_email, serializer.validated_data['email'])
         return Response({"status": "Password reset link sent to your email."}, status=status.HTTP_200_OK)
 
 
-class PasswordResetConfirmView(generics.GenericAPIView):
+class PasswordResetConfirmView(SerializerTimingMixin, generics.GenericAPIView):
     """
     View to confirm and set a new password.
     """
@@ -215,10 +201,7 @@ class PasswordResetConfirmView(generics.GenericAPIView):
         new_password = serializer.validated_data['new_password']
 
         user.set_password(new_password)
+        # Revokes the user's tokens (user.signals)
         user.save()
 
-        tokens = OutstandingToken.objects.filter(user_id=user.id)
-        for token in tokens:
-            BlacklistedToken.objects.get_or_create(token=token)
-
         return Response({"status": "Password has been reset successfully."}, status=status.HTTP_200_OK)